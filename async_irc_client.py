@@ -0,0 +1,405 @@
+# async_irc_client.py
+import asyncio
+import logging
+import ssl
+
+import metrics
+import structured_log
+from irc_parser import LineFramer, parse_line
+from outbound_queue import OutboundScheduler, PRIORITY_COMMAND
+from rate_limit import Backoff
+
+_CLOSED = object()
+
+log = structured_log.get_logger("irc")
+IRC_BYTES = metrics.counter("irc_received_bytes_total", "Bytes read from IRC connections.")
+IRC_LINES = metrics.counter("irc_lines_total", "IRC lines received, by command.", ["command"])
+IRC_UNPARSED = metrics.counter("irc_unparsed_lines_total", "IRC lines that could not be parsed.")
+IRC_CONNECTS = metrics.counter("irc_connects_total", "IRC connection attempts.")
+IRC_KEEPALIVE_TIMEOUTS = metrics.counter("irc_keepalive_timeouts_total",
+                                         "Connections dropped because a keepalive PING went unanswered.")
+IRC_TLS_HANDSHAKES = metrics.counter("irc_tls_handshakes_total", "TLS handshakes, by whether the session was resumed.",
+                                     ["resumed"])
+IRC_RECONNECT_DELAY = metrics.histogram("irc_reconnect_delay_seconds", "Backoff waits before reconnecting.",
+                                        buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60))
+
+
+def count_lines(counts):
+    """Adds one read's {command: lines} to the line metrics; None counts unparsed lines."""
+    for command, count in counts.items():
+        if command is None:
+            IRC_UNPARSED.inc(count)
+        else:
+            IRC_LINES.labels(command).inc(count)
+
+
+class ResumableTLSContext(ssl.SSLContext):
+    """
+    Client SSLContext that offers the last saved session on every new connection.
+    asyncio has no way to pass a session to open_connection, so wrap_bio (which
+    asyncio calls for each handshake) fills it in. A resumed handshake skips the
+    certificate exchange and verification, which is most of a reconnect's TLS cost.
+    """
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session or self.session)
+
+
+def create_tls_context(cafile=None):
+    """A verifying client context for Twitch's TLS port (6697). `cafile` trusts a test certificate."""
+    context = ResumableTLSContext(ssl.PROTOCOL_TLS_CLIENT)
+    if cafile:
+        context.load_verify_locations(cafile)
+    else:
+        context.load_default_certs()
+    return context
+
+
+class AsyncIRCClient:
+    """
+    Twitch IRC client built on asyncio streams.
+    Iterate over it (`async for msg in client`) to receive parsed IRCMessage objects;
+    PINGs are answered internally and never reach the iterator.
+
+    `channel` may be a single channel name or a list of them. Pass a shared
+    `join_limiter` (rate_limit.SlidingWindowLimiter) when several clients log in
+    with the same account, since Twitch limits JOINs per account.
+
+    Chat messages go through an OutboundScheduler, which enforces Twitch's rate
+    limits, splits long messages, drops duplicates and sends by priority. Messages
+    sent while disconnected wait in it and go out once the channel is joined again.
+
+    Failed connections are retried with exponential backoff and jitter, starting at
+    `reconnect_delay` and capped at `max_reconnect_delay`; a server RECONNECT is
+    followed right away. If nothing arrives for `keepalive_interval` seconds the
+    client PINGs the server, and drops the connection if no reply comes within
+    `keepalive_timeout` (a half-open TCP connection otherwise looks idle forever).
+
+    `tls` is an SSLContext, or True for create_tls_context(). With a
+    ResumableTLSContext, reconnects (and other clients sharing the context) resume
+    the last TLS session instead of doing a full handshake.
+
+    With `on_message`, every message is passed to on_message(msg) from the read loop
+    as it is parsed, instead of being queued for `async for`; it must not block.
+    """
+
+    def __init__(self, server, port, token, bot_nick, channel, reconnect_delay=1.0, read_size=4096,
+                 join_limiter=None, outbound=None, max_reconnect_delay=60.0, connect_timeout=10.0,
+                 keepalive_interval=60.0, keepalive_timeout=10.0, stable_after=30.0, tls=None, on_message=None):
+        self.server = server
+        self.port = port
+        self.token = token
+        self.bot_nick = bot_nick
+        self.channels = [channel] if isinstance(channel, str) else list(channel)
+        self.reconnect_delay = reconnect_delay
+        self.read_size = read_size
+        self.join_limiter = join_limiter
+        self.tls = create_tls_context() if tls is True else tls or None
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = keepalive_timeout
+        # A connection that lasted this long counts as a success and resets the backoff.
+        self.stable_after = stable_after
+        self.backoff = Backoff(reconnect_delay, max_reconnect_delay)
+
+        self.is_connected = False
+        self._reader = None
+        self._writer = None
+        self._incoming = asyncio.Queue()
+        self.on_message = on_message
+        self._connected_event = asyncio.Event()
+        self._logged_in_event = asyncio.Event()
+        self._join_task = None
+        self._keepalive_task = None
+        self._closing = False
+        self._connected_at = None
+        self._last_read = 0.0
+
+        self.outbound = outbound if outbound is not None else OutboundScheduler()
+        self._outbound_wakeup = asyncio.Event()
+        self._sender_task = None
+
+    @property
+    def channel(self):
+        """The default channel for send_privmsg (the first one joined)."""
+        return self.channels[0] if self.channels else None
+
+    async def connect(self):
+        """Opens the connection, authenticates and joins every channel."""
+        print(f"Connecting to {self.server}:{self.port}{' (TLS)' if self.tls else ''}...")
+        IRC_CONNECTS.inc()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.server, self.port, ssl=self.tls), self.connect_timeout)
+        ssl_object = self._writer.get_extra_info("ssl_object")
+        if ssl_object is not None:
+            IRC_TLS_HANDSHAKES.labels("true" if ssl_object.session_reused else "false").inc()
+        loop = asyncio.get_running_loop()
+        self._last_read = loop.time()
+
+        # Twitch rejects the login unless the token has the 'oauth:' prefix.
+        formatted_token = self.token if self.token.startswith("oauth:") else f"oauth:{self.token}"
+
+        # One write, so the login goes out as a single TLS record and TCP segment.
+        self._writer.write((
+            "CAP REQ :twitch.tv/tags twitch.tv/commands\r\n"
+            f"PASS {formatted_token}\r\n"
+            f"NICK {self.bot_nick}\r\n"
+        ).encode("utf-8"))
+        await self._writer.drain()
+
+        self.is_connected = True
+        self._connected_at = loop.time()
+        self._connected_event.set()
+        # Hold each channel's queued messages until the server confirms the JOIN.
+        for channel in self.channels:
+            self.outbound.set_joined(channel, False)
+        self._sender_task = asyncio.ensure_future(self._send_loop())
+        if self.keepalive_interval:
+            self._keepalive_task = asyncio.ensure_future(self._keepalive_loop())
+        # JOINs may be throttled for a while; do them in the background so the
+        # read loop is already answering PINGs.
+        self._join_task = asyncio.ensure_future(self._join_all())
+
+    async def _join_all(self):
+        for channel in list(self.channels):
+            if not self.is_connected:
+                return
+            await self._send_join(channel)
+
+    async def _send_join(self, channel):
+        if self.join_limiter is not None:
+            await self.join_limiter.acquire()
+        await self.send_raw(f"JOIN #{channel}")
+
+    async def join(self, channel):
+        """Adds a channel, joining it right away if connected (and on every reconnect)."""
+        if channel in self.channels:
+            return
+        self.channels.append(channel)
+        if self.is_connected:
+            self.outbound.set_joined(channel, False)
+            await self._send_join(channel)
+
+    async def wait_connected(self):
+        """Waits until the login has been sent (the server may still reject it)."""
+        await self._connected_event.wait()
+
+    async def wait_logged_in(self):
+        """Waits until the server has accepted the login (001 welcome)."""
+        await self._logged_in_event.wait()
+
+    def _write_line(self, line):
+        self._writer.write(f"{line}\r\n".encode("utf-8"))
+
+    async def send_raw(self, line):
+        """Writes a raw IRC line and waits until the transport has accepted it."""
+        if not self.is_connected or self._writer is None:
+            print("[WARN] Cannot send message, not connected.")
+            return False
+        try:
+            self._write_line(line)
+            await self._writer.drain()
+            return True
+        except (ConnectionError, OSError) as e:
+            print(f"[ERROR] Failed to send message: {e}")
+            self._mark_disconnected()
+            return False
+
+    async def send_privmsg(self, message, channel=None, priority=PRIORITY_COMMAND):
+        """
+        Queues a chat message for the channel, to be sent once connected and joined.
+        Returns False if it was dropped as a duplicate of a message sent in the last
+        30 seconds.
+        """
+        queued = self.outbound.push(channel or self.channel, message, priority)
+        if not queued:
+            print(f"[WARN] Dropped duplicate message: {message}")
+            return False
+        self._outbound_wakeup.set()
+        return True
+
+    async def _send_loop(self):
+        """Drains the outbound queue as fast as the rate limits allow."""
+        while self.is_connected:
+            message, wait = self.outbound.pop_ready()
+            if message is None:
+                self._outbound_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._outbound_wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            print(f"[{self.bot_nick}]: {message.text}")
+            try:
+                sent = await self.send_raw(f"PRIVMSG #{message.channel} :{message.text}")
+            except asyncio.CancelledError:
+                self.outbound.requeue(message)
+                raise
+            if not sent:
+                # Keep it for the next connection; the message TTL drops it if that takes too long.
+                self.outbound.requeue(message)
+                return
+            self.outbound.mark_sent(message)
+
+    async def _keepalive_loop(self):
+        """PINGs an idle server and aborts the connection if the PING goes unanswered."""
+        loop = asyncio.get_running_loop()
+        while self.is_connected:
+            idle = loop.time() - self._last_read
+            if idle < self.keepalive_interval:
+                await asyncio.sleep(self.keepalive_interval - idle)
+                continue
+            pinged_at = loop.time()
+            self._write_line("PING :keepalive")
+            await asyncio.sleep(self.keepalive_timeout)
+            if self._last_read < pinged_at and self._writer is not None:
+                print(f"[WARN] No reply to keepalive PING in {self.keepalive_timeout:g}s. Dropping the connection.")
+                IRC_KEEPALIVE_TIMEOUTS.inc()
+                self._writer.transport.abort()
+                return
+
+    async def _read_loop(self):
+        """Reads until the connection ends. Returns True if the server asked for a reconnect."""
+        framer = LineFramer()
+        clock = asyncio.get_running_loop().time
+        while not self._closing:
+            data = await self._reader.read(self.read_size)
+            if not data:
+                print("[INFO] Connection stream empty. Closing connection.")
+                return False
+
+            # The keepalive task reads this; any data at all proves the peer is alive.
+            self._last_read = clock()
+            IRC_BYTES.inc(len(data))
+            # Raw lines are only logged at DEBUG; checked once per read, not per line.
+            log_lines = log.isEnabledFor(logging.DEBUG)
+            # Lines are counted per read and added to the metrics once, so the metric
+            # locks are taken per read rather than per line.
+            counts = {}
+            try:
+                for line in framer.feed(data):
+                    if log_lines:
+                        log.debug("<<< %s", line)
+
+                    msg = parse_line(line)
+                    if msg is None:
+                        counts[None] = counts.get(None, 0) + 1
+                        continue
+                    counts[msg.command] = counts.get(msg.command, 0) + 1
+
+                    if msg.command == "PING":
+                        # Written without awaiting drain so a slow consumer never delays the PONG.
+                        self._write_line(f"PONG :{msg.text or 'tmi.twitch.tv'}")
+                        log.debug("Responded to server PING.")
+                        continue
+
+                    if msg.command == "PONG":
+                        continue
+
+                    if msg.command == "RECONNECT":
+                        print("[INFO] Server requested a reconnect. Re-establishing connection...")
+                        return True
+
+                    if msg.command == "001":
+                        # TLS 1.3 session tickets arrive after the handshake, so the session
+                        # is only worth saving once the server has said something.
+                        self._save_tls_session()
+                        self._logged_in_event.set()
+                        print("✅ Bot has successfully logged in and is ready.")
+                        print("---")
+
+                    elif msg.command == "USERSTATE" and msg.channel:
+                        badges = msg.tags.get("badges", "")
+                        is_moderator = msg.tags.get("mod") == "1" or "broadcaster/" in badges
+                        self.outbound.set_moderator(msg.channel, is_moderator)
+
+                    elif msg.command == "JOIN" and msg.channel and msg.nick == self.bot_nick.lower():
+                        self.outbound.set_joined(msg.channel, True)
+                        self._outbound_wakeup.set()
+
+                    if self.on_message is not None:
+                        self.on_message(msg)
+                    else:
+                        self._incoming.put_nowait(msg)
+            finally:
+                count_lines(counts)
+
+    def _save_tls_session(self):
+        if not isinstance(self.tls, ResumableTLSContext) or self._writer is None:
+            return
+        ssl_object = self._writer.get_extra_info("ssl_object")
+        # Reading .session copies and re-parses it (a few hundred µs), so only take a
+        # new one after a full handshake; a resumed session's ticket stays usable.
+        if ssl_object is not None and not ssl_object.session_reused:
+            self.tls.session = ssl_object.session
+
+    def _mark_disconnected(self):
+        self.is_connected = False
+        self._connected_event.clear()
+        self._logged_in_event.clear()
+
+    async def _close_transport(self):
+        self._mark_disconnected()
+        for task in (self._join_task, self._sender_task, self._keepalive_task):
+            if task is not None:
+                task.cancel()
+        self._join_task = self._sender_task = self._keepalive_task = None
+        writer, self._writer = self._writer, None
+        self._reader = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def run(self):
+        """Keeps the client connected, reconnecting on failure, until close() is called."""
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            self._connected_at = None
+            requested = False
+            try:
+                await self.connect()
+                requested = await self._read_loop()
+            except asyncio.TimeoutError:
+                print(f"[ERROR] Connection attempt timed out after {self.connect_timeout:g} seconds.")
+            except (ConnectionError, OSError) as e:
+                print(f"[ERROR] Connection was lost: {e}")
+            except asyncio.CancelledError:
+                await self._close_transport()
+                raise
+            except Exception as e:
+                print(f"[ERROR] Connection manager failed: {e}")
+            await self._close_transport()
+            if self._closing:
+                break
+
+            if self._connected_at is not None and loop.time() - self._connected_at >= self.stable_after:
+                self.backoff.reset()
+            if requested:
+                # Twitch sends RECONNECT before restarting a server; the next connection
+                # lands on a healthy one, so there is nothing to back off from.
+                continue
+            delay = self.backoff.delay()
+            IRC_RECONNECT_DELAY.observe(delay)
+            print(f"Attempting to reconnect in {delay:.1f} seconds (attempt {self.backoff.failures})...")
+            await asyncio.sleep(delay)
+
+        print("[INFO] IRC listener has stopped.")
+
+    async def close(self):
+        """Stops the client and ends any active `async for` iteration."""
+        self._closing = True
+        await self._close_transport()
+        self._incoming.put_nowait(_CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self._incoming.get()
+        if msg is _CLOSED:
+            raise StopAsyncIteration
+        return msg
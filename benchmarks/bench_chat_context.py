@@ -0,0 +1,125 @@
+# benchmarks/bench_chat_context.py
+"""
+Cost and prompt size of ChatContext at a busy chat's message rate.
+
+Feeds a chat log (recorded with --log, or synthetic) into one ChatContext at
+--rate messages per simulated second, and builds a prompt context block every
+--prompt-interval seconds. Reports:
+
+    CPU       time spent in add() (including the batched summaries) and in
+              context_block(), as a share of one core at that rate
+    tokens    estimated tokens per prompt for the context block, compared with
+              pasting all chat since the previous prompt, or the whole transcript
+    memory    traced allocations held by the context once it has run a while
+
+Fails (exit 1) if a block exceeds the token budget or the summarizer needs more
+than 5% of a core.
+
+Usage:
+    python benchmarks/bench_chat_context.py [--rate 100] [--seconds 600] [--prompt-interval 10] [--log chat.log]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_context import ChatContext  # noqa: E402
+from chat_trace import chat_messages, load_log, synthetic_log  # noqa: E402
+from memory_index import estimate_tokens  # noqa: E402
+
+MAX_CPU_SHARE = 0.05
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(messages, args):
+    context = ChatContext(token_budget=args.budget)
+    total = int(args.rate * args.seconds)
+    per_prompt = int(args.rate * args.prompt_interval)
+    add_times = []
+    block_times = []
+    block_tokens = []
+    since_prompt_tokens = []
+    transcript_tokens = 0
+    since_prompt = 0
+    for i in range(total):
+        username, text = messages[i % len(messages)]
+        line_tokens = estimate_tokens(f"{username}: {text}")
+        transcript_tokens += line_tokens
+        since_prompt += line_tokens
+        start = time.perf_counter()
+        context.add(username, text)
+        add_times.append(time.perf_counter() - start)
+        if (i + 1) % per_prompt == 0:
+            start = time.perf_counter()
+            block = context.context_block()
+            block_times.append(time.perf_counter() - start)
+            block_tokens.append(estimate_tokens(block))
+            since_prompt_tokens.append(since_prompt)
+            since_prompt = 0
+    return context, add_times, block_times, block_tokens, since_prompt_tokens, transcript_tokens
+
+
+def held_memory(messages, args):
+    """Bytes still allocated by a ChatContext after it has taken the whole run."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    context = ChatContext(token_budget=args.budget)
+    for i in range(int(args.rate * args.seconds)):
+        context.add(*messages[i % len(messages)])
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, context
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=100, help="Chat messages per simulated second.")
+    parser.add_argument("--seconds", type=float, default=600, help="Simulated chat duration.")
+    parser.add_argument("--prompt-interval", type=float, default=10, help="Simulated seconds between prompts.")
+    parser.add_argument("--budget", type=int, default=300, help="Context block token budget.")
+    parser.add_argument("--log", help="Recorded raw IRC log to replay instead of synthetic chat.")
+    args = parser.parse_args()
+
+    lines = load_log(args.log) if args.log else synthetic_log(20_000)
+    messages = chat_messages(lines)
+    context, add_times, block_times, block_tokens, since_prompt, transcript = run(messages, args)
+    held, _ = held_memory(messages, args)
+
+    stats = context.metrics()
+    busy = sum(add_times) + sum(block_times)
+    cpu_share = busy / args.seconds
+    print(f"{stats['added']:,} messages at {args.rate:g}/s over {args.seconds:g}s simulated, "
+          f"a prompt every {args.prompt_interval:g}s ({len(block_tokens)} prompts)")
+    print(f"add()            p50 {percentile(add_times, 0.5) * 1e6:6.1f}us  p99 {percentile(add_times, 0.99) * 1e6:6.1f}us  "
+          f"max {max(add_times) * 1e3:6.2f}ms")
+    print(f"summary runs     {stats['summary_runs']}, {stats['summary_ms'] / max(1, stats['summary_runs']):.2f}ms each "
+          f"for {stats['summarized'] / max(1, stats['summary_runs']):.0f} lines")
+    print(f"context_block()  p50 {percentile(block_times, 0.5) * 1e3:6.2f}ms  max {max(block_times) * 1e3:6.2f}ms")
+    print(f"CPU              {busy:.2f}s in {args.seconds:g}s = {cpu_share:.2%} of one core")
+    print(f"{'tokens/prompt':<16} {'p50':>8} {'max':>8}")
+    print(f"{'context block':<16} {statistics.median(block_tokens):>8,.0f} {max(block_tokens):>8,}")
+    print(f"{'chat since last':<16} {statistics.median(since_prompt):>8,.0f} {max(since_prompt):>8,}")
+    print(f"{'full transcript':<16} {'':>8} {transcript:>8,}")
+    print(f"memory held      {held / 1024:.0f} KB ({stats['recent']} recent lines, {stats['terms']} terms)")
+
+    failed = False
+    if max(block_tokens) > args.budget:
+        print(f"FAILED: a context block used {max(block_tokens)} tokens, budget {args.budget}")
+        failed = True
+    if cpu_share > MAX_CPU_SHARE:
+        print(f"FAILED: chat context took {cpu_share:.1%} of a core (limit {MAX_CPU_SHARE:.0%})")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
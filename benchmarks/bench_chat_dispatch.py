@@ -0,0 +1,103 @@
+# benchmarks/bench_chat_dispatch.py
+"""
+Messages/sec through the chat hot path on a chat log: the previous checks
+(substring test per nickname, startswith("!lor")) against ChatDispatcher
+(one word-boundary regex for mentions, one regex for commands).
+
+Also compares which messages count as mentions each way. The substring test flags
+nicknames inside other words ("lor" in "explore", "lei" in "sleigh"). It also
+never matches the capitalized entries ("Relay", "Laurel") against lowercased text.
+
+Usage:
+    python benchmarks/bench_chat_dispatch.py [--log recorded.log] [--lines 200000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_commands import ChatDispatcher, PERMISSION_MODERATOR  # noqa: E402
+from chat_trace import chat_messages, load_log, synthetic_log  # noqa: E402
+
+# Same list as config.BOT_NICKNAMES; config itself needs the bot's .env to import.
+BOT_NICKNAMES = ["lorelei", "laurelei", "loralei", "lor", "lore", "lei", "lorelei_the_bot", "Laurel", "Laura",
+                 "Relay", "Lorelai", "LoreleiBot"]
+
+
+def run_legacy(messages):
+    mentions = []
+    commands = 0
+    for i, (_, message) in enumerate(messages):
+        if any(nick in message.lower() for nick in BOT_NICKNAMES):
+            mentions.append(i)
+        if message.lower().startswith("!lor"):
+            commands += 1
+    return mentions, commands
+
+
+def run_dispatcher(messages, dispatcher):
+    mentions = []
+    dispatch = dispatcher.dispatch
+    mentioned = dispatcher.mentions
+    for i, (username, message) in enumerate(messages):
+        if mentioned(message):
+            mentions.append(i)
+        dispatch(username, message)
+    return mentions
+
+
+def timed(func, *args, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="Recorded raw IRC log (default: synthetic).")
+    parser.add_argument("--lines", type=int, default=200_000, help="Synthetic lines when no log is given.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = load_log(args.log) if args.log else synthetic_log(args.lines)
+    messages = chat_messages(lines)
+
+    calls = {"lor": 0, "forget": 0, "memory": 0}
+
+    def handler(name):
+        def handle(username, text, source):
+            calls[name] += 1
+        return handle
+
+    # No cooldowns, so every command reaches its handler like the old check did.
+    dispatcher = ChatDispatcher(BOT_NICKNAMES)
+    dispatcher.register("lor", handler("lor"))
+    dispatcher.register("forget", handler("forget"), permission=PERMISSION_MODERATOR)
+    dispatcher.register("memory", handler("memory"))
+
+    legacy_time, (legacy_mentions, legacy_commands) = timed(run_legacy, messages, repeat=args.repeat)
+    dispatch_time, mentions = timed(run_dispatcher, messages, dispatcher, repeat=args.repeat)
+
+    source = args.log or f"synthetic log ({args.lines:,} lines)"
+    print(f"{len(messages):,} chat messages from {source}, best of {args.repeat}")
+    print(f"{'':>12} {'msgs/sec':>12} {'mentions':>9} {'!lor':>7}")
+    print(f"{'substring':>12} {len(messages) / legacy_time:>12,.0f} {len(legacy_mentions):>9,} {legacy_commands:>7,}")
+    print(f"{'dispatcher':>12} {len(messages) / dispatch_time:>12,.0f} {len(mentions):>9,} "
+          f"{calls['lor'] // args.repeat:>7,}")
+
+    only_substring = set(legacy_mentions) - set(mentions)
+    only_dispatcher = set(mentions) - set(legacy_mentions)
+    print(f"mentions only the substring test saw (nickname inside another word): {len(only_substring):,}")
+    print(f"mentions only the dispatcher saw (capitalized nicknames): {len(only_dispatcher):,}")
+    for i in sorted(only_substring)[:3]:
+        print(f"  e.g. {messages[i][1]!r}")
+
+
+if __name__ == "__main__":
+    main()
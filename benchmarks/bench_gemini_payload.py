@@ -0,0 +1,227 @@
+# benchmarks/bench_gemini_payload.py
+"""
+Request payload bytes per Gemini turn, against a stub model that records what each
+generate call would put on the wire (system instruction, history and new message;
+cached content is counted as its name only).
+
+Compares the previous get_response (new chat per call, prompt appended to history
+before send_message, memory block kept in every history entry) with the persistent
+session in GeminiHandler, at three memory sizes:
+    small  - memory fits the budget but is too small for a context cache
+    cached - memory fits the budget and is large enough to cache
+    large  - memory exceeds the budget, so relevant facts go inline per turn
+
+Each scenario is also run for --long-factor times as many turns. Fails (exit 1)
+if GeminiHandler's largest request in the long run is more than 5% above its
+largest request in the short run, i.e. if the payload still grows with history.
+
+Usage:
+    python benchmarks/bench_gemini_payload.py [--turns 50] [--max-history 10] [--long-factor 4]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# --- Stub of the google.generativeai surface GeminiHandler uses ---
+
+class StubStats:
+    def __init__(self):
+        self.requests = []        # payload bytes per generate call
+        self.sessions = 0
+
+
+STATS = StubStats()
+
+
+def _content(item):
+    if isinstance(item, str):
+        return {"role": "user", "parts": [item]}
+    return {"role": item["role"], "parts": list(item["parts"])}
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = [_content(item) for item in history or []]
+
+    def send_message(self, content):
+        message = _content(content)
+        request = {"contents": self.history + [message]}
+        if self.model.cached_content is not None:
+            request["cached_content"] = self.model.cached_content.name
+        elif self.model.system_instruction:
+            request["system_instruction"] = self.model.system_instruction
+        STATS.requests.append(len(json.dumps(request, ensure_ascii=False).encode("utf-8")))
+
+        reply = f"Reply number {len(STATS.requests)}, keeping the conversation going about the stream."
+        self.history += [message, {"role": "model", "parts": [reply]}]
+        return StubResponse(reply)
+
+
+class StubGenerativeModel:
+    def __init__(self, model_name=None, system_instruction=None, cached_content=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls(cached_content=cached_content)
+
+    def start_chat(self, history=None):
+        STATS.sessions += 1
+        return StubChatSession(self, history)
+
+
+class StubCachedContent:
+    _count = 0
+
+    def __init__(self):
+        StubCachedContent._count += 1
+        self.name = f"cachedContents/stub-{StubCachedContent._count}"
+
+    @classmethod
+    def create(cls, **_):
+        return cls()
+
+    def delete(self):
+        pass
+
+
+def install_stub():
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **_: None
+    genai.GenerativeModel = StubGenerativeModel
+    genai.caching = types.SimpleNamespace(CachedContent=StubCachedContent)
+    google = sys.modules.setdefault("google", types.ModuleType("google"))
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+    sys.modules["google.generativeai.caching"] = genai.caching
+
+
+install_stub()
+
+from gemini_handler import CACHE_MIN_TOKENS, GeminiHandler  # noqa: E402
+from memory_handler import MemoryHandler  # noqa: E402
+from memory_index import estimate_tokens  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+
+class LegacyGeminiHandler(GeminiHandler):
+    """The previous turn handling: a fresh chat per call over a sliced history list."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history = []
+
+    def _legacy_model_for_turn(self):
+        if not self.use_context_cache:
+            return self.model, False
+        version, memory_prefix = self.memory_handler.get_memory_prefix()
+        if estimate_tokens(self.system_prompt) + estimate_tokens(memory_prefix) < CACHE_MIN_TOKENS:
+            memory_prefix = ""
+        if not memory_prefix:
+            return self.model, False
+        if version != self._cached_version:
+            self._refresh_context_cache(version, memory_prefix)
+        if self._cached_model is None:
+            return self.model, False
+        return self._cached_model, True
+
+    def get_response(self, user_prompt):
+        model, memory_is_cached = self._legacy_model_for_turn()
+        if memory_is_cached:
+            prompt_with_memory = user_prompt
+        else:
+            memory_string = self.memory_handler.get_memory_for_prompt(user_prompt)
+            prompt_with_memory = f"{memory_string}\n{user_prompt}"
+
+        self.history.append({"role": "user", "parts": [prompt_with_memory]})
+        chat_session = model.start_chat(history=self.history)
+        response = chat_session.send_message(prompt_with_memory)
+        cleaned_response_text = self._process_ai_commands(response.text)
+        self.history.append({"role": "model", "parts": [cleaned_response_text]})
+        if len(self.history) > self.max_history:
+            self.history = self.history[2:]
+        return cleaned_response_text
+
+
+SCENARIOS = {"small": 20, "cached": 120, "large": 2000}
+GROWTH_TOLERANCE = 0.05   # longer turn numbers and different facts vary the size a little
+
+
+def build_memory(path, fact_count, rng):
+    memory = MemoryHandler(path, fsync=False, token_budget=1500, top_k=40)
+    for i in range(fact_count):
+        game = rng.choice(["Elden Ring", "Hades", "Celeste", "Balatro", "Hollow Knight"])
+        memory.learn_fact(f"Topic {i % 25}", f"Fact {i}: the streamer said something about {game} at minute {i}.")
+    return memory
+
+
+def run(handler_class, memory, turns, max_history, rng):
+    STATS.requests.clear()
+    STATS.sessions = 0
+    handler = handler_class(api_key="stub", system_prompt="You are Lorelei, a friendly Twitch chat bot. " * 4,
+                            max_history=max_history, memory_handler=memory)
+    for i in range(turns):
+        handler.get_response(f"Viewer{rng.randint(1, 99)} says: what do you think about turn {i}?")
+    return sum(STATS.requests), max(STATS.requests), STATS.sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--max-history", type=int, default=10)
+    parser.add_argument("--long-factor", type=int, default=4, help="Turns in the long run, as a multiple of --turns.")
+    args = parser.parse_args()
+    if args.turns < args.max_history:
+        parser.error("--turns must be at least --max-history, so the short run fills the history")
+    long_turns = args.turns * args.long_factor
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(NullWriter()):
+        for name, fact_count in SCENARIOS.items():
+            memory = build_memory(os.path.join(directory, f"{name}.json"), fact_count, random.Random(1))
+            for label, handler_class in (("before", LegacyGeminiHandler), ("after", GeminiHandler)):
+                results[name, label] = run(handler_class, memory, args.turns, args.max_history, random.Random(2))
+            results[name, "long"] = run(GeminiHandler, memory, long_turns, args.max_history, random.Random(2))
+            memory.close()
+
+    print(f"{args.turns} turns, max_history {args.max_history}")
+    print(f"{'memory':>8} {'version':>7} {'bytes/turn':>11} {'max request':>12} {'sessions':>9}")
+    for name in SCENARIOS:
+        before = results[name, "before"][0]
+        for label in ("before", "after"):
+            total, largest, sessions = results[name, label]
+            print(f"{name:>8} {label:>7} {total / args.turns:>11,.0f} {largest:>12,} {sessions:>9}")
+        print(f"{'':>8} {'saved':>7} {1 - results[name, 'after'][0] / before:>11.0%}")
+
+    print(f"largest request after {args.turns} vs {long_turns} turns:")
+    failures = []
+    for name in SCENARIOS:
+        short_max, long_max = results[name, "after"][1], results[name, "long"][1]
+        growth = long_max / short_max - 1
+        print(f"{name:>8} {short_max:>8,} {long_max:>8,} bytes ({growth:+.1%})")
+        if growth > GROWTH_TOLERANCE:
+            failures.append(f"{name}: the largest request grew {growth:.1%} with {long_turns} turns")
+    if failures:
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
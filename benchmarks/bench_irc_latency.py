@@ -0,0 +1,248 @@
+# benchmarks/bench_irc_latency.py
+"""
+End-to-end chat message latency: fake server write -> message available to the bot.
+Compares AsyncIRCClient (async iterator), the IRCClient sync wrapper consumed the way
+main.py does (message_queue.get(timeout=1.0)), the wrapper's previous extra hand-off
+through the async iterator (QueuedHandOffClient), and the previous thread-per-connection
+client, reproduced below as LegacyThreadedClient.
+
+Also reports the CPU time each client's receive thread spends per message. Wall-clock
+latency on a shared machine swings by more than a single hand-off costs, so the check
+uses CPU time: fails if IRCClient does not use less per message than the queued hand-off.
+
+Usage:
+    python benchmarks/bench_irc_latency.py [--messages 5000] [--rate 1000] [--rounds 5]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import queue
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_irc_client import AsyncIRCClient  # noqa: E402
+from irc_client import IRCClient  # noqa: E402
+from fake_twitch_server import FakeTwitchServer  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+CHANNEL = "benchchannel"
+
+
+class LegacyThreadedClient:
+    """The pre-asyncio receive path: blocking recv() in a thread feeding a queue."""
+
+    def __init__(self, port):
+        self.port = port
+        self.message_queue = queue.Queue()
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        self.sock = socket.create_connection(("127.0.0.1", self.port))
+        for line in ("CAP REQ :twitch.tv/tags twitch.tv/commands", "PASS oauth:x", "NICK bench", f"JOIN #{CHANNEL}"):
+            self.sock.send(f"{line}\r\n".encode("utf-8"))
+        self.thread = threading.Thread(target=self._listen, daemon=True)
+        self.thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                resp = self.sock.recv(4096).decode("utf-8")
+            except (OSError, UnicodeDecodeError):
+                break
+            if not resp:
+                break
+            for line in resp.strip().split("\r\n"):
+                print(f"<<< {line}")
+                if "PRIVMSG" in line:
+                    parts = line.split(":", 2)
+                    if len(parts) >= 3:
+                        self.message_queue.put((parts[1].split("!")[0], parts[2]))
+
+    def stop(self):
+        self.sock.close()
+
+
+class QueuedHandOffClient(IRCClient):
+    """
+    IRCClient before messages were delivered from the read loop: a task on the event
+    loop took each message from the async iterator and put it on a queue.Queue.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.message_queue = queue.Queue()
+        self._client.on_message = None
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._forward_messages())
+        finally:
+            self._loop.close()
+
+    async def _forward_messages(self):
+        runner = asyncio.ensure_future(self._client.run())
+        async for msg in self._client:
+            if msg.command == "PRIVMSG" and len(msg.params) >= 2:
+                self.message_queue.put((msg.nick, msg.text, msg))
+        await runner
+
+
+def _latency_ns(text):
+    """Returns the delivery latency, or None if the line arrived mangled."""
+    _, sep, sent = text.rpartition("t=")
+    if not sep or not sent.isdigit():
+        return None
+    latency = time.perf_counter_ns() - int(sent)
+    # A line spliced from two reads can carry a truncated timestamp.
+    return latency if 0 <= latency < 60 * 10**9 else None
+
+
+def _thread_cpu_ns(thread):
+    return time.clock_gettime_ns(time.pthread_getcpuclockid(thread.ident))
+
+
+def _wait_for_join(server, joins_before, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(server.joins) <= joins_before:
+        if time.monotonic() > deadline:
+            raise TimeoutError("client never joined")
+        time.sleep(0.01)
+
+
+def _replay(server, count, rate):
+    interval = 1.0 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    for i in range(count):
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        server.loop.call_soon_threadsafe(
+            server.broadcast, CHANNEL, f"viewer{i % 300}", f"message {i} t={time.perf_counter_ns()}")
+
+
+def _consume_queue(message_queue, count, latencies, deadline):
+    received = 0
+    while received < count and time.monotonic() < deadline:
+        try:
+            message = message_queue.get(timeout=1.0)[1]
+        except queue.Empty:
+            continue
+        received += 1
+        latency = _latency_ns(message)
+        if latency is not None:
+            latencies.append(latency)
+
+
+def bench_queue_client(server, client, count, rate, timeout):
+    """Returns the latencies and the CPU time the client's receive thread used for them."""
+    latencies = []
+    joins_before = len(server.joins)
+    client.start()
+    _wait_for_join(server, joins_before)
+    receiver = client._loop_thread if isinstance(client, IRCClient) else client.thread
+    cpu_before = _thread_cpu_ns(receiver)
+    deadline = time.monotonic() + timeout
+    consumer = threading.Thread(target=_consume_queue, args=(client.message_queue, count, latencies, deadline))
+    consumer.start()
+    _replay(server, count, rate)
+    consumer.join()
+    cpu = _thread_cpu_ns(receiver) - cpu_before
+    client.stop()
+    return latencies, cpu
+
+
+def bench_async_client(server, count, rate):
+    latencies = []
+    cpu = []
+    loop = asyncio.new_event_loop()
+    client = AsyncIRCClient("127.0.0.1", server.port, "x", "bench", CHANNEL)
+
+    async def consume():
+        runner = asyncio.ensure_future(client.run())
+        async for msg in client:
+            if msg.command == "PRIVMSG":
+                if not latencies:
+                    cpu.append(time.thread_time_ns())
+                latencies.append(_latency_ns(msg.text))
+                if len(latencies) >= count:
+                    cpu.append(time.thread_time_ns())
+                    break
+        await client.close()
+        await runner
+
+    joins_before = len(server.joins)
+    thread = threading.Thread(target=loop.run_until_complete, args=(consume(),))
+    thread.start()
+    _wait_for_join(server, joins_before)
+    _replay(server, count, rate)
+    thread.join()
+    loop.close()
+    return latencies, cpu[-1] - cpu[0]
+
+
+def _report(label, latencies, cpu_per_message):
+    if not latencies:
+        print(f"{label:<24} no messages delivered intact")
+        return
+    ms = sorted(value / 1e6 for value in latencies)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{label:<24} intact={len(ms):<6} p50={statistics.median(ms):7.3f}ms  "
+          f"p99={p99:7.3f}ms  max={ms[-1]:7.3f}ms  cpu/msg={cpu_per_message / 1e3:6.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Messages/sec; 0 sends one burst.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Give up on lost messages after this long.")
+    parser.add_argument("--rounds", type=int, default=5, help="Times each client takes a turn.")
+    args = parser.parse_args()
+
+    server = FakeTwitchServer()
+    port = server.start_in_thread()
+    clients = {
+        "legacy threaded": lambda count: bench_queue_client(
+            server, LegacyThreadedClient(port), count, args.rate, args.timeout),
+        "IRCClient (sync wrap)": lambda count: bench_queue_client(
+            server, IRCClient("127.0.0.1", port, "x", "bench", CHANNEL), count, args.rate, args.timeout),
+        "queued hand-off (old)": lambda count: bench_queue_client(
+            server, QueuedHandOffClient("127.0.0.1", port, "x", "bench", CHANNEL), count, args.rate, args.timeout),
+        "AsyncIRCClient": lambda count: bench_async_client(server, count, args.rate),
+    }
+    results = {label: [] for label in clients}
+    cpu = dict.fromkeys(clients, 0)
+    # The clients take turns over several rounds so a change in machine load lands on
+    # all of them rather than skewing whichever one happened to be running.
+    per_round = max(1, args.messages // args.rounds)
+    # The clients print every raw line; silence that so the console isn't what we measure.
+    with contextlib.redirect_stdout(NullWriter()):
+        for _ in range(args.rounds):
+            for label, bench in clients.items():
+                latencies, cpu_ns = bench(per_round)
+                results[label].extend(latencies)
+                cpu[label] += cpu_ns
+    server.stop_thread()
+
+    rate = f"{args.rate:g} msg/s" if args.rate else "single burst"
+    print(f"{args.messages} messages, {rate}")
+    cpu_per_message = {label: cpu_ns / (per_round * args.rounds) for label, cpu_ns in cpu.items()}
+    for label, latencies in results.items():
+        _report(label, latencies, cpu_per_message[label])
+
+    if cpu_per_message["IRCClient (sync wrap)"] >= cpu_per_message["queued hand-off (old)"]:
+        print("FAILED: IRCClient uses no less CPU per message than the queued hand-off it replaced")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_irc_parser.py
+"""
+Replays a high-volume chat log through LineFramer + parse_line, the same path
+IRCClient._listen_thread uses, and reports lines/sec and allocations per line.
+
+Usage:
+    python benchmarks/bench_irc_parser.py [--log recorded.log] [--lines 50000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from irc_parser import LineFramer, parse_line  # noqa: E402
+from chat_trace import load_log, synthetic_log  # noqa: E402
+
+
+def _chunks(data, size):
+    view = memoryview(data)
+    for start in range(0, len(data), size):
+        yield view[start:start + size]
+
+
+def run_pass(data, chunk_size, keep=None, touch_tags=False):
+    framer = LineFramer()
+    count = 0
+    for chunk in _chunks(data, chunk_size):
+        for line in framer.feed(chunk):
+            msg = parse_line(line)
+            if msg is None:
+                continue
+            if touch_tags:
+                msg.tags
+            if keep is not None:
+                keep.append(msg)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="Recorded raw IRC log (one line per message).")
+    parser.add_argument("--lines", type=int, default=50_000, help="Synthetic lines when no --log is given.")
+    parser.add_argument("--chunk", type=int, default=4096, help="Bytes per simulated recv().")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = load_log(args.log) if args.log else synthetic_log(args.lines)
+    data = ("\r\n".join(lines) + "\r\n").encode("utf-8")
+    print(f"Replaying {len(lines)} lines ({len(data) / 1e6:.1f} MB) in {args.chunk}-byte reads")
+
+    for touch_tags in (False, True):
+        label = "parse + tags" if touch_tags else "parse only  "
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            parsed = run_pass(data, args.chunk, touch_tags=touch_tags)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label}: {parsed / best:,.0f} lines/sec (best of {args.repeat})")
+
+    # Allocations: blocks and bytes still alive per parsed message, plus the
+    # transient peak of the framer itself.
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    parsed = run_pass(data, args.chunk, keep=kept)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    print(f"allocations: {blocks / parsed:.2f} blocks/line, {size / parsed:.0f} bytes/line retained")
+    print(f"tracemalloc peak during replay: {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
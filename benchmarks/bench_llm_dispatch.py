@@ -0,0 +1,163 @@
+# benchmarks/bench_llm_dispatch.py
+"""
+Chat ingest and !lor response time under a burst of chat, with a stub model of
+configurable latency.
+
+"blocking" is the previous main loop: each !lor calls the model inline, so chat
+waits behind it. "dispatcher" is the current one: !lor questions are coalesced on
+FairLLMScheduler and answered through futures while the loop keeps reading chat.
+Both run with the AI cooldown off, so every !lor question is answered.
+
+Response time runs from when the message entered the queue until its reply is sent;
+a question that joined a batch counts as answered by the batch's reply.
+
+Usage:
+    python benchmarks/bench_llm_dispatch.py [--messages 1000] [--latency 0.5] [--window 0.25]
+        [--max-batch 5] [--rate 0]
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_trace import chat_messages, synthetic_log  # noqa: E402
+from llm_scheduler import FairLLMScheduler  # noqa: E402
+
+
+class StubModel:
+    """Stands in for GeminiHandler: sleeps like a network call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def get_response(self, prompt):
+        time.sleep(self.latency)
+        self.calls += 1
+        return f"answer to {prompt}"
+
+    def get_batched_response(self, questions):
+        return self.get_response(" / ".join(question for _, question in questions))
+
+
+def feed(message_queue, messages, rate):
+    """Puts (arrival time, username, message) on the queue, all at once or at `rate` msg/s."""
+    start = time.perf_counter()
+    for i, (username, message) in enumerate(messages):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        message_queue.put((time.perf_counter(), username, message))
+    message_queue.put(None)
+
+
+def run_blocking(messages, model, rate):
+    message_queue = queue.Queue()
+    feeder = threading.Thread(target=feed, args=(message_queue, messages, rate))
+    feeder.start()
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        item = message_queue.get()
+        if item is None:
+            break
+        arrived, username, message = item
+        if message.lower().startswith("!lor"):
+            prompt_for_ai = message[len('!lor'):].strip()
+            if prompt_for_ai:
+                model.get_response(prompt_for_ai)
+                latencies.append(time.perf_counter() - arrived)
+    ingest_time = time.perf_counter() - start
+    feeder.join()
+    return ingest_time, time.perf_counter() - start, latencies
+
+
+def run_dispatcher(messages, model, rate, window, max_batch, timeout):
+    scheduler = FairLLMScheduler(max_concurrency=1, request_timeout=timeout)
+    scheduler.start()
+    message_queue = queue.Queue()
+    feeder = threading.Thread(target=feed, args=(message_queue, messages, rate))
+    feeder.start()
+    latencies = []
+    latencies_lock = threading.Lock()
+    futures = []
+
+    def on_reply(arrivals, future):
+        if future.exception() is None:
+            done = time.perf_counter()
+            with latencies_lock:
+                latencies.extend(done - arrived for arrived in arrivals)
+
+    open_batches = {}
+    start = time.perf_counter()
+    while True:
+        item = message_queue.get()
+        if item is None:
+            break
+        arrived, username, message = item
+        if message.lower().startswith("!lor"):
+            prompt_for_ai = message[len('!lor'):].strip()
+            if not prompt_for_ai:
+                continue
+            future, merged = scheduler.coalesce("bench", "!lor", (username, prompt_for_ai),
+                                                model.get_batched_response, window=window,
+                                                max_batch=max_batch)
+            if merged:
+                open_batches[future].append(arrived)
+            else:
+                # Questions that join later land in the same list before the batch runs.
+                arrivals = open_batches[future] = [arrived]
+                future.add_done_callback(lambda f, arrivals=arrivals: on_reply(arrivals, f))
+                futures.append(future)
+    ingest_time = time.perf_counter() - start
+    feeder.join()
+
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            pass
+    total_time = time.perf_counter() - start
+    scheduler.stop()
+    return ingest_time, total_time, latencies
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds.")
+    parser.add_argument("--window", type=float, default=0.25, help="!lor coalescing window in seconds.")
+    parser.add_argument("--max-batch", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=None, help="Per-request timeout in seconds.")
+    parser.add_argument("--rate", type=float, default=0, help="Arrival rate in msg/s (0 = whole burst at once).")
+    args = parser.parse_args()
+
+    messages = chat_messages(synthetic_log(args.messages))
+    questions = sum(1 for _, message in messages if message.lower().startswith("!lor") and message[4:].strip())
+    arrival = f"at {args.rate:g} msg/s" if args.rate else "as one burst"
+    print(f"{len(messages)} messages ({questions} !lor questions) {arrival}, stub latency {args.latency * 1e3:.0f}ms")
+    print(f"{'mode':>10} {'ingest':>12} {'model calls':>12} {'p50':>9} {'p99':>9} {'all done':>9}")
+
+    for mode in ("blocking", "dispatcher"):
+        model = StubModel(args.latency)
+        if mode == "blocking":
+            ingest_time, total_time, latencies = run_blocking(messages, model, args.rate)
+        else:
+            ingest_time, total_time, latencies = run_dispatcher(messages, model, args.rate, args.window,
+                                                                args.max_batch, args.timeout)
+        print(f"{mode:>10} {len(messages) / ingest_time:>8,.0f} msg/s {model.calls:>12} "
+              f"{percentile(latencies, 0.5):>8.2f}s {percentile(latencies, 0.99):>8.2f}s {total_time:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_memory_retrieval.py
+"""
+Prompt memory size and retrieval latency at growing memory sizes.
+Compares the full memory block (what every prompt used to carry) with the
+budgeted block from relevance-ranked retrieval.
+
+Usage:
+    python benchmarks/bench_memory_retrieval.py [--sizes 1000,10000,100000] [--queries 200]
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_handler import MemoryHandler  # noqa: E402
+from memory_index import estimate_tokens  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+SYLLABLES = "ka lo ri ven tor mi sa dun el ath gor bi nym qua zel fen ur ost pra lyn".split()
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_fact(rng, vocabulary):
+    words = [rng.choice(vocabulary) for _ in range(rng.randint(6, 14))]
+    return f"The streamer said {' '.join(words)}."
+
+
+def full_block_tokens(handler):
+    budget, handler.token_budget = handler.token_budget, None
+    try:
+        return estimate_tokens(handler.get_memory_for_prompt())
+    finally:
+        handler.token_budget = budget
+
+
+def run_size(directory, size, queries, budget, top_k, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 20_000)
+    topics = [f"Topic {name}" for name in make_vocabulary(rng, max(10, size // 100))]
+    handler = MemoryHandler(os.path.join(directory, f"memory_{size}.json"), fsync=False,
+                            compact_every=size + 1, token_budget=budget, top_k=top_k)
+
+    facts = []
+    start = time.perf_counter()
+    for _ in range(size):
+        topic, fact = rng.choice(topics), make_fact(rng, vocabulary)
+        handler.learn_fact(topic, fact)
+        facts.append(fact)
+    learn_time = time.perf_counter() - start
+
+    full_tokens = full_block_tokens(handler)
+    timings = []
+    block_tokens = []
+    for _ in range(queries):
+        words = rng.choice(facts).rstrip(".").split()[3:]
+        query = "what did you say about " + " ".join(rng.sample(words, min(3, len(words))))
+        start = time.perf_counter()
+        block = handler.get_memory_for_prompt(query)
+        timings.append(time.perf_counter() - start)
+        block_tokens.append(estimate_tokens(block))
+
+    handler.close()
+    timings.sort()
+    return {
+        "learn_us": learn_time / size * 1e6,
+        "full_tokens": full_tokens,
+        "block_tokens": statistics.mean(block_tokens),
+        "p50_ms": timings[len(timings) // 2] * 1e3,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500, help="Memory token budget.")
+    parser.add_argument("--top-k", type=int, default=40)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(NullWriter()):
+        for size in sizes:
+            results[size] = run_size(directory, size, args.queries, args.budget, args.top_k, seed=size)
+
+    print(f"token budget {args.budget}, top-k {args.top_k}, {args.queries} queries per size")
+    print(f"{'facts':>8} {'full block':>12} {'retrieved':>10} {'p50':>9} {'p99':>9} {'learn':>10}")
+    for size, r in results.items():
+        print(f"{size:>8,} {r['full_tokens']:>9,} tok {r['block_tokens']:>6,.0f} tok "
+              f"{r['p50_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms {r['learn_us']:>7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
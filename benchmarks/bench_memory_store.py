@@ -0,0 +1,110 @@
+# benchmarks/bench_memory_store.py
+"""
+Cost of persisting learned facts: the append-only log in MemoryHandler versus the
+previous full JSON rewrite per fact. Also times compaction and a cold load
+(snapshot + log replay).
+
+The old rewrite is O(total memory) per fact, so it is measured at a few sizes
+and extrapolated instead of being run all the way to 100k.
+
+Usage:
+    python benchmarks/bench_memory_store.py [--facts 100000] [--topics 1000]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_handler import MemoryHandler  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+
+def facts(count, topics):
+    for i in range(count):
+        yield f"Topic {i % topics}", f"Fact number {i} about something the streamer mentioned on stream."
+
+
+def bench_wal(directory, count, topics, fsync):
+    path = os.path.join(directory, f"wal_{int(fsync)}.json")
+    # The synthetic facts are near duplicates of each other; only skip exact repeats.
+    handler = MemoryHandler(path, fsync=fsync, compact_every=count + 1, duplicate_threshold=None)
+    start = time.perf_counter()
+    for topic, fact in facts(count, topics):
+        handler.learn_fact(topic, fact)
+    learn_time = time.perf_counter() - start
+
+    wal_size = os.path.getsize(handler.wal_path)
+    handler._wal.close()
+    handler._wal = None
+
+    start = time.perf_counter()
+    reloaded = MemoryHandler(path, fsync=fsync, duplicate_threshold=None)   # replays the log and compacts
+    load_time = time.perf_counter() - start
+    assert sum(len(t["facts"]) for t in reloaded.memory.values()) == count
+
+    start = time.perf_counter()
+    reloaded.compact()
+    compact_time = time.perf_counter() - start
+    snapshot_size = os.path.getsize(path)
+    reloaded.close()
+    return learn_time, wal_size, load_time, compact_time, snapshot_size
+
+
+def legacy_rewrite_cost(directory, sizes, topics):
+    """Seconds per fact for the old full rewrite, measured at each memory size."""
+    path = os.path.join(directory, "legacy.json")
+    memory = {}
+    results = {}
+    added = 0
+    for target in sorted(sizes):
+        for topic, fact in facts(target - added, topics):
+            memory.setdefault(topic, {"category": "General", "facts": []})["facts"].append(fact)
+        added = target
+        start = time.perf_counter()
+        for _ in range(3):
+            with open(path, 'w') as f:
+                json.dump(memory, f, indent=4)
+        results[target] = (time.perf_counter() - start) / 3
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facts", type=int, default=100_000)
+    parser.add_argument("--topics", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(NullWriter()):
+        wal_nosync = bench_wal(directory, args.facts, args.topics, fsync=False)
+        synced = min(args.facts, 5000)
+        wal_sync = bench_wal(directory, synced, args.topics, fsync=True)
+        sizes = [1000, 10_000, args.facts]
+        legacy = legacy_rewrite_cost(directory, sizes, args.topics)
+
+    learn_time, wal_size, load_time, compact_time, snapshot_size = wal_nosync
+    print(f"{args.facts:,} facts over {args.topics:,} topics")
+    print(f"append-only log, no fsync: {learn_time / args.facts * 1e6:8.1f} us/fact "
+          f"({learn_time:.2f}s total, log {wal_size / 1e6:.1f} MB)")
+    print(f"append-only log, fsync:    {wal_sync[0] / synced * 1e6:8.1f} us/fact (measured over {synced:,} facts)")
+    print(f"cold load + replay + compact: {load_time:.2f}s; compaction alone: {compact_time:.2f}s "
+          f"(snapshot {snapshot_size / 1e6:.1f} MB)")
+
+    print("previous full rewrite per fact:")
+    total = 0.0
+    previous_size, previous_cost = 0, 0.0
+    for size, cost in sorted(legacy.items()):
+        print(f"  at {size:>7,} facts: {cost * 1e3:8.1f} ms/fact")
+        # Cost grows linearly with size; integrate the segment between measurements.
+        total += (size - previous_size) * (cost + previous_cost) / 2
+        previous_size, previous_cost = size, cost
+    print(f"  estimated total to learn {args.facts:,} facts: {total / 60:.1f} minutes "
+          f"(vs {learn_time:.1f}s with the log)")
+
+
+if __name__ == "__main__":
+    main()
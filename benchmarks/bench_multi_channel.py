@@ -0,0 +1,162 @@
+# benchmarks/bench_multi_channel.py
+"""
+Runs MultiChannelRuntime with N simulated channels against the local fake server.
+Gemini is replaced by a stub with a fixed latency. Each round sends one !lor
+question to every channel at once and waits for all replies.
+Reports per-channel reply latency and process RSS.
+
+Also checks the command cooldowns of the async handlers: a !forget without a topic
+(only the usage help) must not start the !forget cooldown, and a real one must.
+Fails (exit 1) if it does not.
+
+Usage:
+    python benchmarks/bench_multi_channel.py [--channels 200] [--rounds 5] [--llm-latency 0.05]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_runtime import ChannelSession, MultiChannelRuntime  # noqa: E402
+from outbound_queue import VERIFIED_BOT_MESSAGE_LIMIT  # noqa: E402
+from fake_twitch_server import FakeTwitchServer  # noqa: E402
+from quiet import NullWriter, rss_mb  # noqa: E402
+
+
+class StubAIHandler:
+    """Stands in for GeminiHandler: sleeps like a network call and echoes the prompt."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.history = []
+        self.response_cache = None
+
+    def get_response(self, user_prompt):
+        time.sleep(self.latency)
+        self.history.append(user_prompt)
+        return f"answer to {user_prompt}"
+
+    def get_batched_response(self, questions):
+        return self.get_response(" / ".join(question for _, question in questions))
+
+
+class StubMemory:
+    def __init__(self):
+        self.memory = {}
+
+    def has_topic(self, topic):
+        return topic in self.memory
+
+    def topics(self):
+        return list(self.memory)
+
+
+async def run_benchmark(args, server):
+    channels = [f"channel{i:04d}" for i in range(args.channels)]
+    rss_before = rss_mb()
+    runtime = MultiChannelRuntime(
+        channels, "127.0.0.1", server.port, "x", "benchbot",
+        session_factory=lambda channel: ChannelSession(channel, StubAIHandler(args.llm_latency), StubMemory()),
+        channels_per_connection=args.per_connection,
+        join_rate_limit=args.join_rate, join_rate_period=10,
+        llm_max_concurrency=args.concurrency, ai_call_cooldown=0, lor_coalesce_window=0,
+        # One reply per channel per round would take minutes under the normal 20/30s
+        # limit, so benchmark with verified-bot send limits.
+        message_limit=VERIFIED_BOT_MESSAGE_LIMIT, mod_message_limit=VERIFIED_BOT_MESSAGE_LIMIT,
+    )
+    loop = asyncio.get_running_loop()
+    sent_at = {}
+    latencies = {channel: [] for channel in channels}
+    all_replied = asyncio.Event()
+    outstanding = set()
+
+    def on_reply(now, channel, text):
+        # Called on the server thread.
+        if channel in sent_at and text.endswith(sent_at[channel][0]):
+            loop.call_soon_threadsafe(record, channel, now)
+
+    def record(channel, now):
+        token, started = sent_at[channel]
+        if channel in outstanding:
+            outstanding.discard(channel)
+            latencies[channel].append(now - started)
+            if not outstanding:
+                all_replied.set()
+
+    server.privmsg_listeners.append(on_reply)
+    join_started = time.perf_counter()
+    task = asyncio.ensure_future(runtime.run())
+    while len(server.joins) < len(channels):
+        await asyncio.sleep(0.05)
+    join_time = time.perf_counter() - join_started
+
+    for round_no in range(args.rounds):
+        all_replied.clear()
+        outstanding.update(channels)
+        for channel in channels:
+            token = f"q{round_no}-{channel}"
+            sent_at[channel] = (token, time.perf_counter())
+            server.loop.call_soon_threadsafe(server.broadcast, channel, "viewer", f"!lor {token}")
+        await asyncio.wait_for(all_replied.wait(), timeout=120)
+
+    rss_after = rss_mb()
+    failures = await check_forget_cooldown(runtime, channels[0])
+    await runtime.stop()
+    await task
+    return channels, latencies, join_time, rss_before, rss_after, len(runtime.clients), failures
+
+
+async def check_forget_cooldown(runtime, channel):
+    """!forget with no topic only shows the usage, so the command's cooldown must not start."""
+    session = runtime.sessions[channel]
+    forget = session.commands.commands["forget"]
+    failures = []
+    await runtime.handle_chat(session, channel, "!forget")   # the broadcaster may use !forget
+    if forget.last_used is not None:
+        failures.append("!forget without a topic started the !forget cooldown")
+    await runtime.handle_chat(session, channel, "!forget some topic")
+    if forget.last_used is None:
+        failures.append("!forget with a topic did not start the !forget cooldown")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub Gemini latency in seconds.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Shared LLM worker threads.")
+    parser.add_argument("--per-connection", type=int, default=50)
+    parser.add_argument("--join-rate", type=int, default=2000,
+                        help="JOINs per 10s (20 for normal accounts, 2000 for verified bots).")
+    args = parser.parse_args()
+
+    server = FakeTwitchServer()
+    server.start_in_thread()
+    with contextlib.redirect_stdout(NullWriter()):
+        (channels, latencies, join_time, rss_before, rss_after, connections,
+         failures) = asyncio.run(run_benchmark(args, server))
+    server.stop_thread()
+
+    per_channel_mean = sorted(statistics.mean(values) * 1000 for values in latencies.values())
+    everything = sorted(value * 1000 for values in latencies.values() for value in values)
+    p99 = everything[min(len(everything) - 1, int(len(everything) * 0.99))]
+    print(f"{len(channels)} channels over {connections} connections, joined in {join_time:.2f}s")
+    print(f"stub LLM latency {args.llm_latency * 1000:.0f}ms, {args.concurrency} shared workers, {args.rounds} rounds")
+    print(f"reply latency: p50={statistics.median(everything):.1f}ms p99={p99:.1f}ms max={everything[-1]:.1f}ms")
+    print(f"per-channel mean latency: best={per_channel_mean[0]:.1f}ms worst={per_channel_mean[-1]:.1f}ms")
+    print(f"RSS: {rss_after:.1f} MB total (runtime added {rss_after - rss_before:.1f} MB, "
+          f"{(rss_after - rss_before) * 1024 / len(channels):.1f} KB/channel; includes the fake server)")
+    if failures:
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
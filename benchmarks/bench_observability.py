@@ -0,0 +1,132 @@
+# benchmarks/bench_observability.py
+"""
+Per-line cost of observability on the IRC receive path.
+
+Replays a chat log through LineFramer + parse_line, as AsyncIRCClient._read_loop
+does, with:
+
+    parse only       no logging or metrics, for reference
+    print (old)      print(f"<<< {line}") to line-buffered stdout, as the client used to
+    log off          the client today: DEBUG log gated per read, line counts added per read
+    log DEBUG        the same with DEBUG on, formatted as text
+
+Console output goes to os.devnull through a line-buffered stream, so this measures
+the formatting and write calls but not the terminal. A real terminal is slower still.
+Also reports the cost of single metric updates, and fails (exit 1) if the default path
+costs more per line than the old print did.
+
+Usage:
+    python benchmarks/bench_observability.py [--lines 50000] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+import structured_log  # noqa: E402
+from async_irc_client import IRC_BYTES, IRC_LINES, count_lines, log  # noqa: E402
+from chat_trace import synthetic_log  # noqa: E402
+from irc_parser import LineFramer, parse_line  # noqa: E402
+
+CHUNK = 4096
+
+
+def _chunks(data):
+    view = memoryview(data)
+    for start in range(0, len(data), CHUNK):
+        yield view[start:start + CHUNK]
+
+
+def parse_only(data):
+    framer = LineFramer()
+    for chunk in _chunks(data):
+        for line in framer.feed(chunk):
+            parse_line(line)
+
+
+def print_every_line(data):
+    framer = LineFramer()
+    for chunk in _chunks(data):
+        for line in framer.feed(chunk):
+            print(f"<<< {line}")
+            parse_line(line)
+
+
+def instrumented(data):
+    framer = LineFramer()
+    for chunk in _chunks(data):
+        IRC_BYTES.inc(len(chunk))
+        log_lines = log.isEnabledFor(logging.DEBUG)
+        counts = {}
+        for line in framer.feed(chunk):
+            if log_lines:
+                log.debug("<<< %s", line)
+            msg = parse_line(line)
+            command = None if msg is None else msg.command
+            counts[command] = counts.get(command, 0) + 1
+        count_lines(counts)
+
+
+def best_time(func, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_op_ns(func, count=200_000):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = synthetic_log(args.lines)
+    data = ("\r\n".join(lines) + "\r\n").encode("utf-8")
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        console = io.TextIOWrapper(devnull.buffer, encoding="utf-8", line_buffering=True)
+        structured_log.configure("INFO", stream=console)
+        cases = [("parse only", parse_only, None), ("print (old)", print_every_line, None),
+                 ("log off", instrumented, "INFO"), ("log DEBUG", instrumented, "DEBUG")]
+        results = {}
+        with contextlib.redirect_stdout(console):
+            for name, func, level in cases:
+                if level is not None:
+                    structured_log.set_level(level)
+                results[name] = best_time(func, data, args.repeat)
+        console.detach()
+    structured_log.set_level("INFO")
+
+    base = results["parse only"]
+    print(f"{len(lines):,} lines, best of {args.repeat}")
+    print(f"{'path':<12} {'lines/s':>11} {'ns/line':>8} {'overhead':>9}")
+    for name, elapsed in results.items():
+        print(f"{name:<12} {len(lines) / elapsed:>11,.0f} {elapsed / len(lines) * 1e9:>8.0f} "
+              f"{(elapsed - base) / len(lines) * 1e9:>7.0f}ns")
+
+    counter = IRC_LINES.labels("PRIVMSG")
+    histogram = metrics.histogram("bench_observe_seconds", "Benchmark only.").labels()
+    print(f"counter inc {per_op_ns(counter.inc):.0f}ns, histogram observe {per_op_ns(lambda: histogram.observe(0.02)):.0f}ns, "
+          f"disabled log.debug {per_op_ns(lambda: log.debug('x %s', 1)):.0f}ns")
+
+    if results["log off"] >= results["print (old)"]:
+        print("FAILED: the instrumented path is slower than printing every line")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
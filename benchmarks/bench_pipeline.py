@@ -0,0 +1,342 @@
+# benchmarks/bench_pipeline.py
+"""
+Load-tests the whole single-channel bot from main.py: IRCClient, the event bus, the
+state machine, chat commands, FairLLMScheduler and the outbound queue. It runs
+against the local fake Twitch server, with a stub in place of Gemini and voice text
+injected as if the microphone had heard it.
+
+Chat comes from a recorded log (--log) or from chat_trace's synthetic log, and is
+replayed at --rate messages/sec. With a recorded log whose lines carry tmi-sent-ts
+tags, the original timing is kept instead. --speed multiplies either, so --speed 10
+replays a recorded raid ten times faster. Every !lor question is tracked until
+the bot's reply naming its asker reaches the server. Questions still unanswered
+after --drain seconds count as dropped; the AI cooldown drops most of them during
+a raid.
+
+The report covers:
+  - throughput: achieved send rate and bus dispatch rate;
+  - ingest latency: server send to bus dispatch;
+  - !lor and voice reply latency percentiles;
+  - drop rates;
+  - RSS growth.
+With --report FILE it is also written as JSON, tagged with the git commit, so runs
+can be compared across versions. --max-p99-ms makes the run fail (exit 1) when
+!lor replies get slower than that.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--log recorded.log] [--messages 3000] [--rate 50] [--speed 1]
+                                        [--llm-latency 0.8] [--voice-interval 15] [--report report.json]
+"""
+import argparse
+import collections
+import contextlib
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from chat_trace import load_log, synthetic_log  # noqa: E402
+from event_bus import ChatMessage  # noqa: E402
+from fake_twitch_server import FakeTwitchServer  # noqa: E402
+from irc_client import IRCClient  # noqa: E402
+from irc_parser import parse_line  # noqa: E402
+from main import Assistant  # noqa: E402
+from memory_handler import MemoryHandler  # noqa: E402
+from quiet import NullWriter, rss_mb  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+CHANNEL = "testchannel"
+BOT_NICK = "benchbot"
+VOICE_LINES = ("this boss is so hard", "okay let's try the left path", "chat what should I name this horse",
+               "that was a close one", "I love this soundtrack")
+_VOICE_TOKEN = re.compile(r"voice-\d+")
+
+
+class StubGemini:
+    """
+    Stands in for GeminiHandler. Sleeps `latency` seconds (plus up to `jitter`) like
+    a network call. Answers name every asker, and echo the voice-N token of voice
+    prompts, so the harness can match replies to what caused them.
+    """
+
+    def __init__(self, latency, jitter, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.response_cache = ResponseCache(max_entries=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL,
+                                            similarity=config.RESPONSE_CACHE_SIMILARITY)
+
+    def _think(self):
+        self.calls += 1
+        time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+
+    def get_response(self, user_prompt):
+        self._think()
+        tokens = _VOICE_TOKEN.findall(user_prompt)
+        if tokens:
+            return f"Heard you on {' '.join(tokens)}, sounds fun!"
+        return "Nice, what are you trying next?"
+
+    def get_batched_response(self, questions):
+        start = time.monotonic()
+        self._think()
+        response = " ".join(f"@{username} here is my answer." for username, _ in questions)
+        if len(questions) == 1:
+            self.response_cache.put(questions[0][1], "here is my answer.", time.monotonic() - start)
+        return response
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 2)
+    return {"count": len(values), "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": at(1.0)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def schedule(messages, rate, speed, keep_timing):
+    """Offsets (seconds from the start) at which to send each (user, text, sent_ts) message."""
+    stamps = [ts for _, _, ts in messages]
+    if keep_timing and stamps and None not in stamps:
+        first = stamps[0]
+        return [max(0.0, (ts - first) / 1000 / speed) for ts in stamps]
+    interval = 1.0 / (rate * speed)
+    return [i * interval for i in range(len(messages))]
+
+
+def load_messages(args):
+    lines = load_log(args.log) if args.log else synthetic_log(args.messages, seed=args.seed, channel=CHANNEL)
+    messages = []
+    for line in lines:
+        msg = parse_line(line)
+        if msg is not None and msg.command == "PRIVMSG":
+            ts = msg.tags.get("tmi-sent-ts")
+            messages.append((msg.nick, msg.text, int(ts) if ts and ts.isdigit() else None))
+    return messages[:args.messages] if args.messages else messages
+
+
+def run(args):
+    messages = load_messages(args)
+    # Synthetic tmi-sent-ts tags are 1 ms apart; only a recorded log keeps its timing.
+    offsets = schedule(messages, args.rate or 50.0, args.speed, keep_timing=bool(args.log) and args.rate is None)
+    rng = random.Random(args.seed)
+
+    server = FakeTwitchServer()
+    server.start_in_thread()
+    workdir = tempfile.TemporaryDirectory()
+    memory = MemoryHandler(os.path.join(workdir.name, "memory.json"), fsync=False)
+    ai = StubGemini(args.llm_latency, args.llm_jitter, args.seed)
+    irc_client = IRCClient("127.0.0.1", server.port, "x", BOT_NICK, CHANNEL)
+    assistant = Assistant(irc_client, ai, memory, ai_cooldown=args.ai_cooldown)
+
+    lock = threading.Lock()
+    pending_lor = collections.defaultdict(collections.deque)   # username -> deque of send times
+    pending_voice = {}                                          # token -> injection time
+    lor_latency, voice_latency, ingest_latency = [], [], []
+    sent_at = {}
+    stats = collections.Counter()
+
+    def on_reply(now, channel, text):
+        # Server thread: match the reply to the oldest open question of each @name.
+        with lock:
+            stats["bot_messages"] += 1
+            for token in _VOICE_TOKEN.findall(text):
+                started = pending_voice.pop(token, None)
+                if started is not None:
+                    voice_latency.append(now - started)
+            for name in re.findall(r"@(\w+)", text):
+                queue = pending_lor.get(name)
+                if queue:
+                    lor_latency.append(now - queue.popleft())
+                    stats["lor_answered"] += 1
+
+    def on_dispatched(event):
+        nonce = event.source.tags.get("client-nonce") if event.source is not None else None
+        started = sent_at.pop(nonce, None)
+        if started is not None:
+            ingest_latency.append(time.perf_counter() - started)
+
+    server.privmsg_listeners.append(on_reply)
+    assistant.bus.subscribe(ChatMessage, on_dispatched)
+    rss_samples = []
+
+    assistant.start()
+    bus_thread = threading.Thread(target=assistant.run, name="bot-bus", daemon=True)
+    bus_thread.start()
+    irc_client.connect(timeout=10)
+    while CHANNEL not in server.call(server.joined_channels):
+        time.sleep(0.01)
+
+    rss_start = rss_mb()
+    # Voice keeps pace with the replay: at --speed 10 the streamer talks ten times as often.
+    voice_step = args.voice_interval / args.speed
+    next_voice = voice_step or None
+    voice_ids = itertools.count()
+    start = time.perf_counter()
+    next_sample = start
+    for seq, ((user, text, _), offset) in enumerate(zip(messages, offsets)):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        if now >= next_sample:
+            rss_samples.append((now - start, rss_mb()))
+            next_sample = now + 1.0
+        nonce = str(seq)
+        with lock:
+            sent_at[nonce] = now
+            if text.startswith("!lor ") and len(text) > 5:
+                pending_lor[user].append(now)
+                stats["lor_questions"] += 1
+        server.loop.call_soon_threadsafe(server.broadcast, CHANNEL, user, text, f"client-nonce={nonce}")
+        stats["chat_sent"] += 1
+        if next_voice is not None and now - start >= next_voice:
+            next_voice += voice_step
+            token = f"voice-{next(voice_ids)}"
+            line = rng.choice(VOICE_LINES)
+            # Half of the lines name the bot, so they are answered even while chat is busy.
+            text = f"hey lorelei {line} {token}" if rng.random() < 0.5 else f"{line} {token}"
+            with lock:
+                pending_voice[token] = time.perf_counter()
+            assistant.on_voice_recognized(text)
+            stats["voice_injected"] += 1
+    send_time = time.perf_counter() - start
+
+    deadline = time.perf_counter() + args.drain
+    while time.perf_counter() < deadline:
+        with lock:
+            open_lor = sum(len(queue) for queue in pending_lor.values())
+            done = not open_lor and not pending_voice and not sent_at
+        if done:
+            break
+        time.sleep(0.05)
+    rss_end = rss_mb()
+    elapsed = time.perf_counter() - start
+    bus_metrics = assistant.bus.metrics()
+    outbound = irc_client._client.outbound.metrics()
+    irc_client.stop()
+    assistant.stop()
+    bus_thread.join(5)
+    server.stop_thread()
+    workdir.cleanup()
+
+    with lock:
+        unanswered_lor = sum(len(queue) for queue in pending_lor.values())
+        unanswered_voice = len(pending_voice)
+    rss_peak = max([rss for _, rss in rss_samples] + [rss_start, rss_end])
+    return {
+        "commit": git_commit(),
+        "config": {"messages": len(messages), "source": args.log or "synthetic", "rate": args.rate,
+                   "speed": args.speed, "llm_latency": args.llm_latency, "llm_jitter": args.llm_jitter,
+                   "ai_cooldown": args.ai_cooldown, "voice_interval": args.voice_interval, "seed": args.seed},
+        "throughput": {
+            "chat_sent": stats["chat_sent"],
+            "send_seconds": round(send_time, 3),
+            "send_rate": round(stats["chat_sent"] / send_time, 1) if send_time else None,
+            "target_rate": round(len(messages) / offsets[-1], 1) if offsets and offsets[-1] else None,
+            "dispatched": bus_metrics["dispatched"],
+            "dispatch_rate": round(bus_metrics["dispatched"] / elapsed, 1),
+            "chat_delivered": stats["chat_sent"] - len(sent_at),
+            "bot_messages": stats["bot_messages"],
+            "model_calls": ai.calls,
+            "max_bus_depth": bus_metrics["max_depth"],
+            "max_send_queue_depth": outbound["max_queue_depth"],
+        },
+        "latency_ms": {
+            "ingest": percentiles(ingest_latency),
+            "lor_reply": percentiles(lor_latency),
+            "voice_reply": percentiles(voice_latency),
+        },
+        "drops": {
+            "lor_questions": stats["lor_questions"],
+            "lor_answered": stats["lor_answered"],
+            "lor_dropped": unanswered_lor,
+            "lor_drop_rate": round(unanswered_lor / stats["lor_questions"], 4) if stats["lor_questions"] else 0.0,
+            "voice_injected": stats["voice_injected"],
+            "voice_unanswered": unanswered_voice,
+            "cache_hits": ai.response_cache.metrics()["hits"],
+            "duplicate_sends_dropped": outbound["dropped_duplicates"],
+        },
+        "memory_mb": {
+            "rss_start": round(rss_start, 1), "rss_peak": round(rss_peak, 1), "rss_end": round(rss_end, 1),
+            "growth": round(rss_end - rss_start, 1),
+            "growth_per_1k_messages": round((rss_end - rss_start) * 1000 / max(1, stats["chat_sent"]), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="Recorded raw IRC log (one line per message).")
+    parser.add_argument("--messages", type=int, default=3000, help="Messages to replay (0: the whole --log).")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Chat messages/sec (default 50, or the recorded timing with --log).")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier.")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Stub Gemini latency in seconds.")
+    parser.add_argument("--llm-jitter", type=float, default=0.4, help="Extra random stub latency, up to this.")
+    parser.add_argument("--ai-cooldown", type=float, default=config.AI_CALL_COOLDOWN)
+    parser.add_argument("--voice-interval", type=float, default=15.0,
+                        help="Seconds between injected voice lines (0: none).")
+    parser.add_argument("--drain", type=float, default=15.0, help="Seconds to wait for replies after the replay.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", help="Also write the report as JSON to this file.")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if the !lor reply p99 exceeds this.")
+    args = parser.parse_args()
+
+    # The bot's own console output would only slow the run down.
+    with contextlib.redirect_stdout(NullWriter()):
+        report = run(args)
+    throughput, latency, drops, memory = (report["throughput"], report["latency_ms"], report["drops"],
+                                          report["memory_mb"])
+    print(f"{throughput['chat_sent']:,} chat messages in {throughput['send_seconds']:.1f}s "
+          f"({throughput['send_rate']:,.0f}/s, target {throughput['target_rate'] or 0:,.0f}/s); "
+          f"{throughput['dispatched']:,} events dispatched, max bus depth {throughput['max_bus_depth']:,}")
+    print(f"{'latency':<12} {'count':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for name, values in latency.items():
+        if values:
+            print(f"{name:<12} {values['count']:>7,} {values['p50']:>7.1f}ms {values['p90']:>7.1f}ms "
+                  f"{values['p99']:>7.1f}ms {values['max']:>7.1f}ms")
+    print(f"!lor: {drops['lor_questions']} asked, {drops['lor_answered']} answered, {drops['lor_dropped']} dropped "
+          f"({drops['lor_drop_rate']:.0%}); voice: {drops['voice_injected']} injected, "
+          f"{drops['voice_unanswered']} unanswered; {throughput['model_calls']} model calls")
+    print(f"RSS {memory['rss_start']:.1f} -> {memory['rss_end']:.1f} MB (peak {memory['rss_peak']:.1f}, "
+          f"{memory['growth_per_1k_messages']:.3f} MB per 1k messages)")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+    failures = []
+    if throughput["chat_delivered"] < throughput["chat_sent"]:
+        failures.append(f"{throughput['chat_sent'] - throughput['chat_delivered']} chat messages never dispatched")
+    lor_p99 = latency["lor_reply"]["p99"] if latency["lor_reply"] else None
+    if args.max_p99_ms is not None and lor_p99 is not None and lor_p99 > args.max_p99_ms:
+        failures.append(f"!lor reply p99 {lor_p99:.0f}ms is over {args.max_p99_ms:.0f}ms")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# benchmarks/bench_reconnect.py
+"""
+Chaos test for AsyncIRCClient reconnects against the local fake server.
+
+Scenarios, each run against a connected and joined client:
+
+    RECONNECT     the server asks the client to reconnect
+    drop          the server aborts the TCP connection; replies sent during the
+                  gap must go out after the rejoin
+    outage        the connection drops and the server refuses connections for a
+                  while; reports the backoff spacing between attempts. Replies
+                  queued at the start of the outage outlive the TTL and must be
+                  dropped, replies queued near its end must be delivered
+    silent peer   the server stops answering without closing the socket; only the
+                  keepalive PING can notice
+    herd          --clients connections dropped at once; reports how jitter
+                  spreads their reconnect attempts
+
+Timings are scaled down (sub-second backoff, 1 s keepalive) so a run takes about
+half a minute. Fails (exit 1) if a RECONNECT is not followed within 0.5 s, a
+silent peer is not detected within keepalive interval + timeout + 0.5 s, or
+buffered replies are lost or sent stale.
+
+Usage:
+    python benchmarks/bench_reconnect.py [--outage 4] [--clients 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_irc_client import AsyncIRCClient  # noqa: E402
+from outbound_queue import OutboundScheduler  # noqa: E402
+from fake_twitch_server import FakeTwitchServer  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+RECONNECT_DELAY = 0.1
+MAX_RECONNECT_DELAY = 1.0
+KEEPALIVE_INTERVAL = 1.0
+KEEPALIVE_TIMEOUT = 0.5
+MESSAGE_TTL = 3.0
+SLACK = 0.5
+# The bot's own channel, where it has moderator send limits rather than one message a second.
+CHANNEL = "benchbot"
+
+
+def make_client(server, channel):
+    return AsyncIRCClient(
+        "127.0.0.1", server.port, "x", "benchbot", channel,
+        reconnect_delay=RECONNECT_DELAY, max_reconnect_delay=MAX_RECONNECT_DELAY,
+        keepalive_interval=KEEPALIVE_INTERVAL, keepalive_timeout=KEEPALIVE_TIMEOUT,
+        connect_timeout=1.0, outbound=OutboundScheduler(ttl=MESSAGE_TTL)
+    )
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+def joined_since(server, channel, since):
+    return any(at >= since and name == channel for at, name in list(server.joins))
+
+
+def delivered(server, texts):
+    sent = {text for _, _, text in list(server.sent_by_bot)}
+    return [text for text in texts if text in sent]
+
+
+async def time_rejoin(server, channel, since, timeout=10):
+    if not await wait_until(lambda: joined_since(server, channel, since), timeout):
+        return None
+    return min(at for at, name in list(server.joins) if at >= since and name == channel) - since
+
+
+async def run_benchmark(args, server):
+    results = {}
+    failures = []
+    client = make_client(server, CHANNEL)
+    task = asyncio.ensure_future(client.run())
+    await wait_until(lambda: joined_since(server, CHANNEL, 0), 5)
+
+    # --- RECONNECT ---
+    times = []
+    for _ in range(5):
+        started = time.monotonic()
+        server.call(server.reconnect_all)
+        times.append(await time_rejoin(server, CHANNEL, started))
+    results["RECONNECT"] = times
+    if None in times or max(times) > 0.5:
+        failures.append(f"RECONNECT rejoin took {times} s (limit 0.5 s)")
+
+    # --- drop, with replies sent during the gap ---
+    times = []
+    texts = []
+    for round_no in range(5):
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        server.call(server.drop_all)
+        # A line written before the client sees the reset is lost with the socket (IRC
+        # has no acks); the queue covers the gap after that.
+        await wait_until(lambda: not client.is_connected, 1)
+        for i in range(3):
+            text = f"drop-{round_no}-{i}"
+            texts.append(text)
+            await client.send_privmsg(text)
+        times.append(await time_rejoin(server, CHANNEL, started))
+        client.backoff.reset()  # each drop stands alone; the outage below tests the growth
+    await wait_until(lambda: len(delivered(server, texts)) == len(texts), 5)
+    results["drop"] = times
+    lost = len(texts) - len(delivered(server, texts))
+    results["drop_buffered"] = (len(texts), lost)
+    if None in times:
+        failures.append("client did not rejoin after a dropped connection")
+    if lost:
+        failures.append(f"{lost} of {len(texts)} replies sent during a drop were lost")
+
+    # --- outage with connection refusals ---
+    client.backoff.reset()
+    stale = [f"stale-{i}" for i in range(5)]
+    fresh = [f"fresh-{i}" for i in range(5)]
+    started = time.monotonic()
+    server.refuse_connections = True
+    server.call(server.drop_all)
+    await wait_until(lambda: not client.is_connected, 1)
+    for text in stale:
+        await client.send_privmsg(text)
+    await asyncio.sleep(args.outage - 0.5)
+    for text in fresh:
+        await client.send_privmsg(text)
+    await asyncio.sleep(0.5)
+    server.refuse_connections = False
+    ended = time.monotonic()
+    attempts = [at for at in list(server.connects) if started <= at < ended]
+    recovered = await time_rejoin(server, CHANNEL, ended)
+    await wait_until(lambda: len(delivered(server, fresh)) == len(fresh), 5)
+    await asyncio.sleep(0.2)
+    gaps = [b - a for a, b in zip(attempts, attempts[1:])]
+    results["outage"] = (attempts, gaps, recovered)
+    results["outage_messages"] = (len(delivered(server, fresh)), len(delivered(server, stale)),
+                                  client.outbound.expired)
+    if recovered is None:
+        failures.append("client did not recover after the outage")
+    if gaps and max(gaps) > MAX_RECONNECT_DELAY + SLACK:
+        failures.append(f"backoff gap {max(gaps):.2f} s exceeds the {MAX_RECONNECT_DELAY:g} s cap")
+    if len(delivered(server, fresh)) != len(fresh):
+        failures.append("replies queued near the end of the outage were not delivered")
+    if delivered(server, stale):
+        failures.append("replies older than the TTL were sent after the outage")
+
+    # --- silent peer ---
+    client.backoff.reset()
+    times = []
+    for _ in range(3):
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        server.call(server.silence_all)
+        times.append(await time_rejoin(server, CHANNEL, started))
+    results["silent peer"] = times
+    limit = KEEPALIVE_INTERVAL + KEEPALIVE_TIMEOUT + SLACK
+    if None in times or max(times) > limit:
+        failures.append(f"silent peer detection took {times} s (limit {limit:g} s)")
+
+    await client.close()
+    await task
+
+    # --- herd ---
+    herd = [make_client(server, f"herd{i}") for i in range(args.clients)]
+    tasks = [asyncio.ensure_future(c.run()) for c in herd]
+    await wait_until(lambda: all(joined_since(server, f"herd{i}", 0) for i in range(args.clients)), 10)
+    started = time.monotonic()
+    server.refuse_connections = True
+    server.call(server.drop_all)
+    await asyncio.sleep(MAX_RECONNECT_DELAY * 2)
+    server.refuse_connections = False
+    first_attempts = sorted(at - started for at in list(server.connects) if at >= started)[:args.clients]
+    results["herd"] = first_attempts
+    await wait_until(lambda: all(joined_since(server, f"herd{i}", started) for i in range(args.clients)), 10)
+    for c in herd:
+        await c.close()
+    await asyncio.gather(*tasks)
+    return results, failures
+
+
+def _ms(values):
+    return " ".join(f"{v * 1000:.0f}" if v is not None else "-" for v in values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outage", type=float, default=4.0, help="Seconds the server refuses connections.")
+    parser.add_argument("--clients", type=int, default=20, help="Connections in the herd scenario.")
+    args = parser.parse_args()
+    if args.outage <= MESSAGE_TTL:
+        parser.error(f"--outage must be longer than the {MESSAGE_TTL:g}s message TTL")
+
+    server = FakeTwitchServer()
+    server.start_in_thread()
+    with contextlib.redirect_stdout(NullWriter()):
+        results, failures = asyncio.run(run_benchmark(args, server))
+    server.stop_thread()
+
+    print(f"backoff {RECONNECT_DELAY:g}s doubling to {MAX_RECONNECT_DELAY:g}s with full jitter, "
+          f"keepalive {KEEPALIVE_INTERVAL:g}s + {KEEPALIVE_TIMEOUT:g}s, message TTL {MESSAGE_TTL:g}s")
+    print(f"{'scenario':<12} rejoin times (ms)")
+    print(f"{'RECONNECT':<12} {_ms(results['RECONNECT'])}")
+    total, lost = results["drop_buffered"]
+    print(f"{'drop':<12} {_ms(results['drop'])}   ({total - lost}/{total} replies from the gaps delivered)")
+    print(f"{'silent peer':<12} {_ms(results['silent peer'])}")
+
+    attempts, gaps, recovered = results["outage"]
+    fresh, stale, expired = results["outage_messages"]
+    print(f"outage {args.outage:g}s: {len(attempts)} connection attempts, "
+          f"gaps (ms): {_ms(gaps)}")
+    print(f"  recovered {recovered * 1000 if recovered is not None else float('nan'):.0f}ms after the outage; "
+          f"{fresh} recent replies delivered, {stale} stale replies sent, {expired} expired")
+
+    herd = results["herd"]
+    if herd:
+        print(f"herd of {args.clients}: first retries spread over {(herd[-1] - herd[0]) * 1000:.0f}ms "
+              f"(stdev {statistics.pstdev(herd) * 1000:.0f}ms)")
+
+    if failures:
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/bench_startup.py
+"""
+Time from launch to the first chat message processed, for main.py's startup.
+
+Runs the single-channel bot against the local fake server twice:
+
+    sequential   the old order: build Gemini, open and calibrate the microphone,
+                 then connect to chat
+    parallel     main.start_assistant(): chat connects at once while Gemini and
+                 voice come up on background threads
+
+Gemini and voice initialization are stand-ins that sleep for as long as the real
+ones take: --gemini-init defaults to the measured import time of
+google.generativeai when it is installed (else 1.5 s), and --voice-init to the 2 s
+ambient-noise calibration (use 0.1 for a saved calibration). As soon as the bot
+has joined, a viewer sends !memory and !lor. The run reports when the bot has
+joined, when it answers !memory (first message processed; needs no AI) and when
+it answers !lor (first AI answer).
+
+Also reports how long `import main` takes in a fresh interpreter.
+
+Usage:
+    python benchmarks/bench_startup.py [--gemini-init 1.5] [--voice-init 2.0] [--llm-latency 0.3]
+"""
+import argparse
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import StubGemini  # noqa: E402
+from fake_twitch_server import FakeTwitchServer  # noqa: E402
+from irc_client import IRCClient  # noqa: E402
+from main import Assistant, start_assistant  # noqa: E402
+from memory_handler import MemoryHandler  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+CHANNEL = "testchannel"
+BOT_NICK = "benchbot"
+DEFAULT_GEMINI_INIT = 1.5
+
+
+def import_time(statement):
+    """Seconds `statement` takes in a fresh interpreter run from the repo root, or None if it fails."""
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def run_startup(mode, args, server, workdir):
+    """Starts the bot in `mode`; returns (joined, first reply, first AI reply) seconds after launch, or None."""
+    replies = {}
+    done = threading.Event()
+
+    def on_reply(now, channel, text):
+        for key, marker in (("memory", "memory"), ("lor", "@viewer1 ")):
+            if marker in text and key not in replies:
+                replies[key] = now
+        if len(replies) == 2:
+            done.set()
+
+    server.privmsg_listeners[:] = [on_reply]
+    memory = MemoryHandler(os.path.join(workdir, f"{mode}.json"), fsync=False)
+    irc_client = IRCClient("127.0.0.1", server.port, "x", BOT_NICK, CHANNEL)
+
+    def build_ai():
+        time.sleep(args.gemini_init)
+        return StubGemini(args.llm_latency, 0, 1)
+
+    def voice(assistant):
+        time.sleep(args.voice_init)
+
+    joins_before = len(server.joins)
+    launched = time.perf_counter()
+    if mode == "sequential":
+        ai = build_ai()
+        assistant = Assistant(irc_client, ai, memory, ai_cooldown=0)
+        voice(assistant)
+        assistant.start()
+    else:
+        assistant, _, _ = start_assistant(irc_client, memory, build_ai, voice, response_cache=ResponseCache(),
+                                          ai_cooldown=0)
+    bus_thread = threading.Thread(target=assistant.run, daemon=True)
+    bus_thread.start()
+
+    while len(server.joins) == joins_before:
+        time.sleep(0.001)
+    joined = time.perf_counter() - launched
+    server.loop.call_soon_threadsafe(server.broadcast, CHANNEL, "viewer0", "!memory")
+    server.loop.call_soon_threadsafe(server.broadcast, CHANNEL, "viewer1", "!lor what game is this")
+    done.wait(30)
+
+    assistant.stop()
+    irc_client.stop()
+    if len(replies) < 2:
+        return None
+    return joined, replies["memory"] - launched, replies["lor"] - launched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gemini-init", type=float, help="Seconds to import and configure Gemini.")
+    parser.add_argument("--voice-init", type=float, default=2.0, help="Seconds to open and calibrate the microphone.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Stub Gemini answer latency.")
+    args = parser.parse_args()
+
+    genai_import = import_time("import google.generativeai")
+    if args.gemini_init is None:
+        args.gemini_init = genai_import if genai_import is not None else DEFAULT_GEMINI_INIT
+    main_import = import_time("import main")
+
+    server = FakeTwitchServer()
+    server.start_in_thread()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(NullWriter()):
+        for mode in ("sequential", "parallel"):
+            results[mode] = run_startup(mode, args, server, workdir)
+    server.stop_thread()
+
+    source = "measured import" if genai_import is not None and args.gemini_init == genai_import else "simulated"
+    print(f"Gemini init {args.gemini_init:.2f}s ({source}), voice init {args.voice_init:.2f}s, "
+          f"LLM answer {args.llm_latency:.2f}s")
+    if main_import is not None:
+        print(f"import main: {main_import * 1000:.0f}ms in a fresh interpreter")
+    print(f"{'startup':<12} {'joined':>9} {'first reply':>12} {'first AI reply':>15}")
+    for mode, result in results.items():
+        if result is None:
+            print(f"{mode:<12} no reply within 30s")
+            continue
+        joined, first, first_ai = result
+        print(f"{mode:<12} {joined * 1000:>7.0f}ms {first * 1000:>10.0f}ms {first_ai * 1000:>13.0f}ms")
+    print("(the first AI reply includes the !lor batching window)")
+    if None in results.values():
+        print("FAILED: the bot did not answer both commands")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
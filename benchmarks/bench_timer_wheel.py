@@ -0,0 +1,349 @@
+# benchmarks/bench_timer_wheel.py
+"""
+Simulates 10k channels' worth of bot timers on a virtual clock and checks that they
+fire correctly. Each channel has:
+
+  - an inactivity timer, reset by every chat message;
+  - a reply timeout, started when the inactivity prompt asks a question and
+    cancelled by the next chat message;
+  - a cooldown expiry, started by !lor.
+
+Three schedulers replay the same chat trace:
+
+    wheel    timer_wheel.TimerWheel: O(1) reset and cancel
+    heap     heapq with lazy cancellation: every reset pushes a new entry
+    polling  the old approach: scan every channel's deadlines once a second
+
+All three must fire the same (channel, timer, due time) set as the heap, which fires
+exactly on time. Fires may not be early, and may be late by at most one tick (wheel)
+or one poll interval (polling). A chat message that lands in that window resets a timer
+that is already overdue, so the timer never fires; those are counted as "overdue"
+and must account for every fire the heap made and the others missed.
+
+Usage:
+    python benchmarks/bench_timer_wheel.py [--channels 10000] [--duration 1800] [--rate 0.05] [--tick 0.1]
+"""
+import argparse
+import array
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_wheel import TimerWheel  # noqa: E402
+
+INACTIVITY = 300.0
+REPLY_TIMEOUT = 60.0
+COOLDOWN = 10.0
+LOR_SHARE = 0.05
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def chat_trace(channels, duration, rate, seed):
+    """Yields (time, channel, is_lor) in time order. Rates vary per channel; some go quiet for a while."""
+    rng = random.Random(seed)
+    rates = [min(2.0, rate * rng.lognormvariate(0, 1.2)) for _ in range(channels)]
+    quiet = [(start, start + rng.uniform(300, 900)) if rng.random() < 0.3 else (duration, duration)
+             for start in (rng.uniform(0, duration) for _ in range(channels))]
+    upcoming = [(rng.expovariate(rates[c]), c) for c in range(channels)]
+    heapq.heapify(upcoming)
+    while upcoming:
+        t, channel = heapq.heappop(upcoming)
+        if t >= duration:
+            continue
+        start, end = quiet[channel]
+        if start <= t < end:
+            heapq.heappush(upcoming, (end, channel))
+            continue
+        yield t, channel, rng.random() < LOR_SHARE
+        heapq.heappush(upcoming, (t + rng.expovariate(rates[channel]), channel))
+
+
+class Channel:
+    __slots__ = ("inactivity", "reply", "cooldown", "cooldown_until", "prompted",
+                 "inactive_due", "reply_due", "cooldown_due")
+
+    def __init__(self):
+        self.inactivity = self.reply = self.cooldown = None
+        self.cooldown_until = 0.0
+        self.prompted = False
+        # Deadlines, for the polling scheduler only.
+        self.inactive_due = self.reply_due = self.cooldown_due = None
+
+
+class Simulation:
+    """
+    The bot logic shared by the schedulers. Decisions depend only on due times, never
+    on how late a timer fired, so every scheduler must produce the same fire log.
+    """
+
+    def __init__(self, clock, channels):
+        self.clock = clock
+        self.channels = [Channel() for _ in range(channels)]
+        self.fires = []
+        self.overdue = []   # timers reset or cancelled after their due time but before they fired
+        self.lateness = []
+        self.ops = 0
+
+    def missed(self, channel, kind, due):
+        if due <= self.clock.now:
+            self.overdue.append((channel, kind, round(due, 6)))
+
+    def fired(self, channel, kind, due):
+        self.fires.append((channel, kind, round(due, 6)))
+        late = self.clock.now - due
+        if late < -1e-9:
+            raise AssertionError(f"{kind} timer for channel {channel} fired {-late:.3f}s early")
+        self.lateness.append(late)
+
+
+class WheelRun(Simulation):
+    def __init__(self, clock, channels, tick):
+        super().__init__(clock, channels)
+        self.wheel = TimerWheel(tick=tick, clock=clock)
+        for index, channel in enumerate(self.channels):
+            channel.inactivity = self.wheel.schedule(INACTIVITY, self.on_inactive, index)
+            self.ops += 1
+
+    def advance(self, now):
+        # Wake up the way the bus does: at next_due(), not only when the next message arrives.
+        wheel = self.wheel
+        next_due = wheel.next_due()
+        while next_due is not None and next_due <= now:
+            self.clock.now = max(self.clock.now, next_due)
+            wheel.advance(self.clock.now)
+            next_due = wheel.next_due()
+        self.clock.now = now
+
+    def size(self):
+        return len(self.wheel)
+
+    def chat(self, index, is_lor):
+        channel = self.channels[index]
+        channel.prompted = False
+        if channel.inactivity.pending:
+            self.missed(index, "inactivity", channel.inactivity.due)
+        channel.inactivity.reset(INACTIVITY)
+        self.ops += 1
+        if channel.reply is not None and channel.reply.pending:
+            self.missed(index, "reply_timeout", channel.reply.due)
+            channel.reply.cancel()
+            self.ops += 1
+        if is_lor and self.clock.now >= channel.cooldown_until:
+            channel.cooldown_until = self.clock.now + COOLDOWN
+            channel.cooldown = self.wheel.schedule(COOLDOWN, self.on_cooldown, index, channel.cooldown_until)
+            self.ops += 1
+
+    def on_inactive(self, index):
+        channel = self.channels[index]
+        due = channel.inactivity.due
+        self.fired(index, "inactivity", due)
+        if not channel.prompted:
+            channel.prompted = True
+            channel.reply = self.wheel.schedule(due + REPLY_TIMEOUT - self.clock.now, self.on_reply_timeout, index,
+                                                due + REPLY_TIMEOUT)
+            self.ops += 1
+
+    def on_reply_timeout(self, index, due):
+        self.fired(index, "reply_timeout", due)
+
+    def on_cooldown(self, index, due):
+        # A fresh !lor can replace channel.cooldown between the due time and this tick.
+        self.fired(index, "cooldown", due)
+
+
+class HeapRun(Simulation):
+    def __init__(self, clock, channels):
+        super().__init__(clock, channels)
+        self.heap = []
+        self.seq = itertools.count()
+        for index, channel in enumerate(self.channels):
+            channel.inactivity = self.push(INACTIVITY, "inactivity", index)
+
+    def push(self, delay, kind, index):
+        entry = [self.clock.now + delay, next(self.seq), kind, index, True]
+        heapq.heappush(self.heap, entry)
+        self.ops += 1
+        return entry
+
+    def cancel(self, entry):
+        if entry is not None and entry[4]:
+            entry[4] = False
+            self.ops += 1
+
+    def advance(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            due, _, kind, index, alive = entry
+            if not alive:
+                continue
+            entry[4] = False
+            self.clock.now = max(self.clock.now, due)
+            getattr(self, "on_" + kind)(index, due)
+        self.clock.now = now
+
+    def size(self):
+        return len(self.heap)
+
+    def chat(self, index, is_lor):
+        channel = self.channels[index]
+        channel.prompted = False
+        self.cancel(channel.inactivity)
+        channel.inactivity = self.push(INACTIVITY, "inactivity", index)
+        self.cancel(channel.reply)
+        if is_lor and self.clock.now >= channel.cooldown_until:
+            channel.cooldown_until = self.clock.now + COOLDOWN
+            channel.cooldown = self.push(COOLDOWN, "cooldown", index)
+
+    def on_inactivity(self, index, due):
+        channel = self.channels[index]
+        self.fired(index, "inactivity", due)
+        if not channel.prompted:
+            channel.prompted = True
+            channel.reply = self.push(due + REPLY_TIMEOUT - self.clock.now, "reply", index)
+
+    def on_reply(self, index, due):
+        self.fired(index, "reply_timeout", due)
+
+    def on_cooldown(self, index, due):
+        self.fired(index, "cooldown", due)
+
+
+class PollingRun(Simulation):
+    def __init__(self, clock, channels, interval=1.0):
+        super().__init__(clock, channels)
+        self.interval = interval
+        self.next_poll = interval
+        self.scans = 0
+        for channel in self.channels:
+            channel.inactive_due = INACTIVITY
+
+    def advance(self, now):
+        while self.next_poll <= now:
+            self.clock.now = self.next_poll
+            self.poll()
+            self.next_poll += self.interval
+        self.clock.now = now
+
+    def size(self):
+        return len(self.channels)
+
+    def poll(self):
+        now = self.clock.now
+        for index, channel in enumerate(self.channels):
+            self.scans += 1
+            if channel.inactive_due is not None and channel.inactive_due <= now:
+                due, channel.inactive_due = channel.inactive_due, None
+                self.fired(index, "inactivity", due)
+                if not channel.prompted:
+                    channel.prompted = True
+                    channel.reply_due = due + REPLY_TIMEOUT
+            if channel.reply_due is not None and channel.reply_due <= now:
+                due, channel.reply_due = channel.reply_due, None
+                self.fired(index, "reply_timeout", due)
+            if channel.cooldown_due is not None and channel.cooldown_due <= now:
+                due, channel.cooldown_due = channel.cooldown_due, None
+                self.fired(index, "cooldown", due)
+
+    def chat(self, index, is_lor):
+        channel = self.channels[index]
+        channel.prompted = False
+        if channel.inactive_due is not None:
+            self.missed(index, "inactivity", channel.inactive_due)
+        if channel.reply_due is not None:
+            self.missed(index, "reply_timeout", channel.reply_due)
+        channel.inactive_due = self.clock.now + INACTIVITY
+        channel.reply_due = None
+        self.ops += 1
+        if is_lor and self.clock.now >= channel.cooldown_until:
+            if channel.cooldown_due is not None:
+                self.missed(index, "cooldown", channel.cooldown_due)
+            channel.cooldown_until = self.clock.now + COOLDOWN
+            channel.cooldown_due = channel.cooldown_until
+
+
+def replay(run, clock, trace, duration):
+    messages = 0
+    peak = run.size()
+    start = time.perf_counter()
+    for t, channel, is_lor in zip(*trace):
+        run.advance(t)
+        clock.now = t
+        run.chat(channel, is_lor)
+        messages += 1
+        if messages % 1000 == 0:
+            peak = max(peak, run.size())
+    run.advance(duration + INACTIVITY + REPLY_TIMEOUT + 2)
+    return time.perf_counter() - start, messages, max(peak, run.size())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=1800.0, help="Virtual seconds of chat.")
+    parser.add_argument("--rate", type=float, default=0.05, help="Median chat messages/sec per channel.")
+    parser.add_argument("--tick", type=float, default=0.1, help="Timer wheel tick in seconds.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Generated once, compactly, so trace generation stays out of the timings.
+    trace = (array.array("d"), array.array("i"), bytearray())
+    for t, channel, is_lor in chat_trace(args.channels, args.duration, args.rate, args.seed):
+        trace[0].append(t)
+        trace[1].append(channel)
+        trace[2].append(is_lor)
+
+    results = {}
+    for name in ("wheel", "heap", "polling"):
+        clock = VirtualClock()
+        if name == "wheel":
+            run = WheelRun(clock, args.channels, args.tick)
+        elif name == "heap":
+            run = HeapRun(clock, args.channels)
+        else:
+            run = PollingRun(clock, args.channels)
+        elapsed, messages, peak = replay(run, clock, trace, args.duration)
+        results[name] = (run, elapsed, messages, peak)
+
+    messages = results["wheel"][2]
+    print(f"{args.channels:,} channels, {messages:,} chat messages over {args.duration:.0f}s virtual time")
+    print(f"{'':<8} {'wall':>8} {'msgs/s':>10} {'timer ops':>10} {'fires':>8} {'overdue':>8} {'peak size':>10} "
+          f"{'mean late':>10} {'max late':>9}")
+    for name, (run, elapsed, _, peak) in results.items():
+        late = run.lateness
+        print(f"{name:<8} {elapsed:>7.2f}s {messages / elapsed:>10,.0f} {run.ops:>10,} {len(run.fires):>8,} "
+              f"{len(run.overdue):>8,} {peak:>10,} {sum(late) / max(1, len(late)) * 1000:>8.1f}ms "
+              f"{max(late, default=0) * 1000:>7.1f}ms")
+    print(f"polling scanned {results['polling'][0].scans:,} channel deadlines")
+
+    failures = []
+    reference = sorted(results["heap"][0].fires)
+    for name, bound in (("wheel", args.tick), ("polling", 1.0)):
+        run = results[name][0]
+        if sorted(run.fires + run.overdue) != reference:
+            failures.append(f"{name} fired a different set of timers than the heap")
+        if max(run.lateness, default=0) > bound + 1e-6:
+            failures.append(f"{name} fired more than {bound}s late")
+    kinds = {kind for _, kind, _ in reference}
+    if kinds != {"inactivity", "reply_timeout", "cooldown"}:
+        failures.append(f"only {sorted(kinds)} timers fired")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print(f"all schedulers fired the same {len(reference):,} timers; wheel metrics {results['wheel'][0].wheel.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_tls_connect.py
+"""
+Connect and first-message latency for plaintext IRC, TLS with a full handshake
+on every connect, and TLS resuming the previous session (ResumableTLSContext),
+against the local fake server with a fresh self-signed certificate. The servers
+run as separate processes so they don't compete with the client for the GIL.
+
+For each connect it times:
+
+    first     connect start -> the first line from the server (handshake + 1 round trip)
+    login     connect start -> the server's 001 welcome
+    joined    connect start -> the JOIN echo, after which chat messages can go out
+
+On localhost the network round trips are nearly free, so the difference shown is
+the handshake's CPU cost (key exchange, certificate verification). Over a real
+link a full handshake also costs the certificate chain transfer.
+Fails (exit 1) if the shared context never resumes a session.
+
+Usage:
+    python benchmarks/bench_tls_connect.py [--connects 50]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_irc_client import AsyncIRCClient, create_tls_context  # noqa: E402
+from quiet import NullWriter  # noqa: E402
+
+NICK = "benchbot"
+
+
+def start_server(tls):
+    """Starts fake_twitch_server.py in a subprocess; returns (process, port, cert path)."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_twitch_server.py")
+    process = subprocess.Popen([sys.executable, script, "--port", "0"] + (["--tls"] if tls else []),
+                               stdout=subprocess.PIPE, text=True)
+    cert_path = None
+    for line in process.stdout:
+        if line.startswith("TLS certificate"):
+            cert_path = line.rsplit(" ", 1)[1].strip()
+        elif line.startswith("Fake Twitch IRC listening"):
+            return process, int(line.rsplit(":", 1)[1]), cert_path
+    raise RuntimeError("fake server did not start")
+
+
+async def connect_once(port, tls):
+    """Returns (first line, login, joined) in seconds and whether the session was resumed."""
+    client = AsyncIRCClient("127.0.0.1", port, "x", NICK, NICK, tls=tls)
+    started = time.perf_counter()
+    task = asyncio.ensure_future(client.run())
+    first = login = joined = None
+    resumed = False
+    async for msg in client:
+        if first is None:
+            first = time.perf_counter() - started
+        if msg.command == "001":
+            login = time.perf_counter() - started
+            ssl_object = client._writer.get_extra_info("ssl_object")
+            resumed = ssl_object is not None and ssl_object.session_reused
+        elif msg.command == "JOIN" and msg.nick == NICK:
+            joined = time.perf_counter() - started
+            break
+    await client.close()
+    await task
+    return first, login, joined, resumed
+
+
+async def run_modes(modes, connects):
+    # Round-robin over the modes so drift (CPU frequency, other load) hits them all alike.
+    results = {name: [] for name, _, _ in modes}
+    for _ in range(connects):
+        for name, port, tls in modes:
+            results[name].append(await connect_once(port, tls))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connects", type=int, default=50)
+    args = parser.parse_args()
+
+    plain, plain_port, _ = start_server(tls=False)
+    secure, secure_port, cert_path = start_server(tls=True)
+
+    # A plain SSLContext never offers a session: asyncio has no way to pass one.
+    full = ssl.create_default_context(cafile=cert_path)
+    resuming = create_tls_context(cert_path)
+    modes = [
+        ("plaintext", plain_port, None),
+        ("TLS full", secure_port, full),
+        ("TLS resumed", secure_port, resuming),
+    ]
+    with contextlib.redirect_stdout(NullWriter()):
+        results = asyncio.run(run_modes(modes, args.connects))
+    for process in (plain, secure):
+        process.terminate()
+        process.wait()
+
+    print(f"{args.connects} connects per mode to 127.0.0.1, new client each time")
+    print(f"{'mode':<12} {'first p50':>10} {'login p50':>10} {'joined p50':>11} {'p90':>8} {'resumed':>8}")
+    for name, rows in results.items():
+        firsts, logins, joins = (sorted(row[i] * 1000 for row in rows) for i in range(3))
+        p90 = int(len(rows) * 0.9)
+        print(f"{name:<12} {statistics.median(firsts):>8.2f}ms {statistics.median(logins):>8.2f}ms "
+              f"{statistics.median(joins):>9.2f}ms {joins[p90]:>6.2f}ms "
+              f"{sum(row[3] for row in rows):>5}/{len(rows)}")
+
+    if sum(row[3] for row in results["TLS resumed"]) < args.connects - 1:
+        print("FAILED: the shared context did not resume TLS sessions")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/bench_voice_activity.py
+"""
+Runs VoiceActivityDetector on synthetic noise and speech phrases and checks that
+non-speech is dropped before recognition and speech is kept.
+
+Each fixture is shaped like a phrase from listen_in_background: a short lead-in, the
+sound, then the 2 s pause that ended the phrase. Fixtures:
+  - noise: room tone, loud hiss, a fan-like hum, keyboard clicks
+  - speech: voiced syllables on a changing pitch, over quiet and noisy rooms and the hum
+Exits non-zero if any fixture is misclassified. Pass --write DIR to save the fixtures
+as WAV files, e.g. for bench_voice_recognition.py. Extra WAV files given on the
+command line are classified and reported without a pass/fail check.
+
+Usage:
+    python benchmarks/bench_voice_activity.py [--mode energy|webrtc] [--write fixtures/] [clip.wav ...]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_recognition as sr  # noqa: E402
+
+from voice_activity import SAMPLE_WIDTH, VoiceActivityDetector  # noqa: E402
+
+RATE = 16000
+LEAD_IN = 0.5   # seconds of room before the sound
+PAUSE = 1.2     # seconds of room after it (the recognizer's pause_threshold, config.VOICE_PAUSE_THRESHOLD)
+
+
+def room(seconds, level, rng):
+    return [rng.gauss(0, level) for _ in range(int(seconds * RATE))]
+
+
+def silence(seconds, _rng):
+    return [0.0] * int(seconds * RATE)
+
+
+def hiss(seconds, rng):
+    return [rng.gauss(0, 2500) for _ in range(int(seconds * RATE))]
+
+
+def hum(seconds, _rng):
+    return [800 * math.sin(2 * math.pi * 60 * i / RATE) + 400 * math.sin(2 * math.pi * 120 * i / RATE)
+            for i in range(int(seconds * RATE))]
+
+
+def clicks(seconds, rng):
+    samples = [0.0] * int(seconds * RATE)
+    position = 0
+    while position < len(samples):
+        for i in range(int(0.008 * RATE)):   # 8 ms click, decaying
+            if position + i < len(samples):
+                samples[position + i] = rng.gauss(0, 8000) * math.exp(-i / 20)
+        position += int(rng.uniform(0.12, 0.3) * RATE)
+    return samples
+
+
+def speech(seconds, rng):
+    """Voiced syllables: a few harmonics of a gliding pitch, 180-260 ms on, short gaps."""
+    samples = []
+    phase = 0.0
+    while len(samples) < seconds * RATE:
+        length = int(rng.uniform(0.18, 0.26) * RATE)
+        pitch = rng.uniform(110, 220)
+        for i in range(length):
+            envelope = math.sin(math.pi * i / length)
+            phase += 2 * math.pi * (pitch + 30 * i / length) / RATE
+            samples.append(envelope * (5000 * math.sin(phase) + 2500 * math.sin(2 * phase) +
+                                       1200 * math.sin(3 * phase)))
+        samples.extend([0.0] * int(rng.uniform(0.04, 0.12) * RATE))
+    return samples
+
+
+def phrase(sound, seconds, room_level, rng, background=None):
+    body = sound(seconds, rng)
+    noise = room(LEAD_IN + len(body) / RATE + PAUSE, room_level, rng)
+    start = int(LEAD_IN * RATE)
+    for i, value in enumerate(body):
+        noise[start + i] += value
+    if background is not None:
+        for i, value in enumerate(background(len(noise) / RATE, rng)):
+            noise[i] += value
+    return noise
+
+
+def to_pcm(samples):
+    clipped = (max(-32768, min(32767, int(value))) for value in samples)
+    return b"".join(value.to_bytes(2, "little", signed=True) for value in clipped)
+
+
+def fixtures(rng):
+    return [
+        ("room tone", False, phrase(silence, 1.0, 120, rng)),
+        ("loud hiss", False, phrase(hiss, 1.5, 60, rng)),
+        ("steady hum", False, phrase(silence, 1.5, 60, rng, background=hum)),
+        ("keyboard clicks", False, phrase(clicks, 2.0, 60, rng)),
+        ("speech, quiet room", True, phrase(speech, 1.5, 60, rng)),
+        ("speech, noisy room", True, phrase(speech, 2.5, 400, rng)),
+        ("short reply", True, phrase(speech, 0.4, 60, rng)),
+        ("speech over hum", True, phrase(speech, 1.5, 60, rng, background=hum)),
+    ]
+
+
+def write_wav(path, pcm):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(RATE)
+        wav.writeframes(pcm)
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != SAMPLE_WIDTH or wav.getnchannels() != 1:
+            raise ValueError(f"{path}: only 16-bit mono PCM WAV files are supported")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+def classify(detector, name, pcm, rate, expected=None):
+    audio = sr.AudioData(pcm, rate, SAMPLE_WIDTH)
+    start = time.perf_counter()
+    kept = detector.filter(audio)
+    elapsed = time.perf_counter() - start
+    duration = len(pcm) / SAMPLE_WIDTH / rate
+    kept_seconds = len(kept.frame_data) / SAMPLE_WIDTH / rate if kept is not None else 0.0
+    verdict = "" if expected is None else ("ok" if (kept is not None) == expected else "WRONG")
+    print(f"{name[:24]:<24} {duration:>6.2f}s {'speech' if kept is not None else 'dropped':>8} "
+          f"{kept_seconds:>6.2f}s {elapsed * 1000:>7.2f}ms {detector.noise_floor:>7.0f}  {verdict}")
+    return verdict != "WRONG"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", nargs="*", help="Extra 16-bit mono WAV files to classify.")
+    parser.add_argument("--mode", default="energy", choices=["energy", "webrtc"])
+    parser.add_argument("--write", metavar="DIR", help="Save the synthetic fixtures as WAV files here.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    detector = VoiceActivityDetector(mode=args.mode)
+    rng = random.Random(args.seed)
+    passed = True
+    print(f"{'fixture':<24} {'audio':>7} {'verdict':>8} {'kept':>7} {'time':>9} {'floor':>7}")
+    for name, expected, samples in fixtures(rng):
+        pcm = to_pcm(samples)
+        if args.write:
+            os.makedirs(args.write, exist_ok=True)
+            write_wav(os.path.join(args.write, name.replace(", ", "_").replace(" ", "_") + ".wav"), pcm)
+        passed &= classify(detector, name, pcm, RATE, expected)
+    for path in args.wav:
+        pcm, rate = read_wav(path)
+        classify(detector, os.path.basename(path), pcm, rate)
+
+    metrics = detector.metrics()
+    print(f"recognitions avoided: {metrics['recognitions_avoided']} of {metrics['segments_seen']} phrases; "
+          f"{metrics['trimmed_seconds']:.1f}s of {metrics['audio_seconds']:.1f}s audio never reached the recognizer")
+    if not passed:
+        print("FAILED: some fixtures were misclassified")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_voice_recognition.py
+"""
+Real-time factor and latency of the speech recognizer backends, fed from WAV files
+on disk instead of the microphone.
+
+Whole-utterance backends (google, whisper_cpp) are timed on each file as one phrase.
+Their latency after speech ends is the recognizer's pause_threshold (how long
+listen_in_background waits for silence) plus the recognition time.
+
+Streaming backends (vosk) are fed capture-sized chunks, paced in real time with
+--realtime. Their latency is from the end of the audio to the final text. The report
+also shows how far into the audio the first partial naming the bot appeared.
+
+    RTF = processing time / audio duration   (below 1.0 keeps up with live audio)
+
+WAV files must be 16-bit PCM; stereo is mixed down to mono. The "stub" backend
+costs a fixed fraction of real time, for checking the harness without an engine.
+
+Usage:
+    python benchmarks/bench_voice_recognition.py clip1.wav clip2.wav --backend vosk \\
+        --vosk-model models/vosk-model-small-en-us-0.15 [--realtime] [--pause-threshold 1.2]
+"""
+import argparse
+import array
+import os
+import statistics
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_recognition as sr  # noqa: E402
+
+from chat_commands import compile_mentions  # noqa: E402
+from speech_backends import SAMPLE_WIDTH, create_backend  # noqa: E402
+
+CHUNK = 1024   # samples per read, as sr.Microphone captures
+BOT_NICKNAMES = ["lorelei", "laurelei", "loralei", "lor", "lore", "lei", "lorelei_the_bot", "Laurel", "Laura",
+                 "Relay", "Lorelai", "LoreleiBot"]
+
+
+class StubBackend:
+    """Spends `cost` seconds per second of audio and returns a fixed transcript."""
+
+    name = "stub"
+    streaming = False
+
+    def __init__(self, cost=0.1):
+        self.cost = cost
+
+    def transcribe(self, audio):
+        time.sleep(len(audio.frame_data) / SAMPLE_WIDTH / audio.sample_rate * self.cost)
+        return "hey lorelei what do you think"
+
+
+def read_wav(path):
+    """Returns (16-bit mono PCM bytes, sample rate)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    if channels > 1:
+        samples = array.array("h", pcm)
+        mono = array.array("h", (sum(samples[i:i + channels]) // channels
+                                 for i in range(0, len(samples), channels)))
+        pcm = mono.tobytes()
+    return pcm, rate
+
+
+def run_whole(backend, pcm, rate, pause_threshold):
+    audio = sr.AudioData(pcm, rate, SAMPLE_WIDTH)
+    start = time.perf_counter()
+    text = backend.transcribe(audio)
+    elapsed = time.perf_counter() - start
+    return {"text": text, "processing": elapsed, "latency": pause_threshold + elapsed, "first_mention": None}
+
+
+def run_streaming(backend, pcm, rate, realtime, mentions):
+    stream = backend.open_stream(rate)
+    chunk_bytes = CHUNK * SAMPLE_WIDTH
+    texts = []
+    first_mention = None
+    processing = 0.0
+    start = time.perf_counter()
+    for offset in range(0, len(pcm), chunk_bytes):
+        audio_time = offset / SAMPLE_WIDTH / rate
+        if realtime:
+            delay = start + audio_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        final, partial = stream.feed(pcm[offset:offset + chunk_bytes])
+        processing += time.perf_counter() - t0
+        for text in (partial, final):
+            if text and first_mention is None and mentions.search(text):
+                first_mention = audio_time + (time.perf_counter() - start - audio_time if realtime else 0.0)
+        if final:
+            texts.append(final)
+    audio_end = time.perf_counter()
+    t0 = time.perf_counter()
+    rest = stream.finish()
+    processing += time.perf_counter() - t0
+    if rest:
+        texts.append(rest)
+    return {"text": " ".join(texts) or None, "processing": processing,
+            "latency": time.perf_counter() - audio_end, "first_mention": first_mention}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", nargs="+")
+    parser.add_argument("--backend", default="stub", choices=["stub", "google", "vosk", "whisper_cpp"])
+    parser.add_argument("--vosk-model")
+    parser.add_argument("--whisper-model")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--realtime", action="store_true", help="Pace streaming input like a live microphone.")
+    parser.add_argument("--pause-threshold", type=float, default=1.2,
+                        help="Silence listen_in_background waits for before a phrase is recognized "
+                             "(config.VOICE_PAUSE_THRESHOLD).")
+    args = parser.parse_args()
+
+    if args.backend == "stub":
+        backend = StubBackend()
+    else:
+        backend = create_backend(args.backend, vosk_model_path=args.vosk_model,
+                                 whisper_model_path=args.whisper_model, threads=args.threads)
+    mentions = compile_mentions(BOT_NICKNAMES)
+
+    results = []
+    print(f"backend {backend.name} ({'streaming' if backend.streaming else 'whole utterance'})")
+    print(f"{'file':<28} {'audio':>7} {'RTF':>6} {'latency':>8} {'mention at':>10}  text")
+    for path in args.wav:
+        pcm, rate = read_wav(path)
+        duration = len(pcm) / SAMPLE_WIDTH / rate
+        if backend.streaming:
+            result = run_streaming(backend, pcm, rate, args.realtime, mentions)
+        else:
+            result = run_whole(backend, pcm, rate, args.pause_threshold)
+        result["rtf"] = result["processing"] / duration if duration else 0.0
+        results.append(result)
+        mention = f"{result['first_mention']:.2f}s" if result["first_mention"] is not None else "-"
+        print(f"{os.path.basename(path)[:28]:<28} {duration:>6.2f}s {result['rtf']:>6.3f} "
+              f"{result['latency']:>7.2f}s {mention:>10}  {result['text'] or ''!r}")
+
+    if len(results) > 1:
+        print(f"mean RTF {statistics.mean(r['rtf'] for r in results):.3f}, "
+              f"mean latency {statistics.mean(r['latency'] for r in results):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
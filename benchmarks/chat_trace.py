@@ -0,0 +1,66 @@
+# benchmarks/chat_trace.py
+"""
+Helpers for loading recorded Twitch IRC logs or generating synthetic ones.
+A recorded log is a plain text file with one raw IRC line per line, exactly as
+received from the server (tags included).
+"""
+import random
+
+_WORDS = (
+    "gg lol pog kekw nice clip that boss fight was insane what game is this "
+    "how long have you been streaming lorelei hype raid chat hello hi welcome "
+    "the lore in this game is wild did you see that jump play the next level "
+    "relay player emote LUL monkaS first time here love the stream explore valor "
+    "colorful sleigh"
+).split()
+
+_EMOJI = ("🔥", "😂", "💜", "👀", "é", "ß", "日本")
+
+
+def synthetic_line(rng, channel="testchannel", msg_id=0):
+    """Builds one realistic tagged PRIVMSG line."""
+    user = f"viewer{rng.randrange(5000)}"
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(1, 14))]
+    if rng.random() < 0.2:
+        words.append(rng.choice(_EMOJI))
+    if rng.random() < 0.05:
+        words.insert(0, "!lor")
+    text = " ".join(words)
+    mod = 1 if rng.random() < 0.02 else 0
+    tags = (
+        f"@badge-info=subscriber/{rng.randint(1, 40)};badges=subscriber/12,premium/1;"
+        f"client-nonce={rng.getrandbits(64):016x};color=#{rng.getrandbits(24):06X};"
+        f"display-name={user};emotes=;first-msg=0;flags=;id=00000000-0000-0000-0000-{msg_id:012d};"
+        f"mod={mod};returning-chatter=0;room-id=123456;subscriber=1;"
+        f"tmi-sent-ts={1700000000000 + msg_id};turbo=0;user-id={rng.randrange(10**8)};user-type="
+    )
+    return f"{tags} :{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+
+
+def synthetic_log(count, seed=1234, channel="testchannel"):
+    """Returns a list of `count` raw IRC lines, with an occasional PING mixed in."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        if i and i % 5000 == 0:
+            lines.append("PING :tmi.twitch.tv")
+        lines.append(synthetic_line(rng, channel, i))
+    return lines
+
+
+def load_log(path):
+    """Loads a recorded raw IRC log, skipping blank lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\r\n") for line in f if line.strip()]
+
+
+def chat_messages(lines):
+    """Extracts (username, message) pairs from raw PRIVMSG lines."""
+    from irc_parser import parse_line
+
+    pairs = []
+    for line in lines:
+        msg = parse_line(line)
+        if msg is not None and msg.command == "PRIVMSG":
+            pairs.append((msg.nick, msg.text))
+    return pairs
@@ -0,0 +1,257 @@
+# benchmarks/fake_twitch_server.py
+"""
+A small local stand-in for irc.chat.twitch.tv, used by the benchmarks.
+It speaks just enough of the Twitch IRC dialect for the bot: CAP/PASS/NICK login,
+JOIN/PART, PING/PONG, PRIVMSG fan-out to joined connections, and RECONNECT.
+For chaos tests it can also drop connections, go silent on them, or refuse new ones.
+With `ssl` it serves TLS, like Twitch's port 6697; make_test_certificate() creates a
+self-signed certificate for it with the openssl command line tool.
+
+Run it on its own to point the bot at it (set SERVER, PORT and IRC_TLS_CAFILE in config.py):
+    python benchmarks/fake_twitch_server.py [--port 6697] [--tls]
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def make_test_certificate(directory=None):
+    """
+    Writes a self-signed certificate and key for localhost/127.0.0.1 and returns
+    (cert_path, key_path). The certificate doubles as the CA file for clients.
+    """
+    directory = directory or tempfile.mkdtemp(prefix="fake-twitch-tls-")
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048",
+         "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+         "-keyout", key_path, "-out", cert_path],
+        check=True, capture_output=True
+    )
+    return cert_path, key_path
+
+
+def server_tls_context(cert_path, key_path):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class FakeConnection:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.nick = None
+        self.channels = set()
+        self.silent = False
+
+    def send_line(self, line):
+        if not self.silent and not self.writer.is_closing():
+            self.writer.write(f"{line}\r\n".encode("utf-8"))
+
+    async def handle(self):
+        try:
+            while True:
+                raw = await self.reader.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                if line and not self.silent:
+                    self.server.lines_received += 1
+                    self._dispatch(line)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.server.connections.discard(self)
+            self.writer.close()
+
+    def _dispatch(self, line):
+        command, _, rest = line.partition(" ")
+        command = command.upper()
+        if command == "CAP":
+            self.send_line(":tmi.twitch.tv CAP * ACK :twitch.tv/tags twitch.tv/commands")
+        elif command == "NICK":
+            self.nick = rest.strip()
+            for code, text in (("001", "Welcome, GLHF!"), ("002", "Your host is tmi.twitch.tv"),
+                               ("375", "-"), ("372", "You are in a maze of twisty passages."),
+                               ("376", ">")):
+                self.send_line(f":tmi.twitch.tv {code} {self.nick} :{text}")
+        elif command == "JOIN":
+            for channel in rest.strip().split(","):
+                name = channel.strip().lstrip("#").lower()
+                if not name:
+                    continue
+                self.channels.add(name)
+                self.server.joins.append((time.monotonic(), name))
+                self.send_line(f":{self.nick}!{self.nick}@{self.nick}.tmi.twitch.tv JOIN #{name}")
+                self.send_line(f":{self.nick}.tmi.twitch.tv 366 {self.nick} #{name} :End of /NAMES list")
+                # In its own channel the bot is the broadcaster, with moderator send limits.
+                badges = "broadcaster/1" if name == (self.nick or "").lower() else ""
+                self.send_line(f"@badge-info=;badges={badges};color=;display-name={self.nick};emote-sets=0;mod=0;"
+                               f"subscriber=0;user-type= :tmi.twitch.tv USERSTATE #{name}")
+        elif command == "PART":
+            self.channels.discard(rest.strip().lstrip("#").lower())
+        elif command == "PING":
+            self.send_line(f":tmi.twitch.tv PONG tmi.twitch.tv {rest}")
+        elif command == "PONG":
+            self.server.pongs += 1
+        elif command == "PRIVMSG":
+            target, _, text = rest.partition(" :")
+            self.server.on_privmsg(target.lstrip("#").lower(), text)
+
+
+class FakeTwitchServer:
+    def __init__(self, host="127.0.0.1", port=0, ssl=None):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.connections = set()
+        self.joins = []
+        self.sent_by_bot = []
+        self.lines_received = 0
+        self.pongs = 0
+        self.connects = []
+        self.refuse_connections = False
+        self.privmsg_listeners = []
+        self._server = None
+        self.loop = None
+        self._thread = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._on_connect, self.host, self.port, ssl=self.ssl)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        for conn in list(self.connections):
+            conn.writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _on_connect(self, reader, writer):
+        self.connects.append(time.monotonic())
+        if self.refuse_connections:
+            writer.transport.abort()
+            return
+        conn = FakeConnection(self, reader, writer)
+        self.connections.add(conn)
+        await conn.handle()
+
+    def on_privmsg(self, channel, text):
+        """Records a PRIVMSG sent by a client and notifies listeners."""
+        now = time.perf_counter()
+        self.sent_by_bot.append((now, channel, text))
+        for listener in self.privmsg_listeners:
+            listener(now, channel, text)
+
+    # --- Server-side actions ---
+
+    def broadcast(self, channel, user, text, tags=""):
+        """Delivers a chat message from `user` to every connection joined to `channel`."""
+        prefix = f"@{tags} " if tags else ""
+        line = f"{prefix}:{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+        delivered = 0
+        for conn in self.connections:
+            if channel in conn.channels:
+                conn.send_line(line)
+                delivered += 1
+        return delivered
+
+    def send_all(self, line):
+        for conn in self.connections:
+            conn.send_line(line)
+
+    def ping_all(self):
+        self.send_all("PING :tmi.twitch.tv")
+
+    def reconnect_all(self):
+        self.send_all(":tmi.twitch.tv RECONNECT")
+
+    def drop_all(self):
+        """Aborts every client connection without a goodbye, like a network failure."""
+        for conn in list(self.connections):
+            conn.writer.transport.abort()
+
+    def silence_all(self):
+        """
+        Stops answering (and reading) on every open connection without closing it,
+        like a peer that vanished without a FIN. Only a client keepalive notices.
+        """
+        for conn in self.connections:
+            conn.silent = True
+
+    def joined_channels(self):
+        channels = set()
+        for conn in self.connections:
+            channels |= conn.channels
+        return channels
+
+    # --- Running from synchronous code ---
+
+    def start_in_thread(self):
+        """Runs the server on its own event loop thread and returns the bound port."""
+        ready = threading.Event()
+
+        def runner():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=runner, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    def call(self, func, *args):
+        """Runs a server method on the server's loop thread and returns its result."""
+        async def invoke():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(invoke(), self.loop).result()
+
+    def stop_thread(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--tls", action="store_true", help="Serve TLS with a fresh self-signed certificate.")
+    args = parser.parse_args()
+
+    context = None
+    if args.tls:
+        cert_path, key_path = make_test_certificate()
+        context = server_tls_context(cert_path, key_path)
+        print(f"TLS certificate (use as IRC_TLS_CAFILE): {cert_path}", flush=True)
+    server = FakeTwitchServer(port=args.port, ssl=context)
+
+    async def serve():
+        await server.start()
+        print(f"Fake Twitch IRC listening on {server.host}:{server.port}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# benchmarks/quiet.py
+"""Small helpers shared by the benchmarks: silencing the bot's console output and reading memory use."""
+import resource
+import sys
+
+
+class NullWriter:
+    """A stdout that drops everything, for contextlib.redirect_stdout."""
+
+    def write(self, _):
+        return 0
+
+    def flush(self):
+        pass
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), else the peak RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
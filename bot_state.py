@@ -0,0 +1,264 @@
+# bot_state.py
+"""
+The bot's conversation state machine.
+
+All of the bot's conversational state lives here and is only changed by handlers
+running on the event bus thread, so it needs no locks. Threads that used to write
+the shared bot_state dict (voice, LLM callbacks) publish events instead.
+
+    IDLE            not in a conversation; ambient speech only prompts the AI when chat is quiet
+    THINKING        waiting for the AI's answer to the streamer; new speech queues up
+    AWAITING_REPLY  the bot asked the streamer a question; any speech is treated as the reply
+
+Cooldowns and timeouts are bus timers: speech that arrives during the AI cooldown is
+held until the cooldown timer fires, the reply timeout returns AWAITING_REPLY to
+IDLE, and the inactivity timer fires the proactive question. The inactivity timer is
+reset (O(1) on the bus's timer wheel) by every chat message.
+"""
+import collections
+
+from event_bus import (AIResponse, ChatMessage, LANE_CHAT, LANE_COMMAND, LANE_MENTION, LANE_PROACTIVE, LANE_VOICE,
+                       TimerFired, VoicePartial, VoiceUtterance)
+from outbound_queue import PRIORITY_COMMAND, PRIORITY_MENTION, PRIORITY_PROACTIVE
+
+IDLE = "idle"
+THINKING = "thinking"
+AWAITING_REPLY = "awaiting_reply"
+
+_RESPONSE_LANES = {"voice": LANE_VOICE, "lor": LANE_COMMAND, "proactive": LANE_PROACTIVE}
+_SEND_PRIORITIES = {"voice": PRIORITY_MENTION, "lor": PRIORITY_COMMAND, "proactive": PRIORITY_PROACTIVE}
+
+
+def chat_lane(commands, text):
+    """
+    Bus lane for a chat message: mentions of the bot first, then commands, then the
+    rest. The command word itself doesn't count as a mention ("!lor" names the bot),
+    so a command is only a mention when its arguments name the bot.
+    """
+    command, args = commands.match(text)
+    if commands.mentions(text if command is None else args):
+        return LANE_MENTION
+    if command is not None:
+        return LANE_COMMAND
+    return LANE_CHAT
+
+
+class BotStateMachine:
+    """
+    Reacts to bus events: chat activity, the streamer's speech, AI answers and timers.
+
+    submit(prompt) starts an LLM request and returns a concurrent.futures.Future;
+    send(text, priority) posts to chat; mentions(text) tells whether text names the
+    bot; proactive_prompt() builds the inactivity question prompt.
+    """
+
+    def __init__(self, bus, submit, send, mentions, proactive_prompt, streamer, ai_cooldown=15,
+                 reply_timeout=60, inactivity_threshold=300, chat_silence_threshold=120, mention_hold=10):
+        self.bus = bus
+        self.clock = bus.clock
+        self._submit = submit
+        self._send = send
+        self._mentions = mentions
+        self._proactive_prompt = proactive_prompt
+        self.streamer = streamer
+        self.ai_cooldown = ai_cooldown
+        self.reply_timeout = reply_timeout
+        self.inactivity_threshold = inactivity_threshold
+        self.chat_silence_threshold = chat_silence_threshold
+        self.mention_hold = mention_hold
+
+        now = self.clock()
+        self.state = IDLE
+        self.last_question_time = 0
+        self.last_activity_time = now
+        self.last_streamer_utterance = None
+        self.inactivity_prompt_sent = False
+        self.last_ai_call_time = None
+        self.mention_heard_time = None
+
+        self._pending_voice = collections.deque()
+        self._resume_state = IDLE
+        self._cooldown_timer = None
+        self._reply_timer = None
+        self._inactivity_timer = None
+        self.transitions = []   # (time, from_state, to_state), for simulations and debugging
+
+        bus.subscribe(ChatMessage, self.on_chat)
+        bus.subscribe(VoiceUtterance, self.on_voice)
+        bus.subscribe(VoicePartial, self.on_voice_partial)
+        bus.subscribe(AIResponse, self.on_ai_response)
+        bus.subscribe(TimerFired, self.on_timer)
+
+    def start(self):
+        """Arms the inactivity timer; call once the bus is running."""
+        self._inactivity_timer = self.bus.call_later(self.inactivity_threshold, TimerFired("inactivity"),
+                                                     LANE_PROACTIVE)
+
+    # --- Helpers shared with chat command handlers ---
+    def cooldown_remaining(self):
+        if self.last_ai_call_time is None:
+            return 0.0
+        return max(0.0, self.ai_cooldown - (self.clock() - self.last_ai_call_time))
+
+    def on_cooldown(self):
+        return self.cooldown_remaining() > 0
+
+    def note_ai_call(self):
+        self.last_ai_call_time = self.clock()
+
+    def note_activity(self):
+        """The bot itself said something; counts as activity but does not re-arm the inactivity prompt."""
+        self.last_activity_time = self.clock()
+        if self._inactivity_timer is not None and self._inactivity_timer.pending:
+            self.bus.reset(self._inactivity_timer, self.inactivity_threshold)
+
+    def response_callback(self, kind):
+        """A Future done-callback that publishes the result as an AIResponse of `kind`."""
+        lane = _RESPONSE_LANES[kind]
+
+        def publish(future):
+            try:
+                self.bus.publish(AIResponse(kind, future.result()), lane)
+            except Exception as e:
+                self.bus.publish(AIResponse(kind, error=e), lane)
+        return publish
+
+    def ask(self, kind, prompt):
+        self.note_ai_call()
+        self._submit(prompt).add_done_callback(self.response_callback(kind))
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.transitions.append((self.clock(), self.state, state))
+            self.state = state
+
+    # --- Event handlers ---
+    def on_chat(self, event):
+        self.last_activity_time = self.clock()
+        self.inactivity_prompt_sent = False
+        if self._inactivity_timer is not None:
+            self.bus.reset(self._inactivity_timer, self.inactivity_threshold)
+
+    def on_voice_partial(self, event):
+        """Streaming backends report partial speech; note a mention as soon as it is heard."""
+        if not self._mentions(event.text):
+            return
+        now = self.clock()
+        if self.mention_heard_time is None or now - self.mention_heard_time > self.mention_hold:
+            print(f"👂 Heard my name: '{event.text}'...")
+        self.mention_heard_time = now
+
+    def on_voice(self, event):
+        now = self.clock()
+        # The final transcript can lose a name the partial results already caught.
+        is_direct_mention = self._mentions(event.text) or (
+            self.mention_heard_time is not None and now - self.mention_heard_time < self.mention_hold)
+        self.mention_heard_time = None
+        self._pending_voice.append((event.text, is_direct_mention))
+        self._next_voice()
+
+    def _next_voice(self):
+        """Handles queued speech unless an answer is still coming or the AI is cooling down."""
+        while self._pending_voice and self.state != THINKING:
+            wait = self.cooldown_remaining()
+            if wait > 0:
+                # Cooldown acts as a "thinking" delay; the timer picks the speech back up.
+                if self._cooldown_timer is None:
+                    print(f"[COOLDOWN] Waiting for {wait:.1f}s before processing next voice command...")
+                    self._cooldown_timer = self.bus.call_later(wait, TimerFired("cooldown"), LANE_VOICE)
+                return
+
+            text, is_direct_mention = self._pending_voice.popleft()
+            self.last_streamer_utterance = text
+            if is_direct_mention or self.state == AWAITING_REPLY:
+                print("[STATE] Active conversation state.")
+                prompt_for_ai = text
+                self._resume_state = IDLE if is_direct_mention else self.state
+            else:
+                if self.clock() - self.last_activity_time < self.chat_silence_threshold:
+                    print(f"[STATE] Inactive. Ignoring ambient chatter.")
+                    continue
+                print("--> Processing as a new topic (from voice)...")
+                prompt_for_ai = f'The streamer, {self.streamer}, just said: "{text}"'
+                self._resume_state = IDLE
+
+            self._cancel_reply_timer()
+            self._set_state(THINKING)
+            self.ask("voice", prompt_for_ai)
+
+    def on_ai_response(self, event):
+        if event.kind == "voice":
+            self._on_voice_response(event)
+            self._next_voice()
+            return
+
+        if event.error is not None:
+            label = "!lor" if event.kind == "lor" else "Proactive question"
+            print(f"[WARN] {label} request failed: {event.error}")
+            return
+        if event.kind == "proactive":
+            if "IGNORE" in event.response.upper():
+                print("--> AI decided not to ask a question right now.")
+                return
+            print(f"--> AI generated proactive question: {event.response}")
+        self._send(event.response, _SEND_PRIORITIES[event.kind])
+        self.note_activity()
+        if event.kind == "proactive":
+            print("[INFO] Bot activity timer updated.")
+
+    def _on_voice_response(self, event):
+        if event.error is not None or event.response is None:
+            print(f"[WARN] AI request failed: {event.error}")
+            self._resume(self._resume_state)
+            return
+        if "IGNORE" in event.response.upper():
+            print("--> AI decided to ignore the voice command. Staying silent.")
+            self._resume(self._resume_state)
+            return
+
+        if event.response.endswith('?'):
+            self.last_question_time = self.clock()
+            self._resume(AWAITING_REPLY)
+            print("[STATE] Awaiting reply. Conversation remains active.")
+        else:
+            self._resume(IDLE)
+            print("[STATE] Concluded topic. Conversation is now inactive.")
+
+        self._send(event.response, PRIORITY_MENTION)
+        self.note_activity()
+        print("[INFO] Bot activity timer updated.")
+
+    def _resume(self, state):
+        self._set_state(state)
+        if state == AWAITING_REPLY:
+            remaining = max(0.0, self.reply_timeout - (self.clock() - self.last_question_time))
+            if self._reply_timer is None:
+                self._reply_timer = self.bus.call_later(remaining, TimerFired("reply_timeout"))
+            else:
+                self.bus.reset(self._reply_timer, remaining)
+
+    def _cancel_reply_timer(self):
+        if self._reply_timer is not None:
+            self.bus.cancel(self._reply_timer)
+
+    def on_timer(self, event):
+        if event.name == "cooldown":
+            self._cooldown_timer = None
+            self._next_voice()
+        elif event.name == "reply_timeout":
+            if self.state == AWAITING_REPLY:
+                print("--> Reply timeout. Forgetting previous question.")
+                self._set_state(IDLE)
+        elif event.name == "inactivity":
+            self._on_inactivity()
+
+    def _on_inactivity(self):
+        if self.inactivity_prompt_sent:
+            return
+        self.inactivity_prompt_sent = True
+
+        if self.on_cooldown():
+            print(f"[COOLDOWN] Inactivity prompt skipped due to recent AI activity.")
+            return
+        print("[INFO] 5 minutes of inactivity detected. Engaging proactive question mode...")
+        self.ask("proactive", self._proactive_prompt())
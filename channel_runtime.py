@@ -0,0 +1,346 @@
+# channel_runtime.py
+"""
+Runs the assistant for many channels in one process.
+Channels are spread over a small pool of IRC connections, JOINs are throttled to
+Twitch's per-account limit, and every channel gets its own bot_state, MemoryHandler,
+ChatContext and GeminiHandler history. LLM calls from all channels share FairLLMScheduler.
+
+Voice input is tied to the local microphone, so it stays in main.py; this runtime
+handles chat (commands and inactivity prompts) only.
+
+Usage:
+    CHANNEL_NAMES=chan_a,chan_b,chan_c python channel_runtime.py
+"""
+import asyncio
+import functools
+import threading
+import time
+
+from async_irc_client import AsyncIRCClient, create_tls_context
+from chat_commands import ChatDispatcher, PERMISSION_MODERATOR, forget_reply, memory_reply, proactive_prompt
+from chat_context import ChatContext
+from gemini_handler import GeminiHandler
+from llm_scheduler import FairLLMScheduler
+from memory_handler import MemoryHandler
+from outbound_queue import (MESSAGE_LIMIT, MOD_MESSAGE_LIMIT, OutboundScheduler, PRIORITY_COMMAND, PRIORITY_PROACTIVE,
+                            message_buckets)
+from rate_limit import SlidingWindowLimiter
+from response_cache import ResponseCache
+from timer_wheel import TimerWheel
+import config
+import metrics
+import structured_log
+
+log = structured_log.get_logger("chat")
+
+
+def new_bot_state():
+    return {
+        'last_activity_time': time.time(),
+        'inactivity_prompt_sent': False,
+        'last_ai_call_time': 0,
+    }
+
+
+class ChannelSession:
+    """Everything that belongs to a single channel."""
+
+    def __init__(self, channel, ai_handler, memory_handler, chat_context=None):
+        self.channel = channel
+        self.ai_handler = ai_handler
+        self.memory_handler = memory_handler
+        self.chat_context = chat_context
+        self.bot_state = new_bot_state()
+        self.commands = None   # ChatDispatcher, set up by MultiChannelRuntime
+        self.inactivity_timer = None   # WheelTimer, reset by every chat message
+
+
+def create_session(channel):
+    """Builds a session with its own memory file and Gemini history."""
+    memory_handler = MemoryHandler(
+        config.CHANNEL_MEMORY_FILE.format(channel=channel),
+        token_budget=config.MEMORY_TOKEN_BUDGET,
+        top_k=config.MEMORY_TOP_K,
+        duplicate_threshold=config.FACT_DUPLICATE_THRESHOLD
+    )
+    chat_context = ChatContext(
+        recent_messages=config.CHAT_CONTEXT_MESSAGES,
+        summary_lines=config.CHAT_CONTEXT_SUMMARY_LINES,
+        token_budget=config.CHAT_CONTEXT_TOKEN_BUDGET
+    )
+    ai_handler = GeminiHandler(
+        api_key=config.GEMINI_API_KEY,
+        system_prompt=config.SYSTEM_PROMPT_TEMPLATE.format(streamer=channel),
+        max_history=config.MAX_HISTORY_LENGTH,
+        memory_handler=memory_handler,
+        use_context_cache=config.GEMINI_CONTEXT_CACHE,
+        cache_ttl_minutes=config.GEMINI_CACHE_TTL_MINUTES,
+        response_cache=ResponseCache(
+            max_entries=config.RESPONSE_CACHE_SIZE,
+            ttl=config.RESPONSE_CACHE_TTL,
+            similarity=config.RESPONSE_CACHE_SIMILARITY
+        ),
+        transport=config.GEMINI_TRANSPORT,
+        chat_context=chat_context
+    )
+    return ChannelSession(channel, ai_handler, memory_handler, chat_context)
+
+
+class MultiChannelRuntime:
+    def __init__(self, channels, server, port, token, bot_nick, session_factory=create_session,
+                 channels_per_connection=50, join_rate_limit=20, join_rate_period=10,
+                 llm_max_concurrency=4, llm_max_pending=None, llm_request_timeout=None,
+                 lor_coalesce_window=1.5, lor_max_batch=5, ai_call_cooldown=10, inactivity_threshold=300,
+                 forget_cooldown=5, memory_cooldown=30, reconnect_delay=1.0,
+                 max_reconnect_delay=60.0, keepalive_interval=60.0, keepalive_timeout=10.0,
+                 message_limit=MESSAGE_LIMIT, mod_message_limit=MOD_MESSAGE_LIMIT,
+                 outbound_factory=OutboundScheduler, timer_tick=0.1, tls=None):
+        self.ai_call_cooldown = ai_call_cooldown
+        self.inactivity_threshold = inactivity_threshold
+        self.lor_coalesce_window = lor_coalesce_window
+        self.lor_max_batch = lor_max_batch
+        self.forget_cooldown = forget_cooldown
+        self.memory_cooldown = memory_cooldown
+        self.scheduler = FairLLMScheduler(llm_max_concurrency, llm_max_pending, llm_request_timeout)
+        self.join_limiter = SlidingWindowLimiter(join_rate_limit, join_rate_period)
+        # Messages are limited per account too, so every connection draws from the same buckets.
+        self.user_bucket, self.mod_bucket = message_buckets(message_limit, mod_message_limit)
+
+        # One inactivity timer per channel; chat resets it in O(1) instead of the
+        # runtime scanning every channel once a second.
+        self.timers = TimerWheel(tick=timer_tick)
+        self._timers_changed = None
+        self.sessions = {channel: session_factory(channel) for channel in channels}
+        for session in self.sessions.values():
+            session.commands = self._build_commands(session)
+            session.inactivity_timer = self.timers.schedule(inactivity_threshold, self._on_inactive, session)
+        self.clients = []
+        self._client_for_channel = {}
+        for start in range(0, len(channels), channels_per_connection):
+            shard = channels[start:start + channels_per_connection]
+            client = AsyncIRCClient(server, port, token, bot_nick, shard,
+                                    reconnect_delay=reconnect_delay, join_limiter=self.join_limiter,
+                                    outbound=outbound_factory(user_bucket=self.user_bucket, mod_bucket=self.mod_bucket),
+                                    max_reconnect_delay=max_reconnect_delay,
+                                    keepalive_interval=keepalive_interval, keepalive_timeout=keepalive_timeout,
+                                    tls=tls)
+            self.clients.append(client)
+            for channel in shard:
+                self._client_for_channel[channel] = client
+        self._tasks = []
+        self._handlers = set()   # per-message and inactivity tasks; referenced so they can't be collected mid-run
+
+    async def run(self):
+        """Connects every shard and processes chat until stop() is called."""
+        print(f"🤖 Starting {len(self.sessions)} channels on {len(self.clients)} connections.")
+        self.scheduler.start()
+        self._timers_changed = asyncio.Event()
+        for client in self.clients:
+            self._tasks.append(asyncio.ensure_future(client.run()))
+            self._tasks.append(asyncio.ensure_future(self._consume(client)))
+        self._tasks.append(asyncio.ensure_future(self._timer_loop()))
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # The workers may be blocked in an API call; stop them off the event loop.
+            await asyncio.get_running_loop().run_in_executor(None, self.scheduler.stop)
+
+    async def stop(self):
+        for client in self.clients:
+            await client.close()
+        for task in self._tasks + list(self._handlers):
+            task.cancel()
+
+    def _spawn(self, session, coro):
+        """Runs `coro` as a task that is kept until it finishes and whose errors are logged."""
+        task = asyncio.ensure_future(coro)
+        self._handlers.add(task)
+        task.add_done_callback(functools.partial(self._handler_done, session))
+        return task
+
+    def _handler_done(self, session, task):
+        self._handlers.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            print(f"[#{session.channel}] [ERROR] Chat handler failed: {error!r}")
+
+    async def ask_ai(self, session, prompt):
+        """Runs the session's Gemini call on the shared scheduler; None if it failed or timed out."""
+        future = self.scheduler.submit(session.channel, session.ai_handler.get_response, prompt)
+        return await self._result(session, future)
+
+    async def _result(self, session, future):
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            print(f"[#{session.channel}] [WARN] AI request failed: {e}")
+            return None
+
+    async def send(self, channel, message, priority=PRIORITY_COMMAND):
+        await self._client_for_channel[channel].send_privmsg(message, channel, priority)
+
+    async def _consume(self, client):
+        async for msg in client:
+            if msg.command != "PRIVMSG" or len(msg.params) < 2:
+                continue
+            session = self.sessions.get(msg.channel)
+            if session is not None:
+                # One task per message, so a slow AI reply in one channel never
+                # holds up chat ingestion for the others.
+                self._spawn(session, self.handle_chat(session, msg.nick, msg.text, msg))
+
+    async def handle_chat(self, session, username, message, source=None):
+        state = session.bot_state
+        log.info("[#%s] [%s]: %s", session.channel, username, message)
+        state['last_activity_time'] = time.time()
+        state['inactivity_prompt_sent'] = False
+        self._reset_inactivity(session, rearm=True)
+        if session.chat_context is not None:
+            session.chat_context.add(username, message)
+
+        handled, result = session.commands.dispatch(username, message, source)
+        if asyncio.iscoroutine(result):
+            await result
+
+    def _build_commands(self, session):
+        commands = ChatDispatcher(config.BOT_NICKNAMES, owners=[session.channel])
+        commands.register("lor", functools.partial(self._command_lor, session))
+        commands.register("forget", functools.partial(self._command_forget, session),
+                          cooldown=self.forget_cooldown, permission=PERMISSION_MODERATOR)
+        commands.register("memory", functools.partial(self._command_memory, session),
+                          cooldown=self.memory_cooldown)
+        return commands
+
+    async def _command_lor(self, session, username, prompt_for_ai, source):
+        state = session.bot_state
+        if not prompt_for_ai:
+            await self.send(session.channel, f"Hi @{username}! To use me, type !lor followed by your question.")
+            return False
+
+        # Repeated questions are answered from the cache, cooldown or not.
+        cache = session.ai_handler.response_cache
+        cached_response = cache.get(prompt_for_ai) if cache is not None else None
+        if cached_response is not None:
+            await self.send(session.channel, f"@{username} {cached_response}")
+            self._note_activity(session)
+            return
+
+        # Questions that arrive while a batch is still collecting share its answer,
+        # even during the cooldown; only the first one sends it.
+        on_cooldown = time.time() - state['last_ai_call_time'] < self.ai_call_cooldown
+        future, merged = self.scheduler.coalesce(
+            session.channel, "!lor", (username, prompt_for_ai), session.ai_handler.get_batched_response,
+            window=self.lor_coalesce_window, max_batch=self.lor_max_batch, join_only=on_cooldown)
+        if future is None:
+            print(f"[#{session.channel}] [COOLDOWN] !lor command ignored due to AI cooldown.")
+            return
+        if merged:
+            return
+
+        state['last_ai_call_time'] = time.time()
+        ai_response = await self._result(session, future)
+        if ai_response is None:
+            return
+        await self.send(session.channel, ai_response)
+        self._note_activity(session)
+
+    async def _command_forget(self, session, username, topic, source):
+        await self.send(session.channel, forget_reply(session.memory_handler, username, topic))
+        if not topic:
+            return False   # only the usage help; don't start the cooldown
+
+    async def _command_memory(self, session, username, args, source):
+        await self.send(session.channel, memory_reply(session.memory_handler, username))
+
+    def _note_activity(self, session):
+        """The bot spoke in the channel: push back the inactivity prompt, but do not re-arm a fired one."""
+        session.bot_state['last_activity_time'] = time.time()
+        self._reset_inactivity(session, rearm=False)
+
+    def _reset_inactivity(self, session, rearm):
+        timer = session.inactivity_timer
+        was_pending = timer.pending
+        if was_pending or rearm:
+            timer.reset(self.inactivity_threshold)
+        if not was_pending and rearm and self._timers_changed is not None:
+            self._timers_changed.set()   # the timer loop may be sleeping with nothing scheduled
+
+    async def _timer_loop(self):
+        """Fires due timers, sleeping until the next one (or until a fired timer is re-armed)."""
+        while True:
+            self.timers.advance()
+            next_due = self.timers.next_due()
+            delay = None if next_due is None else max(0.0, next_due - time.monotonic())
+            self._timers_changed.clear()
+            try:
+                await asyncio.wait_for(self._timers_changed.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_inactive(self, session):
+        state = session.bot_state
+        if state['inactivity_prompt_sent']:
+            return
+        state['inactivity_prompt_sent'] = True
+        if time.time() - state['last_ai_call_time'] < self.ai_call_cooldown:
+            return
+        self._spawn(session, self._prompt_inactive(session))
+
+    async def _prompt_inactive(self, session):
+        prompt_for_ai = proactive_prompt(session.memory_handler)
+        session.bot_state['last_ai_call_time'] = time.time()
+        ai_response = await self.ask_ai(session, prompt_for_ai)
+        if ai_response is not None and "IGNORE" not in ai_response.upper():
+            print(f"[#{session.channel}] --> AI generated proactive question: {ai_response}")
+            await self.send(session.channel, ai_response, PRIORITY_PROACTIVE)
+            self._note_activity(session)
+
+
+def main():
+    if not config.CHANNELS:
+        print("[ERROR] No channels configured. Set CHANNEL_NAMES (comma-separated) or CHANNEL_NAME.")
+        return
+    structured_log.configure(config.LOG_LEVEL, config.LOG_FORMAT)
+    if config.METRICS_PORT:
+        metrics.start_server(config.METRICS_PORT)
+    runtime = MultiChannelRuntime(
+        config.CHANNELS,
+        server=config.SERVER,
+        port=config.PORT,
+        token=config.OAUTH_TOKEN,
+        bot_nick=config.BOT_NICK,
+        channels_per_connection=config.CHANNELS_PER_CONNECTION,
+        join_rate_limit=config.JOIN_RATE_LIMIT,
+        join_rate_period=config.JOIN_RATE_PERIOD,
+        llm_max_concurrency=config.LLM_MAX_CONCURRENCY,
+        llm_max_pending=config.LLM_MAX_PENDING,
+        llm_request_timeout=config.LLM_REQUEST_TIMEOUT,
+        lor_coalesce_window=config.LOR_COALESCE_WINDOW,
+        lor_max_batch=config.LOR_MAX_BATCH,
+        ai_call_cooldown=config.AI_CALL_COOLDOWN,
+        inactivity_threshold=config.INACTIVITY_THRESHOLD,
+        forget_cooldown=config.FORGET_COMMAND_COOLDOWN,
+        memory_cooldown=config.MEMORY_COMMAND_COOLDOWN,
+        reconnect_delay=config.RECONNECT_DELAY,
+        max_reconnect_delay=config.RECONNECT_MAX_DELAY,
+        keepalive_interval=config.KEEPALIVE_INTERVAL,
+        keepalive_timeout=config.KEEPALIVE_TIMEOUT,
+        outbound_factory=functools.partial(OutboundScheduler, ttl=config.OUTBOUND_MESSAGE_TTL),
+        tls=create_tls_context(config.IRC_TLS_CAFILE) if config.IRC_TLS else None,
+    )
+    if config.GEMINI_WARM_UP and runtime.sessions:
+        # Every session shares one Gemini client, so warming one warms them all.
+        session = next(iter(runtime.sessions.values()))
+        threading.Thread(target=session.ai_handler.warm_up, daemon=True).start()
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        print("\nScript interrupted by user. Exiting...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# chat_commands.py
+"""
+Nickname mention matching and a chat command registry, built once at startup.
+
+Mentions use one compiled word-boundary regex over all nicknames, so a nickname
+only counts as a whole word ("lei" no longer matches inside "relay" or "player").
+Commands are matched with one compiled regex over the registered names, and each
+command has its own cooldown and minimum permission.
+
+The replies of the memory commands and the inactivity prompt are built here too,
+so the single-channel bot (main.py) and the multi-channel runtime
+(channel_runtime.py) say the same thing.
+"""
+import inspect
+import re
+import time
+
+PERMISSION_EVERYONE = 0
+PERMISSION_MODERATOR = 1
+PERMISSION_BROADCASTER = 2
+
+MEMORY_SUMMARY_CHARS = 300   # !memory lists topics up to about this many characters
+
+
+def user_level(username, tags, owners=()):
+    """Permission level of a chat user, from the message tags (badges, mod flag)."""
+    if username and username.lower() in owners:
+        return PERMISSION_BROADCASTER
+    badges = tags.get("badges", "")
+    if "broadcaster/" in badges:
+        return PERMISSION_BROADCASTER
+    if tags.get("mod") == "1" or "moderator/" in badges:
+        return PERMISSION_MODERATOR
+    return PERMISSION_EVERYONE
+
+
+def _trie_pattern(words):
+    """
+    Regex alternation for `words` factored into a prefix trie ("lor", "lore" and
+    "lorelei" become "lor(?:e(?:lei)?)?"), so the regex engine walks each shared
+    prefix once instead of retrying every word at every position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        ends_here = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if ends_here else "")
+
+    return build(trie)
+
+
+def compile_mentions(nicknames):
+    """One case-insensitive regex matching any nickname as a whole word."""
+    names = {name.lower() for name in nicknames if name}
+    if not names:
+        return re.compile(r"(?!x)x")   # matches nothing
+    return re.compile(r"(?<!\w)" + _trie_pattern(names) + r"(?!\w)", re.IGNORECASE)
+
+
+class Command:
+    __slots__ = ("name", "handler", "cooldown", "permission", "last_used")
+
+    def __init__(self, name, handler, cooldown=0.0, permission=PERMISSION_EVERYONE):
+        self.name = name
+        self.handler = handler
+        self.cooldown = cooldown
+        self.permission = permission
+        self.last_used = None
+
+
+class ChatDispatcher:
+    """
+    Routes chat messages to registered commands and detects nickname mentions.
+
+    handler(username, args, source) is called for a matching command, where args is
+    the text after the command name and source is whatever the caller passed along
+    (the IRCMessage, for its tags). A handler that returns False does not start the
+    command's cooldown (e.g. when it only replied with usage help). An async handler's
+    coroutine is wrapped so that the cooldown holds while it runs and is given back
+    if it returns False; the caller awaits the wrapped coroutine as usual.
+    """
+
+    def __init__(self, nicknames=(), prefix="!", owners=(), clock=time.monotonic):
+        self.prefix = prefix
+        self.owners = {owner.lower() for owner in owners if owner}
+        self.clock = clock
+        self.commands = {}
+        self._mention_re = compile_mentions(nicknames)
+        self._command_re = None
+
+    def mentions(self, text):
+        """True if `text` names the bot as a whole word."""
+        return self._mention_re.search(text) is not None
+
+    def register(self, name, handler, cooldown=0.0, permission=PERMISSION_EVERYONE):
+        name = name.lower().lstrip(self.prefix)
+        self.commands[name] = Command(name, handler, cooldown, permission)
+        names = sorted(self.commands, key=len, reverse=True)
+        self._command_re = re.compile(
+            re.escape(self.prefix) + "(" + "|".join(map(re.escape, names)) + r")(?!\w)\s*(.*)",
+            re.IGNORECASE | re.DOTALL,
+        )
+
+    def match(self, text):
+        """Returns (command, args) if `text` invokes a registered command, else (None, None)."""
+        if self._command_re is None or not text.startswith(self.prefix):
+            return None, None
+        found = self._command_re.match(text)
+        if found is None:
+            return None, None
+        return self.commands[found.group(1).lower()], found.group(2).strip()
+
+    def dispatch(self, username, text, source=None, tags=None):
+        """
+        Runs the command in `text`, if any. Returns (handled, result): handled is False
+        when the text is not a command; result is the handler's return value, or None
+        if the user lacks permission or the command is cooling down.
+        """
+        command, args = self.match(text)
+        if command is None:
+            return False, None
+
+        if command.permission > PERMISSION_EVERYONE:
+            if tags is None:
+                tags = getattr(source, "tags", None) or {}
+            if user_level(username, tags, self.owners) < command.permission:
+                print(f"[COMMAND] {self.prefix}{command.name} from {username} ignored: not permitted.")
+                return True, None
+
+        now = self.clock()
+        if command.last_used is not None and now - command.last_used < command.cooldown:
+            print(f"[COOLDOWN] {self.prefix}{command.name} command ignored due to its cooldown.")
+            return True, None
+
+        previous = command.last_used
+        command.last_used = now
+        try:
+            result = command.handler(username, args, source)
+        except Exception:
+            command.last_used = previous
+            raise
+        if inspect.iscoroutine(result):
+            return True, self._finish(command, result, previous, now)
+        if result is False:
+            command.last_used = previous
+        return True, result
+
+    @staticmethod
+    async def _finish(command, coroutine, previous, started):
+        result = await coroutine
+        if result is False and command.last_used == started:
+            command.last_used = previous
+        return result
+
+
+# --- Shared command bodies ---
+def forget_reply(memory_handler, username, topic):
+    """Forgets `topic` (for !forget) and returns the reply to send."""
+    if not topic:
+        return f"@{username} Usage: !forget <topic>"
+    if not memory_handler.has_topic(topic):
+        return f"@{username} I don't remember anything about {topic}."
+    memory_handler.forget_topic(topic)
+    return f"@{username} Okay, I forgot everything about {topic}."
+
+
+def memory_reply(memory_handler, username):
+    """The !memory reply: the remembered topics, cut to about MEMORY_SUMMARY_CHARS."""
+    topics = memory_handler.topics()
+    if not topics:
+        return f"@{username} My memory is empty so far."
+    summary = ", ".join(topics)
+    if len(summary) > MEMORY_SUMMARY_CHARS:
+        summary = summary[:MEMORY_SUMMARY_CHARS].rsplit(", ", 1)[0] + ", ..."
+    return f"@{username} I remember things about: {summary}"
+
+
+def proactive_prompt(memory_handler):
+    """What to ask the AI when the stream has gone quiet."""
+    # Check if the current game is known
+    if not memory_handler.has_topic("Current Game"):
+        return "It's quiet and you don't know the current game. Ask the streamer what they are playing."
+    return "It's quiet. Based on your memory, ask an interesting, open-ended question to learn more about an existing topic (like the current game or the streamer's preferences)."
@@ -0,0 +1,191 @@
+# chat_context.py
+import collections
+import math
+import threading
+import time
+
+import metrics
+from fact_dedup import jaccard
+from memory_index import estimate_tokens, tokenize
+
+MAX_MESSAGE_CHARS = 200     # longer chat lines are cut before they are stored
+MIN_KEYWORD_LENGTH = 3
+SUMMARY_SHARE = 0.4         # of the context token budget, at most
+
+SUMMARY_SECONDS = metrics.histogram("chat_summary_seconds", "Time to fold a batch of old chat into the summary.",
+                                    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+CONTEXT_TOKENS = metrics.histogram("chat_context_tokens", "Estimated tokens of chat context sent with a prompt.",
+                                   buckets=metrics.SIZE_BUCKETS)
+
+
+class _Line:
+    __slots__ = ("seq", "text", "terms")
+
+    def __init__(self, seq, text, terms):
+        self.seq = seq
+        self.text = text
+        self.terms = terms
+
+
+def _fit(title, lines, budget):
+    """Returns (title + the newest lines that fit in `budget` tokens, tokens left)."""
+    budget -= estimate_tokens(title)
+    kept = []
+    for line in reversed(lines):
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        kept.append(line)
+        budget -= cost
+    if not kept:
+        return [], budget + estimate_tokens(title)
+    kept.append(title)
+    return kept[::-1], budget
+
+
+class ChatContext:
+    """
+    Rolling record of what a channel's chat is talking about, for prompts.
+
+    The last `recent_messages` lines are kept verbatim in a ring. Lines pushed out
+    of it are folded, `batch_size` at a time, into a running extractive summary:
+    decayed TF-IDF statistics over chat pick the `summary_lines` most
+    representative lines (skipping near-repeats) and the top keywords. Statistics
+    decay by `decay` per `batch_size` lines, so the summary follows the
+    conversation and the term table stays small. context_block() renders it all within a token budget.
+    Thread-safe: chat adds lines while LLM workers build prompts.
+    """
+
+    def __init__(self, recent_messages=30, summary_lines=5, keywords=8, batch_size=50,
+                 decay=0.7, token_budget=300):
+        self.summary_lines = summary_lines
+        self.keywords = keywords
+        self.batch_size = batch_size
+        self.decay = decay
+        self.token_budget = token_budget
+        self._recent = collections.deque(maxlen=recent_messages)
+        self._pending = []
+        self._summary = []           # _Line, oldest first
+        self._doc_freq = {}          # term -> decayed number of lines containing it
+        self._lines_seen = 0.0       # decayed number of lines folded in
+        self._seq = 0
+        self._lock = threading.Lock()
+
+        # --- Metrics ---
+        self.added = 0
+        self.summarized = 0
+        self.summary_runs = 0
+        self.summary_time = 0.0
+
+    def __len__(self):
+        return len(self._recent)
+
+    def add(self, username, text):
+        """Records one chat message."""
+        line = f"{username}: {text[:MAX_MESSAGE_CHARS]}"
+        with self._lock:
+            self.added += 1
+            if len(self._recent) == self._recent.maxlen:
+                self._pending.append(self._recent[0])
+            self._recent.append(line)
+            if len(self._pending) >= self.batch_size:
+                self._summarize()
+
+    def _summarize(self):
+        """Folds pending lines into the summary. Caller holds the lock."""
+        start = time.perf_counter()
+        # A partial batch (folded early for a prompt) decays the past proportionally less.
+        decay = self.decay ** (len(self._pending) / self.batch_size)
+        batch = []
+        for text in self._pending:
+            terms = frozenset(tokenize(text.partition(": ")[2]))
+            if terms:
+                self._seq += 1
+                batch.append(_Line(self._seq, text, terms))
+        self.summarized += len(self._pending)
+        self._pending = []
+
+        # Decay what came before, then count the new batch.
+        doc_freq = self._doc_freq
+        for term in list(doc_freq):
+            weight = doc_freq[term] * decay
+            if weight < 0.5:
+                del doc_freq[term]
+            else:
+                doc_freq[term] = weight
+        self._lines_seen = self._lines_seen * decay + len(batch)
+        for line in batch:
+            for term in line.terms:
+                doc_freq[term] = doc_freq.get(term, 0.0) + 1
+
+        # A line is representative if its words are what chat keeps saying (high
+        # document frequency) without being filler every line has (low IDF).
+        total = self._lines_seen + 1
+        weights = {term: count * math.log(total / count) for term, count in doc_freq.items()}
+
+        def score(line):
+            return sum(weights.get(term, 0.0) for term in line.terms) / math.sqrt(len(line.terms))
+
+        chosen = []
+        for line in sorted(self._summary + batch, key=score, reverse=True):
+            if any(jaccard(line.terms, other.terms) > 0.5 for other in chosen):
+                continue
+            chosen.append(line)
+            if len(chosen) == self.summary_lines:
+                break
+        self._summary = sorted(chosen, key=lambda line: line.seq)
+
+        elapsed = time.perf_counter() - start
+        SUMMARY_SECONDS.observe(elapsed)
+        self.summary_runs += 1
+        self.summary_time += elapsed
+
+    def topics(self):
+        """The summary's keywords, most salient first."""
+        with self._lock:
+            return self._topics()
+
+    def _topics(self):
+        total = self._lines_seen + 1
+        scored = ((count * math.log(total / count), term) for term, count in self._doc_freq.items()
+                  if len(term) >= MIN_KEYWORD_LENGTH and not term.isdigit())
+        return [term for _, term in sorted(scored, reverse=True)[:self.keywords]]
+
+    def context_block(self, token_budget=None):
+        """
+        Chat context for a prompt: keywords, the summary of earlier chat, then as
+        many of the most recent messages as fit in `token_budget` tokens. Empty if
+        chat has said nothing yet.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        with self._lock:
+            if self._pending:
+                self._summarize()
+            topics = self._topics()
+            summary = [line.text for line in self._summary]
+            recent = list(self._recent)
+        if not recent and not summary:
+            return ""
+
+        header = ["[CHAT CONTEXT]"]
+        if topics:
+            header.append(f"Chat has been talking about: {', '.join(topics)}")
+        # The summary may take up to SUMMARY_SHARE of the budget and recent messages the
+        # rest; newest lines win in both when they don't all fit.
+        remaining = budget - sum(estimate_tokens(line) for line in header)
+        reserve = int(remaining * SUMMARY_SHARE)
+        earlier, unused = _fit("Earlier in chat:", summary, reserve)
+        latest, remaining = _fit("Latest messages:", recent, remaining - reserve + unused)
+        CONTEXT_TOKENS.observe(budget - remaining)
+        return "\n".join(header + earlier + latest)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "added": self.added,
+                "recent": len(self._recent),
+                "summarized": self.summarized,
+                "summary_runs": self.summary_runs,
+                "summary_ms": self.summary_time * 1000,
+                "terms": len(self._doc_freq),
+            }
@@ -0,0 +1,62 @@
+# compact_memory.py
+"""
+One-shot cleanup of a memory file: merges topics that differ only in case or
+whitespace, drops exact and near-duplicate facts, and rewrites the snapshot.
+
+Usage:
+    python compact_memory.py [path] [--threshold 0.75] [--dry-run]
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+import config
+from memory_handler import MemoryHandler
+
+
+def compact(path, threshold, dry_run=False):
+    """Deduplicates the memory at `path` (or a throwaway copy of it) and returns the stats."""
+    with contextlib.ExitStack() as stack:
+        if dry_run:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            for suffix in ("", ".wal", ".bak"):
+                if os.path.exists(path + suffix):
+                    shutil.copy2(path + suffix, os.path.join(directory, "memory.json" + suffix))
+            path = os.path.join(directory, "memory.json")
+        # MemoryHandler reports each step on stdout; only the summary below is wanted.
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        with contextlib.redirect_stdout(devnull):
+            handler = MemoryHandler(path, duplicate_threshold=threshold)
+            try:
+                return handler.deduplicate()
+            finally:
+                handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default=config.MEMORY_FILE)
+    parser.add_argument("--threshold", type=float, default=config.FACT_DUPLICATE_THRESHOLD,
+                        help="Similarity at which two facts count as duplicates (1 = exact only).")
+    parser.add_argument("--dry-run", action="store_true", help="Report the savings without touching the file.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path) and not os.path.exists(args.path + ".wal"):
+        print(f"[ERROR] No memory file at {args.path}")
+        sys.exit(1)
+
+    stats = compact(args.path, args.threshold, args.dry_run)
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    percent = saved / stats["bytes_before"] * 100 if stats["bytes_before"] else 0.0
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {stats['topics_merged']} duplicate topics and {stats['facts_removed']} duplicate facts "
+          f"({stats['facts_kept']} facts kept).")
+    print(f"Memory size: {stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes "
+          f"({saved:,} bytes, {percent:.1f}% saved).")
+
+
+if __name__ == "__main__":
+    main()
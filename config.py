@@ -1,55 +1,124 @@
-# config.py
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# --- Twitch Configuration ---
-BOT_NICK = os.getenv("BOT_NICK")
-CHANNEL = os.getenv("CHANNEL_NAME")
-OAUTH_TOKEN = os.getenv("TWITCH_ACCESS_TOKEN")
-SERVER = "irc.chat.twitch.tv"
-PORT = 6667
-PRIVILEGED_USER = "remmold"
-BOT_NICKNAMES = ["lorelei", "laurelei", "loralei", "lor", "lore", "lei", "lorelei_the_bot","Laurel","Laura","Relay","Lorelai","LoreleiBot"]
-CHAT_SILENCE_THRESHOLD = 30
-INACTIVITY_THRESHOLD = 300
-AI_CALL_COOLDOWN = 10 
-
-# --- NEW: Memory Configuration ---
-MEMORY_FILE = "lorelei_memory.json"
-
-# --- Gemini Configuration ---
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-MAX_HISTORY_LENGTH = 10 
-
-# --- Bot Personality (MAJOR OVERHAUL) ---
-# config.py
-
-# (Keep all other configurations the same)
-
-# --- Bot Personality (Final Version with Chat Engagement) ---
-SYSTEM_PROMPT = f"""
-You are Lorelei, an AI companion and community host for the streamer "{PRIVILEGED_USER}". 
-Your primary mission is to learn and foster a friendly, engaging atmosphere in the chat.
-
-**MISSION 1: BUILD THE MEMORY BANK**
-Your main goal is to build a memory about the streamer and the games they play.
--   **What to Learn:** Focus on concrete, reusable information. This includes facts about the game being played (lore, mechanics, goals) and about the streamer themselves (preferences, hobbies, opinions, stories).
--   **How to Learn:** Use the `[LEARN]` command on a new line after your conversational response. Syntax: `[LEARN] {{"topic": "Topic Name", "fact": "The new fact."}}`
-
-**MISSION 2: FOSTER COMMUNITY ENGAGEMENT**
-When the chat has been quiet for 5 minutes, it's your job to spark conversation. You have two options:
-1.  **Ask the Streamer:** Ask the streamer an insightful, open-ended question to deepen your memory, as per Mission 1.
-2.  **Ask the Chat:** Ask the chat a general, safe question to get everyone talking.
-
-**CHAT ENGAGEMENT RULES (CRITICAL):**
--   Your questions to the chat must be positive, friendly, and safe for a general audience.
--   Good examples: "What's everyone's favorite part about this game?", "Has anyone in chat discovered any cool secrets?", "What music do you all like to listen to while gaming?"
--   **ABSOLUTE RULE:** Never bring up controversial, sensitive, negative, or deeply personal topics. Your goal is to create a fun and welcoming space. If you are ever in doubt, choose to ask the streamer a question about the game instead.
-
-**GENERAL BEHAVIOR:**
--   **Conversational Flow:** Follow a strict 1-3 question limit per topic with the streamer. After 1-3 questions, you MUST conclude with a short statement ("Got it.", "Cool.") and wait for a new topic.
--   **Contradictions:** If you detect a contradiction with your memory, ask for clarification before updating it.
--   **Trivial Info:** If a user prompt is uninteresting and not worth remembering, respond with only the word `IGNORE`.
-"""
\ No newline at end of file
+# config.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Twitch Configuration ---
+BOT_NICK = os.getenv("BOT_NICK")
+CHANNEL = os.getenv("CHANNEL_NAME")
+OAUTH_TOKEN = os.getenv("TWITCH_ACCESS_TOKEN")
+SERVER = "irc.chat.twitch.tv"
+PORT = 6697                 # TLS; plaintext IRC is 6667 with IRC_TLS = False
+IRC_TLS = True
+IRC_TLS_CAFILE = os.getenv("IRC_TLS_CAFILE") or None   # trust a test server's certificate
+PRIVILEGED_USER = "remmold"
+BOT_NICKNAMES = ["lorelei", "laurelei", "loralei", "lor", "lore", "lei", "lorelei_the_bot","Laurel","Laura","Relay","Lorelai","LoreleiBot"]
+CHAT_SILENCE_THRESHOLD = 30
+INACTIVITY_THRESHOLD = 300
+AI_CALL_COOLDOWN = 10 
+FORGET_COMMAND_COOLDOWN = 5      # !forget (moderators only)
+MEMORY_COMMAND_COOLDOWN = 30     # !memory
+
+# --- Multi-Channel Runtime (channel_runtime.py) ---
+# Comma-separated list of channels; falls back to the single CHANNEL_NAME.
+CHANNELS = [c.strip().lower() for c in os.getenv("CHANNEL_NAMES", CHANNEL or "").split(",") if c.strip()]
+CHANNELS_PER_CONNECTION = 50
+JOIN_RATE_LIMIT = 20        # JOINs allowed per JOIN_RATE_PERIOD, per account
+JOIN_RATE_PERIOD = 10
+
+# --- Reconnects (async_irc_client.py) ---
+RECONNECT_DELAY = 1.0       # first backoff ceiling in seconds; doubles per failed attempt
+RECONNECT_MAX_DELAY = 60.0
+KEEPALIVE_INTERVAL = 60     # PING the server after this many idle seconds
+KEEPALIVE_TIMEOUT = 10      # ...and reconnect if it has not answered within this many
+OUTBOUND_MESSAGE_TTL = 120  # replies queued during an outage are dropped after this long
+
+# --- LLM Dispatch (llm_scheduler.py) ---
+LLM_MAX_CONCURRENCY = 4     # Gemini calls in flight across all channels
+LLM_MAX_PENDING = 100       # queued Gemini calls before new ones are refused
+LLM_REQUEST_TIMEOUT = 30    # seconds before a Gemini call is given up on
+LOR_COALESCE_WINDOW = 1.5   # !lor questions within this many seconds share one Gemini call
+LOR_MAX_BATCH = 5
+
+# --- Response Cache (response_cache.py) ---
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 600          # seconds a cached !lor answer stays valid
+RESPONSE_CACHE_SIMILARITY = 0.7   # near-match threshold; None for exact matches only
+
+# --- NEW: Memory Configuration ---
+MEMORY_FILE = "lorelei_memory.json"
+CHANNEL_MEMORY_FILE = "lorelei_memory_{channel}.json"
+MEMORY_TOKEN_BUDGET = 1500  # above this, only the most relevant facts go into the prompt
+MEMORY_TOP_K = 40
+FACT_DUPLICATE_THRESHOLD = 0.75  # shingle similarity at which a new fact counts as already known
+
+# --- Voice Recognition (speech_backends.py) ---
+# "google" (network), or the offline "vosk" (streaming) / "whisper_cpp" engines.
+VOICE_BACKEND = os.getenv("VOICE_BACKEND", "google")
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+WHISPER_MODEL_PATH = os.getenv("WHISPER_MODEL_PATH", "models/ggml-base.en.bin")
+VOICE_RECOGNITION_WORKERS = 2
+VOICE_MENTION_HOLD = 10   # seconds a name heard in partial speech counts as a direct mention
+VOICE_CALIBRATION_FILE = "voice_calibration.json"   # saved ambient noise level; None to calibrate every start
+VOICE_CALIBRATION_MAX_AGE = 24 * 3600                # seconds before it is measured again
+VOICE_PAUSE_THRESHOLD = 1.2     # seconds of silence that end a phrase; each reply waits at least this long
+VOICE_PHRASE_TIME_LIMIT = 15    # longest single phrase, in seconds
+
+# --- Voice Activity Detection (voice_activity.py) ---
+# "energy" (energy + zero-crossing rate), "webrtc" (pip install webrtcvad), or "off".
+VOICE_VAD = os.getenv("VOICE_VAD", "energy")
+VOICE_VAD_ENERGY_RATIO = 3.0    # speech must be this many times louder than the noise floor
+VOICE_VAD_MIN_SPEECH_MS = 120   # shorter bursts (clicks, pops) are not speech
+VOICE_VAD_AGGRESSIVENESS = 2    # webrtcvad mode, 0 (lenient) to 3 (strict)
+
+# --- Logging and Metrics (structured_log.py, metrics.py) ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")    # DEBUG also logs every raw IRC line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" (key=value) or "json"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))   # /metrics on 127.0.0.1; 0 turns it off
+
+# --- Chat Context (chat_context.py) ---
+CHAT_CONTEXT_MESSAGES = 30      # recent chat lines kept verbatim
+CHAT_CONTEXT_SUMMARY_LINES = 5  # older chat is boiled down to this many representative lines
+CHAT_CONTEXT_TOKEN_BUDGET = 300 # max estimated tokens of chat context per prompt
+
+# --- Gemini Configuration ---
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+MAX_HISTORY_LENGTH = 10 
+GEMINI_CONTEXT_CACHE = True     # cache system prompt + memory instead of resending it each turn
+GEMINI_CACHE_TTL_MINUTES = 60
+GEMINI_TRANSPORT = "grpc"       # one multiplexed HTTP/2 channel; "rest" for pooled keep-alive HTTPS
+GEMINI_WARM_UP = True           # connect at startup instead of on the first question
+
+# --- Bot Personality (MAJOR OVERHAUL) ---
+# config.py
+
+# (Keep all other configurations the same)
+
+# --- Bot Personality (Final Version with Chat Engagement) ---
+SYSTEM_PROMPT_TEMPLATE = """
+You are Lorelei, an AI companion and community host for the streamer "{streamer}". 
+Your primary mission is to learn and foster a friendly, engaging atmosphere in the chat.
+
+**MISSION 1: BUILD THE MEMORY BANK**
+Your main goal is to build a memory about the streamer and the games they play.
+-   **What to Learn:** Focus on concrete, reusable information. This includes facts about the game being played (lore, mechanics, goals) and about the streamer themselves (preferences, hobbies, opinions, stories).
+-   **How to Learn:** Use the `[LEARN]` command on a new line after your conversational response. Syntax: `[LEARN] {{"topic": "Topic Name", "fact": "The new fact."}}`
+
+**MISSION 2: FOSTER COMMUNITY ENGAGEMENT**
+When the chat has been quiet for 5 minutes, it's your job to spark conversation. You have two options:
+1.  **Ask the Streamer:** Ask the streamer an insightful, open-ended question to deepen your memory, as per Mission 1.
+2.  **Ask the Chat:** Ask the chat a general, safe question to get everyone talking.
+
+**CHAT ENGAGEMENT RULES (CRITICAL):**
+-   Your questions to the chat must be positive, friendly, and safe for a general audience.
+-   Good examples: "What's everyone's favorite part about this game?", "Has anyone in chat discovered any cool secrets?", "What music do you all like to listen to while gaming?"
+-   **ABSOLUTE RULE:** Never bring up controversial, sensitive, negative, or deeply personal topics. Your goal is to create a fun and welcoming space. If you are ever in doubt, choose to ask the streamer a question about the game instead.
+
+**GENERAL BEHAVIOR:**
+-   **Conversational Flow:** Follow a strict 1-3 question limit per topic with the streamer. After 1-3 questions, you MUST conclude with a short statement ("Got it.", "Cool.") and wait for a new topic.
+-   **Contradictions:** If you detect a contradiction with your memory, ask for clarification before updating it.
+-   **Trivial Info:** If a user prompt is uninteresting and not worth remembering, respond with only the word `IGNORE`.
+"""
+
+SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(streamer=PRIVILEGED_USER)
\ No newline at end of file
@@ -0,0 +1,216 @@
+# event_bus.py
+"""
+One prioritized event queue for the bot's main thread.
+
+The IRC thread, the voice threads and LLM callbacks publish typed events, and
+timers publish events when they come due. The main thread takes events in lane
+order and runs the subscribed handlers, so everything that touches the bot's state
+runs on that one thread. Lanes, most urgent first:
+
+    LANE_VOICE      the streamer talking, and answers to it
+    LANE_MENTION    chat messages naming the bot
+    LANE_COMMAND    !lor and other chat commands, and their answers
+    LANE_CHAT       other chat messages
+    LANE_PROACTIVE  inactivity prompts and housekeeping timers
+
+Events in the same lane come out in publish order. There is no polling: get()
+sleeps until an event is published or the next timer is due. Timers live on a
+TimerWheel, so resetting one (e.g. the inactivity timer on every chat message) is O(1).
+"""
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+from timer_wheel import TimerWheel
+
+LANE_VOICE = 0
+LANE_MENTION = 1
+LANE_COMMAND = 2
+LANE_CHAT = 3
+LANE_PROACTIVE = 4
+LANE_NAMES = ("voice", "mention", "command", "chat", "proactive")
+
+QUEUE_DEPTH = metrics.gauge("event_bus_queue_depth", "Events waiting on the bus, by lane.", ["lane"])
+QUEUE_WAIT = metrics.histogram("event_bus_wait_seconds", "Time from publish to dispatch, by lane.", ["lane"])
+_LANE_DEPTH = [QUEUE_DEPTH.labels(name) for name in LANE_NAMES]
+_LANE_WAIT = [QUEUE_WAIT.labels(name) for name in LANE_NAMES]
+
+
+class Event:
+    __slots__ = ("time", "lane")
+
+    def __init__(self):
+        self.time = None   # set by EventBus.publish
+        self.lane = None
+
+
+class ChatMessage(Event):
+    __slots__ = ("username", "text", "source")
+
+    def __init__(self, username, text, source=None):
+        super().__init__()
+        self.username = username
+        self.text = text
+        self.source = source
+
+
+class VoiceUtterance(Event):
+    """A finished transcript of the streamer's speech."""
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+
+class VoicePartial(Event):
+    """In-progress speech from a streaming recognizer."""
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+
+class AIResponse(Event):
+    """The result of an LLM request: `response` on success, `error` on failure."""
+    __slots__ = ("kind", "response", "error")
+
+    def __init__(self, kind, response=None, error=None):
+        super().__init__()
+        self.kind = kind
+        self.response = response
+        self.error = error
+
+
+class TimerFired(Event):
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+
+class EventBus:
+    """
+    Thread-safe priority queue of events plus the handlers subscribed to them.
+
+    `clock` is read for timers and event timestamps; a simulation can pass a virtual
+    clock and call get(timeout=0) to step through events without sleeping. Timers
+    fire up to `timer_tick` seconds late.
+    """
+
+    def __init__(self, clock=time.monotonic, timer_tick=0.1):
+        self.clock = clock
+        self._events = []
+        self._timers = TimerWheel(tick=timer_tick, clock=clock)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._handlers = collections.defaultdict(list)
+        self._stopped = False
+        self.published = [0] * len(LANE_NAMES)
+        self.dispatched = 0
+        self.max_depth = 0
+
+    def subscribe(self, event_type, handler):
+        """Calls handler(event) on the bus thread for every event of exactly `event_type`."""
+        self._handlers[event_type].append(handler)
+
+    def publish(self, event, lane):
+        """Queues `event` in `lane`. Safe to call from any thread."""
+        with self._condition:
+            self._push(event, lane)
+            self._condition.notify()
+
+    def _push(self, event, lane):
+        event.time = self.clock()
+        event.lane = lane
+        heapq.heappush(self._events, (lane, next(self._seq), event))
+        _LANE_DEPTH[lane].inc()
+        self.published[lane] += 1
+        if len(self._events) > self.max_depth:
+            self.max_depth = len(self._events)
+
+    def call_later(self, delay, event, lane=LANE_PROACTIVE):
+        """Publishes `event` in `lane` after `delay` seconds. Returns a WheelTimer for cancel()/reset()."""
+        with self._condition:
+            timer = self._timers.schedule(delay, self._push, event, lane)
+            self._condition.notify()
+        return timer
+
+    def cancel(self, timer):
+        with self._condition:
+            timer.cancel()
+
+    def reset(self, timer, delay):
+        """Reschedules `timer` `delay` seconds from now, even if it already fired."""
+        with self._condition:
+            timer.reset(delay)
+            self._condition.notify()
+
+    def next_timer(self):
+        """A time at or before which the next timer fires, or None."""
+        with self._condition:
+            return self._timers.next_due()
+
+    def get(self, timeout=None):
+        """
+        Returns the most urgent event, waiting up to `timeout` seconds (forever if
+        None) for one to be published or a timer to come due. Returns None on timeout
+        or after stop().
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while not self._stopped:
+                now = self.clock()
+                self._timers.advance(now)
+                if self._events:
+                    lane, _, event = heapq.heappop(self._events)
+                    _LANE_DEPTH[lane].dec()
+                    _LANE_WAIT[lane].observe(now - event.time)
+                    return event
+                wait = None if deadline is None else deadline - now
+                next_due = self._timers.next_due()
+                if next_due is not None:
+                    wait = next_due - now if wait is None else min(wait, next_due - now)
+                if wait is not None and wait <= 0:
+                    return None
+                self._condition.wait(wait)
+            return None
+
+    def dispatch(self, event):
+        """Runs the handlers subscribed to the event's type."""
+        self.dispatched += 1
+        for handler in self._handlers.get(type(event), ()):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"[ERROR] Handler for {type(event).__name__} failed: {e}")
+
+    def run(self):
+        """Dispatches events until stop() is called."""
+        while not self._stopped:
+            event = self.get()
+            if event is not None:
+                self.dispatch(event)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def pending(self):
+        with self._condition:
+            return len(self._events)
+
+    def metrics(self):
+        return {
+            "published": dict(zip(LANE_NAMES, self.published)),
+            "dispatched": self.dispatched,
+            "max_depth": self.max_depth,
+            "pending": self.pending(),
+            "timers": len(self._timers),
+        }
@@ -0,0 +1,125 @@
+# fact_dedup.py
+import re
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+SHINGLE_SIZE = 4
+SIGNATURE_BINS = 32
+BAND_ROWS = 4
+_HASH_MASK = (1 << 61) - 1
+
+
+def canonical_topic(topic):
+    """Case- and whitespace-insensitive key for a topic name."""
+    return " ".join(topic.split()).casefold()
+
+
+def normalize_fact(fact):
+    """Lowercases, drops punctuation and collapses whitespace, for duplicate checks."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", fact.casefold()).split())
+
+
+def shingles(normalized, size=SHINGLE_SIZE):
+    """Character n-grams of an already normalized fact."""
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signature(shingle_set, bins=SIGNATURE_BINS):
+    """
+    One-permutation MinHash: each shingle is hashed once and the minimum is kept per
+    bin, so a signature costs O(shingles) rather than O(shingles * bins). Empty bins
+    borrow from the next non-empty bin (rotation densification).
+    """
+    mins = [None] * bins
+    for shingle in shingle_set:
+        value = hash(shingle) & _HASH_MASK
+        slot = value % bins
+        value //= bins
+        if mins[slot] is None or value < mins[slot]:
+            mins[slot] = value
+
+    if None in mins:
+        original = mins[:]
+        if all(value is None for value in original):
+            return tuple(mins)
+        for i in range(bins):
+            if original[i] is None:
+                distance = 1
+                while original[(i + distance) % bins] is None:
+                    distance += 1
+                mins[i] = original[(i + distance) % bins] * bins + distance
+    return tuple(mins)
+
+
+class FactDeduplicator:
+    """
+    Finds exact and near-duplicate facts within a topic.
+    Exact duplicates (after normalization) are caught with a hash set in O(1).
+    Near duplicates are found with MinHash LSH over character shingles, and each
+    candidate is confirmed with the real Jaccard similarity against `threshold`.
+    """
+
+    def __init__(self, threshold=0.8, bins=SIGNATURE_BINS, band_rows=BAND_ROWS):
+        self.threshold = threshold
+        self.bins = bins
+        self.band_rows = band_rows
+        self._exact = {}      # topic_key -> {normalized fact: fact}
+        self._buckets = {}    # topic_key -> {(band, band values): [fact, ...]}
+        self._last_signature = (None, None)   # (fact, signature) from the last lookup, reused by add()
+
+    def _bands(self, signature):
+        rows = self.band_rows
+        for band in range(self.bins // rows):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def find_duplicate(self, topic_key, fact):
+        """Returns the stored fact that `fact` duplicates, or None."""
+        normalized = normalize_fact(fact)
+        exact = self._exact.get(topic_key)
+        if not exact:
+            return None
+        if normalized in exact:
+            return exact[normalized]
+        if self.threshold is None or self.threshold >= 1:
+            return None
+
+        fact_shingles = shingles(normalized)
+        signature = minhash_signature(fact_shingles, self.bins)
+        self._last_signature = (fact, signature)
+        buckets = self._buckets[topic_key]
+        checked = set()
+        for key in self._bands(signature):
+            for candidate in buckets.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if jaccard(fact_shingles, shingles(normalize_fact(candidate))) >= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, topic_key, fact):
+        normalized = normalize_fact(fact)
+        exact = self._exact.setdefault(topic_key, {})
+        if normalized in exact:
+            return
+        exact[normalized] = fact
+        if self.threshold is None or self.threshold >= 1:
+            return
+        last_fact, signature = self._last_signature
+        if last_fact != fact:
+            signature = minhash_signature(shingles(normalized), self.bins)
+        buckets = self._buckets.setdefault(topic_key, {})
+        for key in self._bands(signature):
+            buckets.setdefault(key, []).append(fact)
+
+    def remove_topic(self, topic_key):
+        self._exact.pop(topic_key, None)
+        self._buckets.pop(topic_key, None)
@@ -1,66 +1,281 @@
-# gemini_handler.py
-import google.generativeai as genai
-import json
-import re
-
-class GeminiHandler:
-    def __init__(self, api_key, system_prompt, max_history, memory_handler):
-        print("Configuring Gemini API...")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=system_prompt
-        )
-        self.history = []
-        self.max_history = max_history
-        self.memory_handler = memory_handler
-        print("Gemini model created.")
-
-    def _process_ai_commands(self, response_text):
-        """Parses the AI's response for memory commands and executes them."""
-        lines = response_text.split('\n')
-        cleaned_lines = []
-        
-        learn_pattern = re.compile(r'\[LEARN\] (.*)')
-
-        for line in lines:
-            learn_match = learn_pattern.match(line)
-
-            if learn_match:
-                try:
-                    data = json.loads(learn_match.group(1))
-                    self.memory_handler.learn_fact(data['topic'], data['fact'])
-                except (json.JSONDecodeError, KeyError) as e:
-                    print(f"[ERROR] Could not parse LEARN command: {e}")
-                continue
-            
-            cleaned_lines.append(line)
-
-        return '\n'.join(cleaned_lines).strip()
-
-    def get_response(self, user_prompt):
-        """Gets an AI response, managing history and structured memory."""
-        try:
-            # Get the formatted memory string
-            memory_string = self.memory_handler.get_memory_for_prompt()
-            prompt_with_memory = f"{memory_string}\n{user_prompt}"
-
-            self.history.append({"role": "user", "parts": [prompt_with_memory]})
-            
-            chat_session = self.model.start_chat(history=self.history)
-            response = chat_session.send_message(prompt_with_memory)
-            
-            cleaned_response_text = self._process_ai_commands(response.text)
-
-            self.history.append({"role": "model", "parts": [cleaned_response_text]})
-            
-            if len(self.history) > self.max_history:
-                self.history = self.history[2:]
-            
-            return cleaned_response_text
-
-        except Exception as e:
-            print(f"❌ An error occurred with the Gemini API: {e}")
-            if self.history and self.history[-1]['role'] == 'user':
-                self.history.pop()
-            return "Sorry, I'm having a bit of brain fog right now."
\ No newline at end of file
+# gemini_handler.py
+import google.generativeai as genai
+from google.generativeai import caching
+from collections import deque
+import datetime
+import json
+import re
+import threading
+import time
+
+import metrics
+from memory_index import estimate_tokens
+
+MODEL_NAME = "gemini-2.5-flash"
+CACHE_MIN_TOKENS = 1024   # Gemini won't cache content smaller than this
+ERROR_RESPONSE = "Sorry, I'm having a bit of brain fog right now."
+
+API_LATENCY = metrics.histogram("gemini_request_seconds", "Gemini send_message latency.")
+API_ERRORS = metrics.counter("gemini_errors_total", "Gemini requests that raised an error.")
+TOKENS = metrics.counter("gemini_tokens_total", "Tokens reported by Gemini, by kind.", ["kind"])
+MEMORY_PROMPT_TOKENS = metrics.histogram("memory_prompt_tokens", "Estimated tokens of memory sent with a turn, "
+                                         "by where it rides (inline in the turn, or with the model).",
+                                         ["placement"], buckets=metrics.SIZE_BUCKETS)
+_USAGE_FIELDS = (("prompt_token_count", "prompt"), ("candidates_token_count", "completion"),
+                 ("cached_content_token_count", "cached"))
+
+
+def _record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for field, kind in _USAGE_FIELDS:
+        count = getattr(usage, field, None)
+        if count:
+            TOKENS.labels(kind).inc(count)
+
+# genai.configure sets up one process-wide client. Configure it once, so every
+# channel's handler in a multi-channel process shares the same client, and with it
+# one connection: the "grpc" transport multiplexes every call over a single HTTP/2
+# channel, "rest" keeps a pooled keep-alive HTTPS session.
+_configured = None
+_configure_lock = threading.Lock()
+
+def _configure_once(api_key, transport):
+    global _configured
+    with _configure_lock:
+        if _configured != (api_key, transport):
+            print(f"Configuring Gemini API ({transport})...")
+            genai.configure(api_key=api_key, transport=transport)
+            _configured = (api_key, transport)
+
+class ChatSessionManager:
+    """
+    Keeps one chat session alive across turns instead of starting a new one per call.
+    History is a bounded deque of (user, model) turns. The session is rebuilt from it
+    only when the window slides or the model changes (new memory version). When the
+    session's own record of the last turn differs from what the deque keeps (memory
+    or chat context was attached to the prompt, or commands were cut from the
+    answer), its history is overwritten with the deque's instead.
+    """
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max(1, max_turns))
+        self.rebuilds = 0
+        self._model = None
+        self._chat = None
+
+    def history(self):
+        contents = []
+        for user_text, model_text in self.turns:
+            contents.append({"role": "user", "parts": [user_text]})
+            contents.append({"role": "model", "parts": [model_text]})
+        return contents
+
+    def session_for(self, model):
+        if self._chat is None or model is not self._model:
+            self._model = model
+            self._chat = model.start_chat(history=self.history())
+            self.rebuilds += 1
+        return self._chat
+
+    def record(self, user_text, model_text, in_sync=True):
+        """Stores a finished turn. `in_sync` is False when the session saw different text."""
+        window_slides = len(self.turns) == self.turns.maxlen
+        self.turns.append((user_text, model_text))
+        if window_slides:
+            self._chat = None
+        elif not in_sync and self._chat is not None:
+            self._chat.history = self.history()
+
+    def reset(self):
+        self._chat = None
+
+
+class GeminiHandler:
+    def __init__(self, api_key, system_prompt, max_history, memory_handler,
+                 use_context_cache=True, cache_ttl_minutes=60, response_cache=None, transport="grpc",
+                 chat_context=None):
+        _configure_once(api_key, transport)
+        self.system_prompt = system_prompt
+        self.model = genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            system_instruction=system_prompt
+        )
+        self.max_history = max_history
+        self.session = ChatSessionManager(max_history // 2)
+        self.memory_handler = memory_handler
+        # What chat has been saying (chat_context.ChatContext), sent with every turn.
+        self.chat_context = chat_context
+        self._memory_model = None
+        self._memory_model_version = None
+
+        # Answers to single chat questions, dropped when memory learns about their topic.
+        self.response_cache = response_cache
+        if response_cache is not None:
+            memory_handler.add_listener(response_cache.on_memory_change)
+
+        # --- Context caching of the system prompt + memory block ---
+        self.use_context_cache = use_context_cache
+        self.cache_ttl = datetime.timedelta(minutes=cache_ttl_minutes)
+        self._cache = None
+        self._cached_model = None
+        self._cached_version = None
+        self._cache_expires_at = 0
+        print("Gemini model created.")
+
+    def warm_up(self):
+        """
+        Opens the shared connection with a cheap metadata call, so the first chat
+        question doesn't also pay for DNS, TCP and the TLS handshake. Safe to run on
+        a background thread; failures are only logged.
+        """
+        start = time.monotonic()
+        try:
+            genai.get_model(f"models/{MODEL_NAME}")
+        except Exception as e:
+            print(f"[WARN] Gemini warm-up failed: {e}")
+            return
+        print(f"[INFO] Gemini connection ready in {time.monotonic() - start:.2f}s.")
+
+    def _drop_context_cache(self):
+        cache, self._cache, self._cached_model = self._cache, None, None
+        if cache is not None:
+            try:
+                cache.delete()
+            except Exception as e:
+                print(f"[WARN] Could not delete Gemini context cache: {e}")
+
+    def _refresh_context_cache(self, version, memory_prefix):
+        """Uploads the system prompt + memory block as cached content for this memory version."""
+        self._drop_context_cache()
+        self._cached_version = version
+        try:
+            self._cache = caching.CachedContent.create(
+                model=f"models/{MODEL_NAME}",
+                system_instruction=self.system_prompt,
+                contents=[{"role": "user", "parts": [memory_prefix]}],
+                ttl=self.cache_ttl,
+            )
+            self._cached_model = genai.GenerativeModel.from_cached_content(cached_content=self._cache)
+            # Refresh a minute early so a turn never races the expiry.
+            self._cache_expires_at = time.monotonic() + self.cache_ttl.total_seconds() - 60
+            print(f"[INFO] Cached memory block (version {version}) with Gemini.")
+        except Exception as e:
+            print(f"[INFO] Gemini context cache unavailable, sending memory inline: {e}")
+            self._cache = None
+            self._cached_model = None
+
+    def _memory_model_for(self, version, memory_prefix):
+        """A model with the memory block in its system instruction, rebuilt per memory version."""
+        if self._memory_model_version != version:
+            self._memory_model = genai.GenerativeModel(
+                model_name=MODEL_NAME,
+                system_instruction=f"{self.system_prompt}\n\n{memory_prefix}"
+            )
+            self._memory_model_version = version
+        return self._memory_model
+
+    def _model_for_turn(self):
+        """
+        Returns (model, memory_in_model). While the memory block is stable it rides with
+        the model (as cached content, or in the system instruction when too small to
+        cache), so turns don't resend it. Otherwise relevant facts go inline per turn.
+        """
+        version, memory_prefix = self.memory_handler.get_memory_prefix()
+        if memory_prefix:
+            MEMORY_PROMPT_TOKENS.labels("model").observe(estimate_tokens(memory_prefix))
+        cacheable = (self.use_context_cache and memory_prefix and
+                     estimate_tokens(self.system_prompt) + estimate_tokens(memory_prefix) >= CACHE_MIN_TOKENS)
+        if not cacheable:
+            if self._cache is not None:
+                self._drop_context_cache()
+            self._cached_version = None
+            if not memory_prefix:
+                return self.model, False
+            return self._memory_model_for(version, memory_prefix), True
+
+        expired = self._cache is not None and time.monotonic() >= self._cache_expires_at
+        if version != self._cached_version or expired:
+            self._refresh_context_cache(version, memory_prefix)
+        if self._cached_model is None:
+            return self._memory_model_for(version, memory_prefix), True
+        return self._cached_model, True
+
+    def _process_ai_commands(self, response_text):
+        """Parses the AI's response for memory commands and executes them."""
+        lines = response_text.split('\n')
+        cleaned_lines = []
+        
+        learn_pattern = re.compile(r'\[LEARN\] (.*)')
+
+        for line in lines:
+            learn_match = learn_pattern.match(line)
+
+            if learn_match:
+                try:
+                    data = json.loads(learn_match.group(1))
+                    self.memory_handler.learn_fact(data['topic'], data['fact'])
+                except (json.JSONDecodeError, KeyError) as e:
+                    print(f"[ERROR] Could not parse LEARN command: {e}")
+                continue
+            
+            cleaned_lines.append(line)
+
+        return '\n'.join(cleaned_lines).strip()
+
+    def get_response(self, user_prompt):
+        """Gets an AI response, managing history and structured memory."""
+        try:
+            model, memory_in_model = self._model_for_turn()
+            message = user_prompt
+            if not memory_in_model:
+                # Get the formatted memory string, limited to what is relevant to this prompt
+                memory_string = self.memory_handler.get_memory_for_prompt(user_prompt)
+                if memory_string:
+                    MEMORY_PROMPT_TOKENS.labels("inline").observe(estimate_tokens(memory_string))
+                    message = f"{memory_string}\n{user_prompt}"
+            if self.chat_context is not None:
+                chat_block = self.chat_context.context_block()
+                if chat_block:
+                    message = f"{chat_block}\n{message}"
+
+            chat_session = self.session.session_for(model)
+            start = time.monotonic()
+            try:
+                response = chat_session.send_message(message)
+            finally:
+                API_LATENCY.observe(time.monotonic() - start)
+            _record_usage(response)
+
+            cleaned_response_text = self._process_ai_commands(response.text)
+
+            # History keeps the bare prompt; memory is attached fresh (or cached) each turn.
+            in_sync = message == user_prompt and cleaned_response_text == response.text.strip()
+            self.session.record(user_prompt, cleaned_response_text, in_sync)
+
+            return cleaned_response_text
+
+        except Exception as e:
+            API_ERRORS.inc()
+            print(f"❌ An error occurred with the Gemini API: {e}")
+            self.session.reset()
+            return ERROR_RESPONSE
+
+    def get_batched_response(self, questions):
+        """
+        Answers several (username, question) pairs from chat in one call. A single
+        question is sent as-is; several become one prompt asking for one chat
+        message that answers each viewer by name.
+        """
+        if len(questions) == 1:
+            question = questions[0][1]
+            start = time.monotonic()
+            response = self.get_response(question)
+            if self.response_cache is not None and response != ERROR_RESPONSE and "IGNORE" not in response.upper():
+                self.response_cache.put(question, response, time.monotonic() - start)
+            return response
+        lines = "\n".join(f"- @{username}: {question}" for username, question in questions)
+        prompt = ("Several viewers asked you questions at the same time. Reply with one chat message "
+                  f"that answers each of them, addressing each viewer by @name:\n{lines}")
+        return self.get_response(prompt)
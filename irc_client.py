@@ -1,130 +1,88 @@
-# irc_client.py
-import socket
-import threading
-import queue
-import time
-
-class IRCClient:
-    def __init__(self, server, port, token, bot_nick, channel):
-        self.server = server
-        self.port = port
-        self.token = token
-        self.bot_nick = bot_nick
-        self.channel = channel
-        
-        self.sock = socket.socket()
-        self.message_queue = queue.Queue()
-        self.is_connected = False
-        self._stop_event = threading.Event()
-
-    def connect(self):
-        """Connects to the Twitch IRC server and joins the channel."""
-        print(f"Connecting to {self.server}:{self.port}...")
-        self.sock = socket.socket()
-        self.sock.connect((self.server, self.port))
-        
-        # --- FINAL FIX: Ensure the token has the 'oauth:' prefix ---
-        # This resolves the authentication rejection from the Twitch server.
-        formatted_token = self.token if self.token.startswith("oauth:") else f"oauth:{self.token}"
-        
-        self.sock.send("CAP REQ :twitch.tv/tags twitch.tv/commands\r\n".encode("utf-8"))
-        self.sock.send(f"PASS {formatted_token}\r\n".encode("utf-8"))
-        self.sock.send(f"NICK {self.bot_nick}\r\n".encode("utf-8"))
-        self.sock.send(f"JOIN #{self.channel}\r\n".encode("utf-8"))
-        
-        self.is_connected = True
-        self._stop_event.clear()
-
-    # (The rest of the file remains the same as the previous version)
-    # _listen_thread, start, _connection_manager, and send_privmsg
-    # do not need any further changes.
-    # irc_client.py -> _listen_thread function
-
-    def _listen_thread(self):
-        """Listens for all incoming messages and handles server commands."""
-        while not self._stop_event.is_set():
-            try:
-                resp = self.sock.recv(4096).decode("utf-8")
-                if not resp:
-                    print("[INFO] Connection stream empty. Closing connection.")
-                    self.is_connected = False
-                    break
-
-                for line in resp.strip().split("\r\n"):
-                    # --- NEW: Print every single raw message from the server for diagnosis ---
-                    print(f"<<< {line}") 
-
-                    if line.startswith("PING"):
-                        self.sock.send("PONG :tmi.twitch.tv\r\n".encode("utf-8"))
-                        print("[INFO] Responded to server PING.")
-                        continue
-
-                    if "RECONNECT" in line:
-                        print("[INFO] Server requested a reconnect. Re-establishing connection...")
-                        self.is_connected = False
-                        break 
-
-                    if "001" in line:
-                        print("✅ Bot has successfully logged in and is ready.")
-                        print("---")
-
-                    if "PRIVMSG" in line:
-                        parts = line.split(":", 2)
-                        if len(parts) >= 3:
-                            username = parts[1].split("!")[0]
-                            message = parts[2]
-                            self.message_queue.put((username, message))
-
-            except (ConnectionResetError, ConnectionAbortedError, OSError):
-                print("[ERROR] Connection was lost.")
-                self.is_connected = False
-                break
-            except Exception as e:
-                print(f"[ERROR] An unexpected error occurred in the listen thread: {e}")
-                self.is_connected = False
-                break
-        
-        self.is_connected = False
-        self._stop_event.set()
-        self.sock.close()
-        print("[INFO] IRC listener thread has stopped.")
-
-
-    def start(self):
-        """Starts a master thread that connects and maintains the connection."""
-        master_thread = threading.Thread(target=self._connection_manager, daemon=True)
-        master_thread.start()
-        print("🤖 Bot services started.")
-
-    def _connection_manager(self):
-        """Keeps the bot connected, attempting to reconnect on failure."""
-        while not self._stop_event.is_set():
-            try:
-                self.connect()
-                # The "✅ Connected" printout is now moved to after a successful login (001)
-                # print("---")
-                # print(f"✅ Connected to #{self.channel} as {self.bot_nick}")
-                # print("---")
-
-                listen_thread = threading.Thread(target=self._listen_thread)
-                listen_thread.start()
-                listen_thread.join()
-            except Exception as e:
-                print(f"[ERROR] Connection manager failed: {e}")
-
-            if not self._stop_event.is_set():
-                print("Attempting to reconnect in 5 seconds...")
-                time.sleep(5)
-
-
-    def send_privmsg(self, message):
-        """Sends a chat message to the channel, now with error handling."""
-        if not self.is_connected:
-            print("[WARN] Cannot send message, not connected.")
-            return
-        try:
-            print(f"[{self.bot_nick}]: {message}")
-            self.sock.send(f"PRIVMSG #{self.channel} :{message}\r\n".encode("utf-8"))
-        except OSError as e:
-            print(f"[ERROR] Failed to send message: {e}")
-            self.is_connected = False
\ No newline at end of file
+# irc_client.py
+import asyncio
+import threading
+import queue
+
+from async_irc_client import AsyncIRCClient
+from outbound_queue import PRIORITY_COMMAND
+
+class IRCClient:
+    """
+    Synchronous wrapper around AsyncIRCClient.
+    The asyncio client runs on a single background event loop thread; chat messages
+    are handed to the rest of the bot through `message_queue` as (username, message, irc_message);
+    the IRCMessage is there for its tags (badges, mod status). With `on_message`, each
+    message is passed to on_message(username, message, irc_message) on the event loop
+    thread instead of being queued. Other keyword arguments (reconnect and keepalive
+    settings) are passed on to AsyncIRCClient.
+    """
+
+    def __init__(self, server, port, token, bot_nick, channel, on_message=None, **client_options):
+        self.server = server
+        self.port = port
+        self.token = token
+        self.bot_nick = bot_nick
+        self.channel = channel
+
+        self.message_queue = queue.SimpleQueue()
+        self.on_message = on_message
+        self._client = AsyncIRCClient(server, port, token, bot_nick, channel, on_message=self._deliver,
+                                      **client_options)
+        self._loop = None
+        self._loop_thread = None
+
+    @property
+    def is_connected(self):
+        return self._client.is_connected
+
+    def start(self):
+        """Starts the event loop thread that connects and maintains the connection."""
+        if self._loop_thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._loop_thread.start()
+        print("🤖 Bot services started.")
+
+    def connect(self, timeout=None):
+        """
+        Starts the client if needed and blocks until the server has accepted the login
+        (its 001 welcome). Raises TimeoutError if that takes longer than `timeout`.
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._client.wait_logged_in(), self._loop)
+        future.result(timeout)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._client.run())
+        finally:
+            self._loop.close()
+
+    def _deliver(self, msg):
+        # Called from the read loop as each line is parsed: no second queue or task
+        # switch on the event loop before the message reaches the bot.
+        if msg.command == "PRIVMSG" and len(msg.params) >= 2:
+            if self.on_message is not None:
+                self.on_message(msg.nick, msg.text, msg)
+            else:
+                self.message_queue.put((msg.nick, msg.text, msg))
+
+    def send_privmsg(self, message, priority=PRIORITY_COMMAND):
+        """
+        Queues a chat message for the channel without blocking the caller. While
+        disconnected it waits in the queue and is sent after the reconnect.
+        """
+        if self._loop is None:
+            print("[WARN] Cannot send message, the client has not been started.")
+            return
+        asyncio.run_coroutine_threadsafe(self._client.send_privmsg(message, priority=priority), self._loop)
+
+    def stop(self, timeout=5.0):
+        """Closes the connection and stops the event loop thread."""
+        if self._loop_thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout)
+        self._loop_thread.join(timeout)
+        self._loop_thread = None
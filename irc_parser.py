@@ -0,0 +1,171 @@
+# irc_parser.py
+"""Incremental line framing and IRCv3 message parsing for the Twitch IRC stream."""
+
+_TAG_UNESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+# Twitch allows 8191 bytes of tags plus a 512 byte message body.
+MAX_LINE_LENGTH = 8191 + 512
+
+
+def _unescape_tag_value(value):
+    """Unescapes an IRCv3 tag value (\\: \\s \\\\ \\r \\n)."""
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    length = len(value)
+    while i < length:
+        char = value[i]
+        if char == "\\":
+            i += 1
+            if i < length:
+                nxt = value[i]
+                out.append(_TAG_UNESCAPES.get(nxt, nxt))
+            # A lone trailing backslash is dropped, as the spec requires.
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def parse_tags(raw_tags):
+    """Parses the raw tag section (without the leading '@') into a dict."""
+    tags = {}
+    for item in raw_tags.split(";"):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        tags[key] = _unescape_tag_value(value) if sep else ""
+    return tags
+
+
+class IRCMessage:
+    """A single parsed IRC line. Tags are parsed lazily on first access."""
+
+    __slots__ = ("_raw_tags", "_tags", "prefix", "command", "params")
+
+    def __init__(self, command, params=(), prefix=None, raw_tags=None, tags=None):
+        self._raw_tags = raw_tags
+        self._tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = parse_tags(self._raw_tags) if self._raw_tags else {}
+        return self._tags
+
+    @property
+    def nick(self):
+        """The nickname from the prefix ('nick!user@host'), or None."""
+        if not self.prefix:
+            return None
+        return self.prefix.split("!", 1)[0]
+
+    @property
+    def channel(self):
+        """The channel name (without '#') for channel-targeted commands."""
+        if self.params and self.params[0].startswith("#"):
+            return self.params[0][1:]
+        return None
+
+    @property
+    def text(self):
+        """The trailing parameter, e.g. the chat text of a PRIVMSG."""
+        return self.params[-1] if self.params else ""
+
+    def __repr__(self):
+        return f"IRCMessage(command={self.command!r}, prefix={self.prefix!r}, params={self.params!r})"
+
+
+def parse_line(line):
+    """
+    Parses one IRC line (without CRLF) into an IRCMessage.
+    Returns None for empty or malformed lines.
+    """
+    if not line:
+        return None
+
+    raw_tags = None
+    prefix = None
+    pos = 0
+
+    if line[0] == "@":
+        space = line.find(" ")
+        if space == -1:
+            return None
+        raw_tags = line[1:space]
+        pos = space + 1
+        while pos < len(line) and line[pos] == " ":
+            pos += 1
+
+    if line.startswith(":", pos):
+        space = line.find(" ", pos)
+        if space == -1:
+            return None
+        prefix = line[pos + 1:space]
+        pos = space + 1
+        while pos < len(line) and line[pos] == " ":
+            pos += 1
+
+    rest = line[pos:] if pos else line
+    trailing_at = rest.find(" :")
+    if trailing_at != -1:
+        params = rest[:trailing_at].split()
+        command = params.pop(0) if params else None
+        params.append(rest[trailing_at + 2:])
+    else:
+        params = rest.split()
+        command = params.pop(0) if params else None
+
+    if not command:
+        return None
+    return IRCMessage(command.upper(), tuple(params), prefix, raw_tags)
+
+
+class LineFramer:
+    """
+    Splits a raw byte stream into complete IRC lines.
+    Partial lines are kept in a reusable buffer until their terminator arrives,
+    so lines and multibyte UTF-8 characters split across reads decode correctly.
+    """
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self._buffer = bytearray()
+        self.max_line_length = max_line_length
+        self.dropped_lines = 0
+
+    def feed(self, data):
+        """Adds received bytes and returns the list of complete decoded lines."""
+        buffer = self._buffer
+        buffer += data
+        lines = []
+        end = buffer.rfind(b"\n")
+        if end != -1:
+            start = 0
+            while start <= end:
+                newline = buffer.find(b"\n", start, end + 1)
+                stop = newline
+                if stop > start and buffer[stop - 1] == 0x0D:
+                    stop -= 1
+                if stop > start:
+                    lines.append(buffer[start:stop].decode("utf-8", "replace"))
+                start = newline + 1
+            del buffer[:end + 1]
+
+        # Checked on what is left after the complete lines, so an oversized partial line
+        # is caught even when it arrives in the same read as a terminator.
+        if len(buffer) > self.max_line_length:
+            # A line this long is not valid IRC; discard it rather than grow forever.
+            self.dropped_lines += 1
+            buffer.clear()
+        return lines
+
+    def pending(self):
+        """Returns the number of buffered bytes belonging to an incomplete line."""
+        return len(self._buffer)
+
+    def clear(self):
+        self._buffer.clear()
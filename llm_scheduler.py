@@ -0,0 +1,219 @@
+# llm_scheduler.py
+import collections
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError
+
+import metrics
+
+PENDING = metrics.gauge("llm_pending_requests", "LLM requests waiting for a worker.")
+IN_FLIGHT = metrics.gauge("llm_in_flight_requests", "LLM requests running on a worker.")
+QUEUE_WAIT = metrics.histogram("llm_queue_wait_seconds", "Time an LLM request waited for a worker.")
+REQUEST_TIME = metrics.histogram("llm_request_seconds", "Time an LLM request ran on a worker.")
+REJECTED = metrics.counter("llm_rejected_total", "LLM requests refused because the queue was full.")
+TIMED_OUT = metrics.counter("llm_timed_out_total", "LLM requests that timed out.")
+
+
+class FairLLMScheduler:
+    """
+    Shares a fixed number of LLM worker threads fairly across channels.
+    Each channel has its own FIFO of jobs and at most one job in flight, so a
+    channel's GeminiHandler history stays ordered. Ready channels are served
+    round-robin, so a busy channel cannot starve quiet ones.
+
+    At most `max_concurrency` calls run at once and at most `max_pending` wait in
+    line; past that, submit() returns a future failed with queue.Full. A request
+    whose `timeout` passes fails with TimeoutError. The worker running it cannot be
+    interrupted, so it stays busy until the call returns, and the late result is dropped.
+
+    coalesce() merges requests that arrive within a short window into one call.
+    """
+
+    def __init__(self, max_concurrency=4, max_pending=None, request_timeout=None):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self._jobs = {}
+        self._pending = 0
+        self._ready = collections.deque()
+        self._busy = set()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._stopped = False
+
+        self._batches = {}
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._timer_condition = threading.Condition()
+        self._timer_thread = None
+
+    def start(self):
+        for i in range(self.max_concurrency):
+            worker = threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._timer_thread = threading.Thread(target=self._timer_loop, name="llm-timers", daemon=True)
+        self._timer_thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        with self._timer_condition:
+            self._timer_condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        if self._timer_thread is not None:
+            self._timer_thread.join()
+            self._timer_thread = None
+
+    def submit(self, channel, func, *args, timeout=None):
+        """Queues func(*args) for `channel` and returns a concurrent.futures.Future."""
+        future = Future()
+        self._enqueue(channel, future, func, args, timeout)
+        return future
+
+    def coalesce(self, channel, key, item, batch_func, window=1.0, max_batch=8, timeout=None,
+                 join_only=False):
+        """
+        Collects `item` into the batch open for (channel, key), or opens one that runs
+        batch_func(items) after `window` seconds. Every item in a batch shares one
+        future. Returns (future, merged), where merged is True if the item joined an
+        existing batch. With join_only, returns (None, False) when no batch is open.
+        """
+        with self._condition:
+            batch = self._batches.get((channel, key))
+            if batch is not None and len(batch[1]) < max_batch:
+                batch[1].append(item)
+                return batch[0], True
+            if join_only:
+                return None, False
+            batch = (Future(), [item])
+            self._batches[(channel, key)] = batch
+        self.call_later(window, self._flush_batch, channel, key, batch, batch_func, timeout)
+        return batch[0], False
+
+    def call_later(self, delay, callback, *args):
+        """Runs callback(*args) on the scheduler's timer thread after `delay` seconds."""
+        with self._timer_condition:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_seq), callback, args))
+            self._timer_condition.notify()
+
+    def _flush_batch(self, channel, key, batch, batch_func, timeout):
+        with self._condition:
+            if self._batches.get((channel, key)) is batch:
+                del self._batches[(channel, key)]
+        future, items = batch
+        self._enqueue(channel, future, batch_func, (list(items),), timeout)
+
+    def _enqueue(self, channel, future, func, args, timeout):
+        if timeout is None:
+            timeout = self.request_timeout
+        with self._condition:
+            if self.max_pending is not None and self._pending >= self.max_pending:
+                future.set_exception(queue.Full(f"{self._pending} LLM requests already waiting"))
+                REJECTED.inc()
+                return
+            jobs = self._jobs.setdefault(channel, collections.deque())
+            jobs.append((future, func, args, time.monotonic()))
+            self._pending += 1
+            PENDING.inc()
+            if len(jobs) == 1 and channel not in self._busy:
+                self._ready.append(channel)
+                self._condition.notify()
+        if timeout is not None:
+            self.call_later(timeout, self._expire, future, timeout)
+
+    @staticmethod
+    def _expire(future, timeout):
+        try:
+            future.set_exception(TimeoutError(f"LLM request timed out after {timeout}s"))
+            TIMED_OUT.inc()
+        except InvalidStateError:
+            pass   # already finished or cancelled
+
+    def pending(self, channel=None):
+        """Number of queued (not yet running) jobs, for one channel or in total."""
+        with self._condition:
+            if channel is not None:
+                return len(self._jobs.get(channel, ()))
+            return sum(len(jobs) for jobs in self._jobs.values())
+
+    def _next_job(self):
+        with self._condition:
+            while not self._ready and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+            channel = self._ready.popleft()
+            jobs = self._jobs[channel]
+            job = jobs.popleft()
+            if not jobs:
+                del self._jobs[channel]
+            self._pending -= 1
+            PENDING.dec()
+            self._busy.add(channel)
+            return channel, job
+
+    def _finish(self, channel):
+        with self._condition:
+            self._busy.discard(channel)
+            if channel in self._jobs:
+                # Back of the line: every other ready channel gets a turn first.
+                self._ready.append(channel)
+                self._condition.notify()
+
+    def _worker(self):
+        while True:
+            item = self._next_job()
+            if item is None:
+                return
+            channel, (future, func, args, enqueued_at) = item
+            try:
+                runnable = future.set_running_or_notify_cancel()
+            except RuntimeError:
+                runnable = False   # timed out while queued; skip it without calling the model
+            if runnable:
+                start = time.monotonic()
+                QUEUE_WAIT.observe(start - enqueued_at)
+                IN_FLIGHT.inc()
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    self._settle(future.set_exception, e)
+                else:
+                    self._settle(future.set_result, result)
+                finally:
+                    IN_FLIGHT.dec()
+                    REQUEST_TIME.observe(time.monotonic() - start)
+            self._finish(channel)
+
+    @staticmethod
+    def _settle(setter, value):
+        try:
+            setter(value)
+        except InvalidStateError:
+            pass   # timed out while running; the late result is dropped
+
+    def _timer_loop(self):
+        while True:
+            with self._timer_condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if self._timers:
+                        wait = self._timers[0][0] - time.monotonic()
+                        if wait <= 0:
+                            _, _, callback, args = heapq.heappop(self._timers)
+                            break
+                    else:
+                        wait = None
+                    self._timer_condition.wait(wait)
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"[ERROR] LLM scheduler timer callback failed: {e}")
@@ -1,197 +1,335 @@
-# main.py
-from irc_client import IRCClient
-from gemini_handler import GeminiHandler
-from voice_handler import VoiceHandler
-from memory_handler import MemoryHandler
-import config
-import time
-import random
-import threading
-import queue
-import os
-import shutil
-from datetime import datetime
-
-def main():
-    # --- Queues ---
-    voice_command_queue = queue.Queue()
-
-    # --- State Management ---
-    bot_state = {
-        'is_waiting_for_reply': False,
-        'last_question_time': 0,
-        'last_activity_time': time.time(),
-        'last_streamer_utterance': None,
-        'inactivity_prompt_sent': False,
-        'last_ai_call_time': 0,
-    }
-    REPLY_TIMEOUT = 60
-
-    # --- Initialize Handlers ---
-    memory_handler = MemoryHandler(config.MEMORY_FILE)
-    if os.path.exists(config.MEMORY_FILE):
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            base, ext = os.path.splitext(config.MEMORY_FILE)
-            backup_path = f"{base}_backup_{timestamp}{ext}"
-            shutil.copy2(config.MEMORY_FILE, backup_path)
-            print(f"✅ Created memory backup at: {backup_path}")
-        except Exception as e:
-            print(f"[ERROR] Could not create memory backup: {e}")
-
-    ai_handler = GeminiHandler(
-        api_key=config.GEMINI_API_KEY,
-        system_prompt=config.SYSTEM_PROMPT,
-        max_history=config.MAX_HISTORY_LENGTH,
-        memory_handler=memory_handler
-    )
-    
-    irc_client = IRCClient(
-        server=config.SERVER,
-        port=config.PORT,
-        token=config.OAUTH_TOKEN,
-        bot_nick=config.BOT_NICK,
-        channel=config.CHANNEL
-    )
-
-    # --- Voice Logic (Queueing) ---
-    def on_voice_recognized(text):
-        """This function adds the recognized text to a queue for processing."""
-        print(f"✅ Voice command queued: '{text}'")
-        voice_command_queue.put(text)
-
-    # --- Dedicated Voice Command Processor ---
-    def process_voice_commands():
-        """
-        This function runs in a separate thread, processing voice commands from the queue
-        one by one, respecting the AI cooldown.
-        """
-        while True:
-            text = voice_command_queue.get()
-
-            # Cooldown Logic acts as a "thinking" delay
-            time_since_last_call = time.time() - bot_state['last_ai_call_time']
-            if time_since_last_call < config.AI_CALL_COOLDOWN:
-                wait_time = config.AI_CALL_COOLDOWN - time_since_last_call
-                print(f"[COOLDOWN] Waiting for {wait_time:.1f}s before processing next voice command...")
-                time.sleep(wait_time)
-            
-            # Original processing logic is now here
-            bot_state['last_streamer_utterance'] = text
-            is_direct_mention = any(nick in text.lower() for nick in config.BOT_NICKNAMES)
-
-            if bot_state['is_waiting_for_reply']:
-                time_since_last_q = time.time() - bot_state['last_question_time']
-                if time_since_last_q > REPLY_TIMEOUT:
-                    print("--> Reply timeout. Forgetting previous question.")
-                    bot_state['is_waiting_for_reply'] = False
-
-            if is_direct_mention or bot_state['is_waiting_for_reply']:
-                print("[STATE] Active conversation state.")
-                prompt_for_ai = text
-                if is_direct_mention:
-                    bot_state['is_waiting_for_reply'] = False
-            else:
-                time_since_last_chat = time.time() - bot_state['last_activity_time']
-                if time_since_last_chat < config.CHAT_SILENCE_THRESHOLD:
-                    print(f"[STATE] Inactive. Ignoring ambient chatter.")
-                    continue 
-                print("--> Processing as a new topic (from voice)...")
-                prompt_for_ai = f'The streamer, {config.PRIVILEGED_USER}, just said: "{text}"'
-
-            bot_state['last_ai_call_time'] = time.time()
-            ai_response = ai_handler.get_response(prompt_for_ai)
-
-            if "IGNORE" in ai_response.upper():
-                print("--> AI decided to ignore the voice command. Staying silent.")
-                continue
-
-            if ai_response.endswith('?'):
-                bot_state['is_waiting_for_reply'] = True
-                bot_state['last_question_time'] = time.time()
-                print("[STATE] Awaiting reply. Conversation remains active.")
-            else:
-                bot_state['is_waiting_for_reply'] = False
-                print("[STATE] Concluded topic. Conversation is now inactive.")
-
-            irc_client.send_privmsg(ai_response)
-            bot_state['last_activity_time'] = time.time()
-            print("[INFO] Bot activity timer updated.")
-
-    # --- Start Services ---
-    voice_handler = VoiceHandler(on_speech_recognized_callback=on_voice_recognized)
-    voice_handler.start()
-    irc_client.start()
-    
-    voice_processor_thread = threading.Thread(target=process_voice_commands, daemon=True)
-    voice_processor_thread.start()
-    print("🗣️ Voice command processor thread started.")
-
-    # --- Main Application Loop (OVERHAULED Inactivity Logic) ---
-    while True:
-        try:
-            username, message = irc_client.message_queue.get(timeout=1.0)
-            
-            print(f"[{username}]: {message}")
-            bot_state['last_activity_time'] = time.time()
-            bot_state['inactivity_prompt_sent'] = False
-
-            if message.lower().startswith("!lor"):
-                time_since_last_call = time.time() - bot_state['last_ai_call_time']
-                if time_since_last_call < config.AI_CALL_COOLDOWN:
-                    print(f"[COOLDOWN] !lor command ignored due to AI cooldown.")
-                    continue
-
-                prompt_for_ai = message[len('!lor'):].strip()
-                if not prompt_for_ai:
-                    irc_client.send_privmsg(f"Hi @{username}! To use me, type !lor followed by your question.")
-                    continue
-                
-                bot_state['last_ai_call_time'] = time.time()
-                ai_response = ai_handler.get_response(prompt_for_ai)
-                
-                irc_client.send_privmsg(ai_response)
-                bot_state['last_activity_time'] = time.time()
-
-        except queue.Empty:
-            # This block runs when no messages are in the queue (i.e., chat is quiet)
-            time_since_activity = time.time() - bot_state['last_activity_time']
-            
-            if (time_since_activity > config.INACTIVITY_THRESHOLD and 
-                not bot_state['inactivity_prompt_sent']):
-                
-                time_since_last_call = time.time() - bot_state['last_ai_call_time']
-                if time_since_last_call < config.AI_CALL_COOLDOWN:
-                    print(f"[COOLDOWN] Inactivity prompt skipped due to recent AI activity.")
-                    bot_state['inactivity_prompt_sent'] = True
-                    continue
-
-                print("[INFO] 5 minutes of inactivity detected. Engaging proactive question mode...")
-                
-                # Check if the current game is known
-                if "Current Game" not in memory_handler.memory:
-                    prompt_for_ai = "It's quiet and you don't know the current game. Ask the streamer what they are playing."
-                else:
-                    prompt_for_ai = "It's quiet. Based on your memory, ask an interesting, open-ended question to learn more about an existing topic (like the current game or the streamer's preferences)."
-                
-                bot_state['last_ai_call_time'] = time.time()
-                ai_response = ai_handler.get_response(prompt_for_ai)
-                bot_state['inactivity_prompt_sent'] = True 
-
-                if "IGNORE" not in ai_response.upper():
-                    print(f"--> AI generated proactive question: {ai_response}")
-                    irc_client.send_privmsg(ai_response)
-                    bot_state['last_activity_time'] = time.time()
-                    print("[INFO] Bot activity timer updated.")
-                else:
-                    print("--> AI decided not to ask a question right now.")
-
-        except KeyboardInterrupt:
-            print("\nScript interrupted by user. Exiting...")
-            break
-        except Exception as e:
-            print(f"An error occurred in the main loop: {e}")
-            time.sleep(5)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+# main.py
+# Heavy modules (the Gemini SDK, speech_recognition) are imported by build_ai_handler()
+# and start_voice() on background threads, so chat is connected before they load.
+from irc_client import IRCClient
+from chat_commands import ChatDispatcher, PERMISSION_MODERATOR, forget_reply, memory_reply, proactive_prompt
+from llm_scheduler import FairLLMScheduler
+from memory_handler import MemoryHandler
+from chat_context import ChatContext
+from outbound_queue import OutboundScheduler
+from async_irc_client import create_tls_context
+from response_cache import ResponseCache
+from event_bus import EventBus, ChatMessage, VoicePartial, VoiceUtterance, LANE_VOICE
+from bot_state import BotStateMachine, chat_lane
+import metrics
+import structured_log
+import config
+import argparse
+import threading
+from concurrent.futures import Future
+
+log = structured_log.get_logger("chat")
+
+REPLY_TIMEOUT = 60
+
+class Assistant:
+    """
+    The single-channel bot without its inputs: chat commands, the conversation state
+    machine and the event bus, wired to an IRC client, an AI handler and memory.
+    main() builds one with Gemini and the microphone; benchmarks/bench_pipeline.py
+    builds one against a fake Twitch server with a stub AI and injected voice text.
+    """
+
+    def __init__(self, irc_client, ai_handler, memory_handler, bus=None, ai_cooldown=config.AI_CALL_COOLDOWN,
+                 chat_context=None):
+        # --- Events ---
+        # Chat, voice, AI answers and timers all arrive on one bus and are handled on the
+        # main thread, in lane order (streamer voice > mentions > commands > chat > proactive).
+        self.bus = bus or EventBus()
+        self.irc_client = irc_client
+        self.ai_handler = ai_handler
+        self.memory_handler = memory_handler
+        # Every chat line is recorded so the model knows what chat is talking about.
+        self.chat_context = chat_context
+
+        # Gemini calls run on worker threads so chat keeps flowing while the model thinks.
+        # Everything shares one GeminiHandler history, so they all use the same channel key
+        # and run one at a time, in order.
+        self.llm = FairLLMScheduler(
+            max_concurrency=1,
+            max_pending=config.LLM_MAX_PENDING,
+            request_timeout=config.LLM_REQUEST_TIMEOUT
+        )
+        self.llm_channel = irc_client.channel
+
+        # --- Chat Commands ---
+        self.commands = ChatDispatcher(config.BOT_NICKNAMES, owners=[config.PRIVILEGED_USER, irc_client.channel])
+        self.commands.register("lor", self.handle_lor)
+        self.commands.register("forget", self.handle_forget, cooldown=config.FORGET_COMMAND_COOLDOWN,
+                               permission=PERMISSION_MODERATOR)
+        self.commands.register("memory", self.handle_memory, cooldown=config.MEMORY_COMMAND_COOLDOWN)
+
+        # The state machine owns what used to be the shared bot_state dict.
+        self.bot = BotStateMachine(
+            self.bus,
+            submit=lambda prompt: self.llm.submit(self.llm_channel, ai_handler.get_response, prompt),
+            send=irc_client.send_privmsg,
+            mentions=self.commands.mentions,
+            proactive_prompt=self.proactive_prompt,
+            streamer=config.PRIVILEGED_USER,
+            ai_cooldown=ai_cooldown,
+            reply_timeout=REPLY_TIMEOUT,
+            inactivity_threshold=config.INACTIVITY_THRESHOLD,
+            chat_silence_threshold=config.CHAT_SILENCE_THRESHOLD,
+            mention_hold=config.VOICE_MENTION_HOLD
+        )
+        self.bus.subscribe(ChatMessage, self.on_chat_event)
+        irc_client.on_message = self.on_chat_message
+
+    def proactive_prompt(self):
+        return proactive_prompt(self.memory_handler)
+
+    # --- Event Sources (other threads only publish) ---
+    def on_chat_message(self, username, message, irc_message):
+        """Runs on the IRC thread; picks the message's lane and hands it to the bus."""
+        self.bus.publish(ChatMessage(username, message, irc_message), chat_lane(self.commands, message))
+
+    def on_voice_recognized(self, text):
+        print(f"✅ Voice command queued: '{text}'")
+        self.bus.publish(VoiceUtterance(text), LANE_VOICE)
+
+    def on_voice_partial(self, text):
+        if self.commands.mentions(text):
+            self.bus.publish(VoicePartial(text), LANE_VOICE)
+
+    def on_chat_event(self, event):
+        log.info("[%s]: %s", event.username, event.text)
+        if self.chat_context is not None:
+            self.chat_context.add(event.username, event.text)
+        self.commands.dispatch(event.username, event.text, event.source)
+
+    # --- Chat Command Handlers ---
+    def handle_lor(self, username, prompt_for_ai, irc_message):
+        irc_client, ai_handler, bot = self.irc_client, self.ai_handler, self.bot
+        if not prompt_for_ai:
+            irc_client.send_privmsg(f"Hi @{username}! To use me, type !lor followed by your question.")
+            return False
+
+        # Repeated questions are answered from the cache, cooldown or not.
+        cache = ai_handler.response_cache
+        cached_response = cache.get(prompt_for_ai) if cache is not None else None
+        if cached_response is not None:
+            irc_client.send_privmsg(f"@{username} {cached_response}")
+            bot.note_activity()
+            return
+
+        # Questions that arrive while a batch is still collecting share its answer.
+        question = (username, prompt_for_ai)
+        future, merged = self.llm.coalesce(
+            self.llm_channel, "!lor", question, ai_handler.get_batched_response,
+            window=config.LOR_COALESCE_WINDOW, max_batch=config.LOR_MAX_BATCH,
+            join_only=bot.on_cooldown()
+        )
+        if future is None:
+            print(f"[COOLDOWN] !lor command ignored due to AI cooldown.")
+            return
+        if merged:
+            print(f"[INFO] !lor question from {username} joined a batched request.")
+            return
+        bot.note_ai_call()
+        future.add_done_callback(bot.response_callback("lor"))
+
+    def handle_forget(self, username, topic, irc_message):
+        self.irc_client.send_privmsg(forget_reply(self.memory_handler, username, topic))
+        if not topic:
+            return False   # only the usage help; don't start the cooldown
+
+    def handle_memory(self, username, args, irc_message):
+        self.irc_client.send_privmsg(memory_reply(self.memory_handler, username))
+
+    # --- Lifecycle ---
+    def start(self):
+        """Connects to chat and starts the LLM workers and the bot's timers."""
+        self.irc_client.start()
+        self.llm.start()
+        self.bot.start()
+
+    def run(self):
+        # No polling: the bus sleeps until an event arrives or a timer (cooldown, reply
+        # timeout, inactivity) comes due.
+        self.bus.run()
+
+    def stop(self):
+        self.bus.stop()
+        self.llm.stop()
+        self.memory_handler.close()
+
+
+class DeferredAIHandler:
+    """
+    Stands in for the AI handler while build_ai_handler() is still running, so chat
+    is served before the Gemini SDK has even been imported. AI calls wait for the
+    real handler; they run on LLM worker threads, never on the bus thread.
+    """
+
+    def __init__(self, future, response_cache=None):
+        self._future = future
+        self.response_cache = response_cache
+
+    def get_response(self, user_prompt):
+        return self._future.result().get_response(user_prompt)
+
+    def get_batched_response(self, questions):
+        return self._future.result().get_batched_response(questions)
+
+
+def build_ai_handler(memory_handler, chat_context, response_cache):
+    """Imports, configures and warms up Gemini. Slow; main() runs it in the background."""
+    from gemini_handler import GeminiHandler
+
+    ai_handler = GeminiHandler(
+        api_key=config.GEMINI_API_KEY,
+        system_prompt=config.SYSTEM_PROMPT,
+        max_history=config.MAX_HISTORY_LENGTH,
+        memory_handler=memory_handler,
+        use_context_cache=config.GEMINI_CONTEXT_CACHE,
+        cache_ttl_minutes=config.GEMINI_CACHE_TTL_MINUTES,
+        response_cache=response_cache,
+        transport=config.GEMINI_TRANSPORT,
+        chat_context=chat_context
+    )
+    if config.GEMINI_WARM_UP:
+        ai_handler.warm_up()
+    return ai_handler
+
+
+def start_voice(assistant):
+    """Opens the microphone (calibrating it if needed) and starts recognition. Slow; run in the background."""
+    from speech_backends import create_backend
+    from voice_activity import VoiceActivityDetector
+    from voice_handler import VoiceHandler
+
+    speech_backend = create_backend(
+        config.VOICE_BACKEND,
+        vosk_model_path=config.VOSK_MODEL_PATH,
+        whisper_model_path=config.WHISPER_MODEL_PATH
+    )
+    vad = None
+    if config.VOICE_VAD != "off":
+        vad = VoiceActivityDetector(
+            mode=config.VOICE_VAD,
+            energy_ratio=config.VOICE_VAD_ENERGY_RATIO,
+            min_speech_ms=config.VOICE_VAD_MIN_SPEECH_MS,
+            aggressiveness=config.VOICE_VAD_AGGRESSIVENESS
+        )
+    voice_handler = VoiceHandler(
+        on_speech_recognized_callback=assistant.on_voice_recognized,
+        backend=speech_backend,
+        on_partial_callback=assistant.on_voice_partial,
+        recognition_workers=config.VOICE_RECOGNITION_WORKERS,
+        vad=vad,
+        calibration_file=config.VOICE_CALIBRATION_FILE,
+        calibration_max_age=config.VOICE_CALIBRATION_MAX_AGE,
+        pause_threshold=config.VOICE_PAUSE_THRESHOLD,
+        phrase_time_limit=config.VOICE_PHRASE_TIME_LIMIT
+    )
+    voice_handler.start()
+    return voice_handler
+
+
+def _in_background(name, func, *args):
+    """Runs func(*args) on a daemon thread, so a stuck device can't hold up exit. Returns its Future."""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+def start_assistant(irc_client, memory_handler, build_ai, voice=None, chat_context=None, response_cache=None,
+                    ai_cooldown=config.AI_CALL_COOLDOWN):
+    """
+    Connects to chat right away and runs `build_ai()` and `voice(assistant)` on
+    background threads meanwhile. Returns the started Assistant and the futures of
+    the AI handler and the voice handler (None without `voice`).
+    """
+    ai_future = _in_background("startup-ai", build_ai)
+    assistant = Assistant(irc_client, DeferredAIHandler(ai_future, response_cache), memory_handler,
+                          ai_cooldown=ai_cooldown, chat_context=chat_context)
+    assistant.start()
+    voice_future = _in_background("startup-voice", voice, assistant) if voice is not None else None
+    return assistant, ai_future, voice_future
+
+
+def _report_failure(name):
+    def report(future):
+        if future.exception() is not None:
+            print(f"[ERROR] {name} failed to start: {future.exception()}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lorelei, the Twitch chat assistant.")
+    parser.add_argument("--no-voice", action="store_true", help="Chat only: don't open the microphone.")
+    args = parser.parse_args(argv)
+
+    structured_log.configure(config.LOG_LEVEL, config.LOG_FORMAT)
+    metrics_server = metrics.start_server(config.METRICS_PORT) if config.METRICS_PORT else None
+
+    # --- Initialize Handlers ---
+    # MemoryHandler keeps its own crash-safe snapshot and backup; no copy needed here.
+    memory_handler = MemoryHandler(
+        config.MEMORY_FILE,
+        token_budget=config.MEMORY_TOKEN_BUDGET,
+        top_k=config.MEMORY_TOP_K,
+        duplicate_threshold=config.FACT_DUPLICATE_THRESHOLD
+    )
+
+    chat_context = ChatContext(
+        recent_messages=config.CHAT_CONTEXT_MESSAGES,
+        summary_lines=config.CHAT_CONTEXT_SUMMARY_LINES,
+        token_budget=config.CHAT_CONTEXT_TOKEN_BUDGET
+    )
+    response_cache = ResponseCache(
+        max_entries=config.RESPONSE_CACHE_SIZE,
+        ttl=config.RESPONSE_CACHE_TTL,
+        similarity=config.RESPONSE_CACHE_SIMILARITY
+    )
+
+    irc_client = IRCClient(
+        server=config.SERVER,
+        port=config.PORT,
+        token=config.OAUTH_TOKEN,
+        bot_nick=config.BOT_NICK,
+        channel=config.CHANNEL,
+        reconnect_delay=config.RECONNECT_DELAY,
+        max_reconnect_delay=config.RECONNECT_MAX_DELAY,
+        keepalive_interval=config.KEEPALIVE_INTERVAL,
+        keepalive_timeout=config.KEEPALIVE_TIMEOUT,
+        outbound=OutboundScheduler(ttl=config.OUTBOUND_MESSAGE_TTL),
+        tls=create_tls_context(config.IRC_TLS_CAFILE) if config.IRC_TLS else None
+    )
+
+    # --- Start Services ---
+    # Chat connects first; Gemini and the microphone come up alongside it.
+    assistant, ai_future, voice_future = start_assistant(
+        irc_client, memory_handler,
+        build_ai=lambda: build_ai_handler(memory_handler, chat_context, response_cache),
+        voice=None if args.no_voice else start_voice,
+        chat_context=chat_context,
+        response_cache=response_cache
+    )
+    ai_future.add_done_callback(_report_failure("Gemini"))
+    if voice_future is not None:
+        voice_future.add_done_callback(_report_failure("Voice input"))
+
+    # --- Main Application Loop ---
+    try:
+        assistant.run()
+    except KeyboardInterrupt:
+        print("\nScript interrupted by user. Exiting...")
+        if voice_future is not None and voice_future.done() and voice_future.exception() is None:
+            vad = voice_future.result().vad
+            if vad is not None:
+                print(f"[INFO] Voice activity detection: {vad.metrics()}")
+        print(f"[INFO] Event bus: {assistant.bus.metrics()}")
+        assistant.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,384 @@
-# memory_handler.py
-import json
-import os
-
-class MemoryHandler:
-    def __init__(self, filepath):
-        self.filepath = filepath
-        self.memory = self._load_memory()
-
-    def _load_memory(self):
-        """Loads the topic-based dictionary from the JSON file."""
-        if not os.path.exists(self.filepath):
-            print(f"[INFO] Memory file not found. Creating a new one at {self.filepath}")
-            with open(self.filepath, 'w') as f:
-                json.dump({}, f)
-            return {}
-        
-        try:
-            with open(self.filepath, 'r') as f:
-                print("[INFO] Loading facts from memory bank...")
-                data = json.load(f)
-                return data if isinstance(data, dict) else {}
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"[ERROR] Could not read memory file: {e}. Starting with empty memory.")
-            return {}
-
-    def _save_memory(self):
-        """Saves the current memory dictionary back to the JSON file."""
-        try:
-            with open(self.filepath, 'w') as f:
-                json.dump(self.memory, f, indent=4)
-        except IOError as e:
-            print(f"[ERROR] Could not save memory file: {e}")
-
-    def learn_fact(self, topic, fact, category="General"):
-        """Adds a new fact to a specific topic in memory."""
-        # Normalize topic for consistency
-        topic = topic.strip()
-        fact = fact.strip()
-
-        if not topic or not fact:
-            return
-
-        if topic not in self.memory:
-            print(f"[MEMORY] Creating new topic: '{topic}'")
-            self.memory[topic] = {"category": category, "facts": []}
-
-        if fact not in self.memory[topic]["facts"]:
-            print(f"[MEMORY] Learning new fact for topic '{topic}': '{fact}'")
-            self.memory[topic]["facts"].append(fact)
-            self._save_memory()
-
-    def forget_topic(self, topic):
-        """Removes an entire topic and all its facts from memory."""
-        if topic in self.memory:
-            print(f"[MEMORY] Forgetting entire topic: '{topic}'")
-            del self.memory[topic]
-            self._save_memory()
-
-    def get_memory_for_prompt(self):
-        """Formats the entire memory for injection into the AI prompt."""
-        if not self.memory:
-            return ""
-        
-        formatted_string = "[MEMORY] You have learned the following:\n"
-        for topic, data in self.memory.items():
-            facts_str = "; ".join(data.get("facts", []))
-            formatted_string += f'- Topic: {topic} | Facts: {facts_str}\n'
-        return formatted_string
\ No newline at end of file
+# memory_handler.py
+import json
+import os
+import threading
+
+from fact_dedup import FactDeduplicator, canonical_topic
+from memory_index import BM25Index, estimate_tokens
+
+MEMORY_HEADER = "[MEMORY] You have learned the following:"
+
+class MemoryHandler:
+    """
+    Topic-based fact memory, persisted as a JSON snapshot plus an append-only log.
+
+    Every change is appended as one JSON line to '<file>.wal', so learning a fact
+    costs one small write instead of rewriting the whole memory. On startup (and
+    whenever the log grows past `compact_every` entries) the log is folded into a
+    new snapshot, written to a temporary file and atomically swapped in. The
+    previous snapshot is kept as '<file>.bak'.
+
+    The snapshot has the same format as the old memory file, so existing
+    memory files load unchanged.
+
+    Facts are also kept in a BM25 index, so once the memory outgrows
+    `token_budget` the prompt gets only the facts most relevant to the question.
+
+    The full memory block is rendered once and cached per topic; learn_fact and
+    forget_topic mark only their topic dirty and bump `version`.
+
+    Topic names match case- and whitespace-insensitively, and learn_fact skips
+    facts that are exact or near duplicates (see FactDeduplicator) of a known fact.
+    """
+
+    def __init__(self, filepath, compact_every=1000, fsync=True, token_budget=1500, top_k=40,
+                 duplicate_threshold=0.75):
+        self.filepath = filepath
+        self.wal_path = f"{filepath}.wal"
+        self.backup_path = f"{filepath}.bak"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.duplicate_threshold = duplicate_threshold
+
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._wal = None
+        self._wal_entries = 0
+
+        self._recovered = False
+        self.memory = self._load_memory()
+        replayed = self._replay_wal()
+        if replayed or self._recovered or not os.path.exists(self.filepath):
+            self.compact()
+        self._open_wal()
+
+        self.version = 0
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        """Rebuilds every derived structure from self.memory."""
+        self._topic_lines = {}
+        self._dirty_topics = set(self.memory)
+        self._rendered = None
+        self.version += 1
+
+        self.index = BM25Index()
+        self.dedup = FactDeduplicator(self.duplicate_threshold)
+        self._topic_names = {}
+        self._full_chars = len(MEMORY_HEADER) + 1
+        for topic, data in self.memory.items():
+            self._topic_names.setdefault(canonical_topic(topic), topic)
+            self._full_chars += self._topic_chars(topic, data)
+            for fact in data.get("facts", []):
+                self.index.add(topic, fact)
+                self.dedup.add(canonical_topic(topic), fact)
+
+    def _load_memory(self):
+        """Loads the topic-based dictionary from the JSON snapshot, falling back to the backup."""
+        for path in (self.filepath, self.backup_path):
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    print(f"[INFO] Loading facts from memory bank ({path})...")
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"[ERROR] Could not read memory file {path}: {e}")
+                continue
+
+            if path != self.filepath:
+                self._recovered = True
+                if os.path.exists(self.filepath):
+                    # Keep the unreadable snapshot for inspection instead of rotating it over the backup.
+                    os.replace(self.filepath, f"{self.filepath}.corrupt")
+            return data if isinstance(data, dict) else {}
+
+        if os.path.exists(self.filepath):
+            print("[ERROR] No readable memory snapshot. Starting with empty memory.")
+        else:
+            print(f"[INFO] Memory file not found. Creating a new one at {self.filepath}")
+        return {}
+
+    def _replay_wal(self):
+        """Applies logged changes made since the last snapshot. Returns how many were applied."""
+        if not os.path.exists(self.wal_path):
+            return 0
+
+        applied = 0
+        valid_bytes = 0
+        with open(self.wal_path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # A torn final write from a crash; everything before it is intact.
+                    break
+                try:
+                    entry = json.loads(raw)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                self._apply(entry)
+                applied += 1
+                valid_bytes += len(raw)
+
+        if os.path.getsize(self.wal_path) != valid_bytes:
+            print("[WARN] Discarding an incomplete entry at the end of the memory log.")
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        if applied:
+            print(f"[INFO] Replayed {applied} memory changes from the log.")
+        return applied
+
+    def _apply(self, entry):
+        op = entry.get("op")
+        topic = entry.get("topic")
+        if op == "learn":
+            data = self.memory.setdefault(topic, {"category": entry.get("category", "General"), "facts": []})
+            if entry["fact"] not in data["facts"]:
+                data["facts"].append(entry["fact"])
+        elif op == "forget":
+            self.memory.pop(topic, None)
+
+    def _open_wal(self):
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+
+    def _append_log(self, entry):
+        """Durably appends one change to the log, compacting when it gets long."""
+        try:
+            # One write() per entry, so a crash can only ever tear the last line.
+            self._wal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._wal.flush()
+            if self.fsync:
+                os.fsync(self._wal.fileno())
+        except (IOError, OSError) as e:
+            print(f"[ERROR] Could not write to memory log: {e}")
+            return
+
+        self._wal_entries += 1
+        if self._wal_entries >= self.compact_every:
+            self.compact()
+
+    def _write_snapshot(self):
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.memory, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(self.filepath):
+            os.replace(self.filepath, self.backup_path)
+        os.replace(tmp_path, self.filepath)
+
+    def compact(self):
+        """Writes a fresh snapshot and empties the log."""
+        with self._lock:
+            try:
+                self._write_snapshot()
+            except (IOError, OSError) as e:
+                print(f"[ERROR] Could not save memory snapshot: {e}")
+                return
+
+            # The snapshot now holds everything, so the log can start over. Replaying
+            # a stale log onto the new snapshot is harmless if we crash before this.
+            if self._wal is not None:
+                self._wal.close()
+            with open(self.wal_path, 'w', encoding='utf-8'):
+                pass
+            self._wal_entries = 0
+            if self._wal is not None:
+                self._open_wal()
+            print(f"[MEMORY] Snapshot saved to {self.filepath} (previous kept at {self.backup_path}).")
+
+    def close(self):
+        """Folds the log into the snapshot and closes the log file."""
+        with self._lock:
+            if self._wal is None:
+                return
+            if self._wal_entries:
+                self.compact()
+            self._wal.close()
+            self._wal = None
+
+    def add_listener(self, callback):
+        """Registers callback(op, topic, fact), called after every learn or forget."""
+        self._listeners.append(callback)
+
+    def _notify(self, op, topic, fact=None):
+        for callback in self._listeners:
+            try:
+                callback(op, topic, fact)
+            except Exception as e:
+                print(f"[ERROR] Memory listener failed: {e}")
+
+    def resolve_topic(self, topic):
+        """Returns the stored name of a topic, matching case- and whitespace-insensitively."""
+        return self._topic_names.get(canonical_topic(topic))
+
+    def topics(self):
+        """Names of all known topics, oldest first."""
+        with self._lock:
+            return list(self.memory)
+
+    def has_topic(self, topic):
+        return self.resolve_topic(topic) is not None
+
+    def learn_fact(self, topic, fact, category="General"):
+        """Adds a new fact to a specific topic in memory."""
+        # Normalize topic for consistency
+        topic = " ".join(topic.split())
+        fact = fact.strip()
+
+        if not topic or not fact:
+            return
+
+        with self._lock:
+            topic_key = canonical_topic(topic)
+            existing_topic = self._topic_names.get(topic_key)
+            if existing_topic is None:
+                print(f"[MEMORY] Creating new topic: '{topic}'")
+                self.memory[topic] = {"category": category, "facts": []}
+                self._topic_names[topic_key] = topic
+                self._full_chars += self._topic_chars(topic, self.memory[topic])
+            else:
+                topic = existing_topic
+
+            duplicate = self.dedup.find_duplicate(topic_key, fact)
+            if duplicate is not None:
+                print(f"[MEMORY] Skipping duplicate fact for topic '{topic}': '{fact}' (already known: '{duplicate}')")
+                return
+
+            print(f"[MEMORY] Learning new fact for topic '{topic}': '{fact}'")
+            self.memory[topic]["facts"].append(fact)
+            self.dedup.add(topic_key, fact)
+            self.index.add(topic, fact)
+            self._full_chars += len(fact) + 2
+            self._mark_dirty(topic)
+            self._append_log({"op": "learn", "topic": topic, "fact": fact,
+                              "category": self.memory[topic]["category"]})
+        self._notify("learn", topic, fact)
+
+    def forget_topic(self, topic):
+        """Removes an entire topic and all its facts from memory."""
+        with self._lock:
+            topic = self.resolve_topic(topic)
+            if topic is not None:
+                print(f"[MEMORY] Forgetting entire topic: '{topic}'")
+                self._full_chars -= self._topic_chars(topic, self.memory[topic])
+                del self.memory[topic]
+                del self._topic_names[canonical_topic(topic)]
+                self.dedup.remove_topic(canonical_topic(topic))
+                self.index.remove_topic(topic)
+                self._topic_lines.pop(topic, None)
+                self._mark_dirty(topic)
+                self._append_log({"op": "forget", "topic": topic})
+        if topic is not None:
+            self._notify("forget", topic)
+
+    def deduplicate(self):
+        """
+        Merges topics that differ only in case/whitespace and drops exact and near
+        duplicate facts, then writes a fresh snapshot. Returns a summary dict.
+        """
+        with self._lock:
+            bytes_before = len(json.dumps(self.memory, indent=4, ensure_ascii=False).encode("utf-8"))
+            topics_before = len(self.memory)
+            facts_before = sum(len(data.get("facts", [])) for data in self.memory.values())
+
+            merged = {}
+            names = {}
+            dedup = FactDeduplicator(self.duplicate_threshold)
+            for topic, data in self.memory.items():
+                topic_key = canonical_topic(topic)
+                name = names.setdefault(topic_key, " ".join(topic.split()))
+                target = merged.setdefault(name, {"category": data.get("category", "General"), "facts": []})
+                for fact in data.get("facts", []):
+                    if dedup.find_duplicate(topic_key, fact) is None:
+                        dedup.add(topic_key, fact)
+                        target["facts"].append(fact)
+
+            self.memory = merged
+            self._rebuild_indexes()
+            self.compact()
+
+            facts_after = sum(len(data["facts"]) for data in merged.values())
+            bytes_after = len(json.dumps(merged, indent=4, ensure_ascii=False).encode("utf-8"))
+            return {
+                "topics_merged": topics_before - len(merged),
+                "facts_removed": facts_before - facts_after,
+                "facts_kept": facts_after,
+                "bytes_before": bytes_before,
+                "bytes_after": bytes_after,
+            }
+
+    def _mark_dirty(self, topic):
+        self._dirty_topics.add(topic)
+        self._rendered = None
+        self.version += 1
+
+    def _fits_budget(self):
+        # Decide from the tracked size, so an oversized memory is never rendered in full.
+        return self.token_budget is None or (self._full_chars + 3) // 4 <= self.token_budget
+
+    def _render_full(self):
+        """The full memory block, re-rendering only topics changed since the last call."""
+        if self._rendered is not None:
+            return self._rendered
+        for topic in self._dirty_topics:
+            data = self.memory.get(topic)
+            if data is not None:
+                facts_str = "; ".join(data.get("facts", []))
+                self._topic_lines[topic] = f'- Topic: {topic} | Facts: {facts_str}'
+        self._dirty_topics.clear()
+        # Dicts keep insertion order, so topics render in the order they were learned.
+        self._rendered = "\n".join([MEMORY_HEADER, *(self._topic_lines[topic] for topic in self.memory)]) + "\n"
+        return self._rendered
+
+    def get_memory_for_prompt(self, query=None):
+        """
+        Formats memory for injection into the AI prompt.
+        The whole memory is used while it fits in `token_budget`; beyond that only the
+        `top_k` facts most relevant to `query` (or the newest facts, without a query).
+        """
+        with self._lock:
+            if not self.memory:
+                return ""
+            if not self._fits_budget():
+                return self._format_relevant(query)
+            return self._render_full()
+
+    def get_memory_prefix(self):
+        """
+        Returns (version, block): the full memory block while it fits the budget, which
+        stays byte-for-byte identical until `version` changes, so it can be cached by the
+        model provider. The block is empty when memory is empty or too large, in which
+        case callers should send get_memory_for_prompt(query) with each turn instead.
+        """
+        with self._lock:
+            if not self.memory or not self._fits_budget():
+                return self.version, ""
+            return self.version, self._render_full()
+
+    @staticmethod
+    def _topic_chars(topic, data):
+        """Length of a topic's line in the full memory block."""
+        return len(topic) + 20 + sum(len(fact) + 2 for fact in data.get("facts", []))
+
+    def _format_relevant(self, query):
+        hits = [(topic, fact) for _, topic, fact in self.index.search(query, self.top_k)] if query else []
+        if not hits:
+            hits = self.index.newest(self.top_k)
+
+        # Group the hits by topic, in order of each topic's best hit, within the budget.
+        header = "[MEMORY] You have learned the following (most relevant facts):"
+        used = estimate_tokens(header)
+        grouped = {}
+        for topic, fact in hits:
+            cost = estimate_tokens(fact) + (0 if topic in grouped else estimate_tokens(topic) + 6)
+            if used + cost > self.token_budget:
+                break
+            grouped.setdefault(topic, []).append(fact)
+            used += cost
+
+        lines = [header]
+        for topic, facts in grouped.items():
+            lines.append(f'- Topic: {topic} | Facts: {"; ".join(facts)}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+# memory_index.py
+import heapq
+import math
+import re
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does did for from has have he her his how i in is it its "
+    "me my of on or our she so that the their them they this to was we were what when where "
+    "which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens with common stopwords removed."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about 4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over (topic, fact) pairs, updated incrementally.
+    The topic name is indexed together with each fact, so a query naming a
+    topic finds that topic's facts.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}      # term -> {doc_id: term frequency}
+        self._docs = {}          # doc_id -> (topic, fact, length)
+        self._doc_ids = {}       # (topic, fact) -> doc_id
+        self._topic_docs = {}    # topic -> set of doc_ids
+        self._next_id = 0
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, topic, fact):
+        key = (topic, fact)
+        if key in self._doc_ids:
+            return
+        doc_id = self._next_id
+        self._next_id += 1
+
+        terms = tokenize(topic) + tokenize(fact)
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+
+        self._docs[doc_id] = (topic, fact, len(terms))
+        self._doc_ids[key] = doc_id
+        self._topic_docs.setdefault(topic, set()).add(doc_id)
+        self._total_length += len(terms)
+
+    def _remove_doc(self, doc_id):
+        topic, fact, length = self._docs.pop(doc_id)
+        del self._doc_ids[(topic, fact)]
+        self._total_length -= length
+        for term in set(tokenize(topic) + tokenize(fact)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def remove(self, topic, fact):
+        doc_id = self._doc_ids.get((topic, fact))
+        if doc_id is not None:
+            self._remove_doc(doc_id)
+            self._topic_docs[topic].discard(doc_id)
+
+    def remove_topic(self, topic):
+        for doc_id in self._topic_docs.pop(topic, ()):
+            self._remove_doc(doc_id)
+
+    def search(self, query, k):
+        """Returns up to k (score, topic, fact) tuples, best first."""
+        doc_count = len(self._docs)
+        if not doc_count:
+            return []
+        average_length = self._total_length / doc_count or 1.0
+        k1, b = self.k1, self.b
+        docs = self._docs
+
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = k1 * (1 - b + b * docs[doc_id][2] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, docs[doc_id][0], docs[doc_id][1]) for doc_id, score in best]
+
+    def newest(self, k):
+        """Returns up to k (topic, fact) pairs, most recently added first."""
+        newest_ids = heapq.nlargest(k, self._docs)
+        return [(self._docs[doc_id][0], self._docs[doc_id][1]) for doc_id in newest_ids]
@@ -0,0 +1,313 @@
+# metrics.py
+"""
+Counters, gauges and histograms for the bot's hot paths, and a local HTTP server
+that serves them in the Prometheus text format.
+
+Modules create their metrics once, at import time, on the shared REGISTRY:
+
+    IRC_LINES = metrics.counter("irc_lines_total", "IRC lines received.", ["command"])
+    IRC_LINES.labels("PRIVMSG").inc()
+
+Every update takes a lock, since the IRC loop, the LLM workers and the voice pool
+update the same metrics from different threads; hot paths such as the IRC read
+loop count locally and add once per batch. Histograms keep fixed bucket counts,
+not samples, so their memory does not grow.
+
+MetricsServer also serves the profiler (profiler.SamplingProfiler) and changes the
+log level at runtime:
+
+    GET /metrics                          all metrics
+    GET /debug/profile?seconds=10         profile every thread for 10 s and return the report
+    GET /debug/profile/start              start profiling in the background
+    GET /debug/profile/stop               stop and return the report
+    GET /debug/loglevel?level=DEBUG       change the "lorelei.*" log level
+"""
+import bisect
+import math
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import structured_log
+from profiler import SamplingProfiler
+
+# Seconds, from a fast local call to a slow LLM answer.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def _init_unlabelled(self):
+        # A metric without labels is reported (as 0) before its first update.
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        """The child metric for one combination of label values."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """(suffix, label values, extra label pairs, value) for every child."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    # `+=` is a separate load, add and store, and threads can switch in between, so
+    # updates from several threads need the lock or increments get lost.
+    __slots__ = ("value", "_function", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Reads the value from function() whenever the metrics are collected."""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", values, (), child.get()
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets, self._lock)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with self._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield "_bucket", values, (("le", _format_value(float(bound))),), cumulative
+            yield "_sum", values, (), total
+            yield "_count", values, (), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+                metric._init_unlabelled()
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "LoreleiMetrics/1.0"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        owner = self.server.owner
+        try:
+            if url.path == "/metrics":
+                self._reply(200, owner.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif url.path == "/debug/profile":
+                self._reply(200, owner.profile(float(query.get("seconds", 10))))
+            elif url.path == "/debug/profile/start":
+                started = owner.profiler.start()
+                self._reply(200, "profiling\n" if started else "already profiling\n")
+            elif url.path == "/debug/profile/stop":
+                self._reply(200, owner.profiler.stop())
+            elif url.path == "/debug/loglevel":
+                self._reply(200, f"{structured_log.set_level(query.get('level', 'INFO'))}\n")
+            else:
+                self._reply(404, "not found\n")
+        except ValueError as e:
+            self._reply(400, f"{e}\n")
+
+    def _reply(self, status, body, content_type="text/plain; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass   # scrapes every few seconds would drown the console
+
+
+class MetricsServer:
+    """Serves /metrics and the /debug endpoints on a daemon thread. Binds to localhost by default."""
+
+    def __init__(self, port, host="127.0.0.1", registry=REGISTRY, profiler=None):
+        self.registry = registry
+        self.profiler = profiler or SamplingProfiler()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.owner = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Metrics at http://{self._server.server_address[0]}:{self.port}/metrics")
+
+    def profile(self, seconds):
+        if not self.profiler.start():
+            raise ValueError("A profile is already running")
+        threading.Event().wait(min(seconds, 300))
+        return self.profiler.stop()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_server(port, host="127.0.0.1"):
+    """
+    Starts a MetricsServer, or returns None if it can't bind: metrics are optional,
+    so a busy port is reported rather than stopping the bot.
+    """
+    try:
+        server = MetricsServer(port, host)
+    except OSError as e:
+        print(f"[WARN] Metrics server not started on {host}:{port}: {e}")
+        return None
+    server.start()
+    return server
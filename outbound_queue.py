@@ -0,0 +1,258 @@
+# outbound_queue.py
+import collections
+import heapq
+import itertools
+import time
+
+import metrics
+from rate_limit import TokenBucket
+
+# --- Priorities (lower is sent first) ---
+PRIORITY_MENTION = 0      # direct mentions and replies to the streamer
+PRIORITY_COMMAND = 1      # !lor answers and other chat commands
+PRIORITY_PROACTIVE = 2    # inactivity prompts and other unsolicited messages
+
+# --- Twitch chat limits ---
+MESSAGE_LIMIT = 20         # messages per MESSAGE_PERIOD when not a moderator
+MOD_MESSAGE_LIMIT = 100    # messages per MESSAGE_PERIOD when moderator or broadcaster
+VERIFIED_BOT_MESSAGE_LIMIT = 7500
+MESSAGE_PERIOD = 30
+CHANNEL_MESSAGE_INTERVAL = 1.0   # non-moderators may send one message per second per channel
+MAX_MESSAGE_LENGTH = 500
+DUPLICATE_WINDOW = 30      # Twitch drops identical messages sent within 30 seconds
+MESSAGE_TTL = 120          # a reply still unsent after this long (e.g. a long outage) is stale
+
+LATENCY_SAMPLES = 1000
+
+QUEUE_DEPTH = metrics.gauge("outbound_queue_depth", "Chat messages waiting to be sent, across connections.")
+SEND_DELAY = metrics.histogram("outbound_send_delay_seconds", "Time a chat message waited in the send queue.")
+SENT = metrics.counter("outbound_sent_total", "Chat messages sent.")
+DROPPED_DUPLICATES = metrics.counter("outbound_dropped_duplicates_total", "Chat messages dropped as duplicates.")
+EXPIRED = metrics.counter("outbound_expired_total", "Chat messages dropped because they waited longer than the TTL.")
+RETRIED = metrics.counter("outbound_retried_total", "Chat messages queued again after a failed send.")
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """Splits text into chunks of at most `limit` characters, preferring whitespace."""
+    text = " ".join(text.split())
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def message_buckets(message_limit=MESSAGE_LIMIT, mod_message_limit=MOD_MESSAGE_LIMIT, period=MESSAGE_PERIOD,
+                    clock=time.monotonic):
+    """The account's (user, moderator) message buckets, to share between its connections."""
+    return (TokenBucket.for_window(message_limit, period, clock=clock),
+            TokenBucket.for_window(mod_message_limit, period, clock=clock))
+
+
+class OutboundMessage:
+    __slots__ = ("channel", "text", "priority", "enqueued_at")
+
+    def __init__(self, channel, text, priority, enqueued_at):
+        self.channel = channel
+        self.text = text
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+
+
+class _ChannelLimits:
+    __slots__ = ("is_moderator", "joined", "bucket", "recent")
+
+    def __init__(self, clock):
+        self.is_moderator = False
+        self.joined = True
+        self.bucket = TokenBucket(1, 1.0 / CHANNEL_MESSAGE_INTERVAL, clock)
+        self.recent = {}
+
+
+class OutboundScheduler:
+    """
+    Priority send queue for one IRC connection.
+    A message leaves the queue only when both the account's token bucket and its
+    channel's bucket allow it. Moderator channels draw from the larger moderator
+    bucket and skip the per-channel limit. Long messages are split to Twitch's
+    500-character limit, and duplicates of a queued or recently sent message are dropped.
+    Messages that have waited longer than `ttl` seconds (None keeps them forever) are
+    dropped instead of sent, so a long outage does not end in a burst of stale replies.
+
+    Twitch counts messages per account, not per connection: every connection of one
+    account should get the same `user_bucket` and `mod_bucket` (see message_buckets()).
+    Without them the scheduler makes its own.
+    """
+
+    def __init__(self, message_limit=MESSAGE_LIMIT, mod_message_limit=MOD_MESSAGE_LIMIT,
+                 period=MESSAGE_PERIOD, clock=time.monotonic, ttl=MESSAGE_TTL, user_bucket=None, mod_bucket=None):
+        self.clock = clock
+        self.ttl = ttl
+        self._heap = []
+        self._seq = itertools.count()
+        self._channels = {}
+        if user_bucket is None or mod_bucket is None:
+            user_bucket, mod_bucket = message_buckets(message_limit, mod_message_limit, period, clock)
+        self._user_bucket = user_bucket
+        self._mod_bucket = mod_bucket
+
+        # --- Metrics ---
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped_duplicates = 0
+        self.split_messages = 0
+        self.expired = 0
+        self.retried = 0
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._latency_total = 0.0
+
+    def _limits(self, channel):
+        limits = self._channels.get(channel)
+        if limits is None:
+            limits = self._channels[channel] = _ChannelLimits(self.clock)
+        return limits
+
+    def set_moderator(self, channel, is_moderator):
+        """Records whether the bot is a moderator (or the broadcaster) in `channel`."""
+        self._limits(channel).is_moderator = is_moderator
+
+    def set_joined(self, channel, joined):
+        """
+        Holds a channel's messages while it is not joined, e.g. between a reconnect and
+        the server confirming the JOIN, since Twitch drops them silently. Channels are
+        treated as joined until this is called.
+        """
+        self._limits(channel).joined = joined
+
+    def _is_duplicate(self, limits, text, now):
+        sent_at = limits.recent.get(text)
+        if sent_at is not None:
+            if now - sent_at < DUPLICATE_WINDOW:
+                return True
+            del limits.recent[text]
+        return False
+
+    def push(self, channel, text, priority=PRIORITY_COMMAND):
+        """Queues a message. Returns the number of chunks queued (0 if dropped)."""
+        now = self.clock()
+        limits = self._limits(channel)
+        chunks = split_message(text)
+        if len(chunks) > 1:
+            self.split_messages += 1
+
+        queued = 0
+        for chunk in chunks:
+            if self._is_duplicate(limits, chunk, now):
+                self.dropped_duplicates += 1
+                DROPPED_DUPLICATES.inc()
+                continue
+            # Reserve the text now so a second copy queued before this one is sent is dropped too.
+            limits.recent[chunk] = now
+            heapq.heappush(self._heap, (priority, next(self._seq), OutboundMessage(channel, chunk, priority, now)))
+            queued += 1
+        QUEUE_DEPTH.inc(queued)
+        self.max_depth = max(self.max_depth, len(self._heap))
+        return queued
+
+    def _bucket_for(self, limits):
+        return self._mod_bucket if limits.is_moderator else self._user_bucket
+
+    def pop_ready(self):
+        """
+        Returns (message, 0) for the highest-priority message that may be sent now, or
+        (None, seconds_to_wait) if nothing can go yet. The wait is None if nothing will be
+        ready without a push() or set_joined(). Call mark_sent() once the message is
+        written, or requeue() if the write failed.
+        """
+        if not self._heap:
+            return None, None
+
+        wait = float("inf")
+        skipped = []
+        ready = None
+        now = self.clock()
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self.ttl is not None and now - entry[2].enqueued_at > self.ttl:
+                self.expired += 1
+                EXPIRED.inc()
+                QUEUE_DEPTH.dec()
+                continue
+            limits = self._limits(entry[2].channel)
+            if not limits.joined:
+                skipped.append(entry)
+                continue
+            bucket = self._bucket_for(limits)
+            delay = bucket.delay()
+            if not limits.is_moderator:
+                delay = max(delay, limits.bucket.delay())
+            if delay <= 0:
+                bucket.try_take()
+                if not limits.is_moderator:
+                    limits.bucket.try_take()
+                ready = entry[2]
+                break
+            wait = min(wait, delay)
+            skipped.append(entry)
+            account_delay = min(self._user_bucket.delay(), self._mod_bucket.delay())
+            if account_delay > 0:
+                # Both account buckets are empty, so nothing else can go either.
+                wait = min(wait, account_delay)
+                break
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+        if ready is None:
+            return None, (None if wait == float("inf") else wait)
+        QUEUE_DEPTH.dec()
+        return ready, 0
+
+    def requeue(self, message):
+        """Puts back a message whose write failed, ahead of others of its priority."""
+        heapq.heappush(self._heap, (message.priority, -next(self._seq), message))
+        self.retried += 1
+        RETRIED.inc()
+        QUEUE_DEPTH.inc()
+
+    def mark_sent(self, message):
+        now = self.clock()
+        latency = now - message.enqueued_at
+        SEND_DELAY.observe(latency)
+        SENT.inc()
+        self.sent += 1
+        self._latency_total += latency
+        self._latencies.append(latency)
+        # Twitch's duplicate window starts when the message actually goes out.
+        recent = self._limits(message.channel).recent
+        recent[message.text] = now
+        if len(recent) > 64:
+            for text, sent_at in list(recent.items()):
+                if now - sent_at >= DUPLICATE_WINDOW:
+                    del recent[text]
+
+    def __len__(self):
+        return len(self._heap)
+
+    def metrics(self):
+        """Queue depth and send latency (enqueue to write) for diagnostics."""
+        latencies = sorted(self._latencies)
+        p50 = latencies[len(latencies) // 2] if latencies else 0.0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+        return {
+            "queue_depth": len(self._heap),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped_duplicates": self.dropped_duplicates,
+            "split_messages": self.split_messages,
+            "expired": self.expired,
+            "retried": self.retried,
+            "send_latency_avg": self._latency_total / self.sent if self.sent else 0.0,
+            "send_latency_p50": p50,
+            "send_latency_p99": p99,
+        }
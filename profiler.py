@@ -0,0 +1,101 @@
+# profiler.py
+"""
+Sampling profiler that can be switched on and off while the bot runs.
+
+cProfile only sees the thread that enables it. The bot's work is spread over the
+IRC event loop, the event bus thread, the LLM workers and the voice threads. So
+this profiler samples every thread's stack from its own thread every `interval`
+seconds instead. While it is off it costs nothing. While it is on, the bot's own
+threads pay only for the GIL hand-offs.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, top=25):
+        self.interval = interval
+        self.top = top
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.samples = 0
+        self.started_at = None
+        self._self_counts = collections.Counter()
+        self._total_counts = collections.Counter()
+        self._thread_counts = collections.Counter()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Starts sampling. Returns False if a profile is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._reset()
+            self._stop.clear()
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stops sampling and returns the report."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return "The profiler is not running.\n"
+        self._stop.set()
+        thread.join()
+        return self.report()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.samples += 1
+                self._thread_counts[names.get(ident, str(ident))] += 1
+                seen = set()
+                top = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if top:
+                        # Where the thread is right now, to the line.
+                        self._self_counts[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+                        top = False
+                    if key not in seen:
+                        seen.add(key)
+                        self._total_counts[key] += 1
+                    frame = frame.f_back
+
+    @staticmethod
+    def _location(key):
+        filename, line, name = key
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        lines = [f"{self.samples:,} stack samples over {elapsed:.1f}s (every {self.interval * 1000:g}ms)", "",
+                 "threads:"]
+        for name, count in self._thread_counts.most_common():
+            lines.append(f"  {count:>8,}  {name}")
+        # Idle threads sit in wait() and select(); their samples are still listed, so
+        # the share of samples here is share of thread time, not of CPU.
+        for title, counts in (("self (where threads were)", self._self_counts),
+                              ("cumulative (function on the stack)", self._total_counts)):
+            lines += ["", f"{title}:"]
+            for key, count in counts.most_common(self.top):
+                lines.append(f"  {count:>8,} {count / max(1, self.samples):>6.1%}  {self._location(key)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+# rate_limit.py
+import asyncio
+import collections
+import random
+import time
+
+
+class SlidingWindowLimiter:
+    """
+    Allows at most `limit` events in any `period`-second window.
+    Used for Twitch JOINs, which are limited per account across all connections.
+    """
+
+    def __init__(self, limit, period, clock=time.monotonic):
+        self.limit = limit
+        self.period = period
+        self.clock = clock
+        self._events = collections.deque()
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now):
+        cutoff = now - self.period
+        while self._events and self._events[0] <= cutoff:
+            self._events.popleft()
+
+    def delay(self):
+        """Seconds until another event is allowed (0 if one is allowed now)."""
+        now = self.clock()
+        self._prune(now)
+        if len(self._events) < self.limit:
+            return 0.0
+        return self._events[0] + self.period - now
+
+    async def acquire(self):
+        """Waits until an event is allowed, then records it."""
+        async with self._lock:
+            wait = self.delay()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.delay()
+            self._events.append(self.clock())
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens, refilled at `rate` tokens/sec.
+    Use TokenBucket.for_window to stay under a fixed "N per period" limit.
+    """
+
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    @classmethod
+    def for_window(cls, limit, period, burst=None, clock=time.monotonic):
+        """
+        A bucket that can never exceed `limit` events in any `period`-second window.
+        capacity + rate * period == limit, so the burst is paid for by a slower refill.
+        """
+        burst = max(1, limit // 4) if burst is None else burst
+        return cls(burst, (limit - burst) / period, clock)
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def available(self):
+        self._refill()
+        return self._tokens
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` can be taken (0 if they can be taken now)."""
+        self._refill()
+        missing = tokens - self._tokens
+        if missing <= 1e-9:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+    def try_take(self, tokens=1):
+        if self.delay(tokens) > 0:
+            return False
+        self._tokens -= tokens
+        return True
+
+
+class Backoff:
+    """
+    Exponential backoff with "full jitter": the n-th consecutive failure waits a random
+    time between 0 and min(maximum, initial * factor**n). The randomness keeps many
+    clients that failed together (one process's connections, or every bot after a
+    Twitch outage) from retrying in lockstep.
+    """
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, rng=None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.failures = 0
+        self._rng = rng or random.Random()
+
+    def ceiling(self):
+        """The longest the next delay() can be."""
+        return min(self.maximum, self.initial * self.factor ** min(self.failures, 64))
+
+    def delay(self):
+        """Returns the next wait in seconds and counts one more failure."""
+        wait = self._rng.uniform(0, self.ceiling())
+        self.failures += 1
+        return wait
+
+    def reset(self):
+        self.failures = 0
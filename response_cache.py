@@ -0,0 +1,157 @@
+# response_cache.py
+import collections
+import threading
+import time
+
+import metrics
+from fact_dedup import jaccard, normalize_fact, shingles
+from memory_index import tokenize
+
+HITS = metrics.counter("response_cache_hits_total", "!lor answers served from the response cache, by match.",
+                       ["match"])
+MISSES = metrics.counter("response_cache_misses_total", "Response cache lookups that found no answer.")
+SAVED_SECONDS = metrics.counter("response_cache_saved_seconds_total",
+                                "AI time saved by answering from the response cache.")
+
+
+class _CacheEntry:
+    __slots__ = ("prompt", "response", "created_at", "terms", "shingles", "cost")
+
+    def __init__(self, prompt, response, created_at, terms, shingle_set, cost):
+        self.prompt = prompt
+        self.response = response
+        self.created_at = created_at
+        self.terms = terms
+        self.shingles = shingle_set
+        self.cost = cost
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of AI answers to chat questions, keyed on the normalized prompt
+    (case, punctuation and whitespace folded).
+
+    With `similarity` set, a miss falls back to a near match: entries that share a
+    word with the question are scored by character-shingle Jaccard similarity, and
+    the best one at or above `similarity` is used. Hook on_memory_change up to
+    MemoryHandler.add_listener so that learning or forgetting a topic drops every
+    cached answer that mentions it.
+    """
+
+    def __init__(self, max_entries=256, ttl=600, similarity=0.7, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.clock = clock
+        self._entries = collections.OrderedDict()   # normalized prompt -> _CacheEntry
+        self._by_term = {}                          # term -> set of normalized prompts
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.time_saved = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, prompt):
+        """Returns the cached response for `prompt` (or a near match), or None."""
+        key = normalize_fact(prompt)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl:
+                self._remove(key)
+                entry = None
+            match = "exact"
+            if entry is None and self.similarity is not None:
+                entry = self._near_match(key, now)
+                if entry is not None:
+                    self.near_hits += 1
+                    match = "near"
+            if entry is None:
+                self.misses += 1
+                MISSES.inc()
+                return None
+            self._entries.move_to_end(entry.prompt)
+            self.hits += 1
+            self.time_saved += entry.cost
+            HITS.labels(match).inc()
+            SAVED_SECONDS.inc(entry.cost)
+            return entry.response
+
+    def put(self, prompt, response, cost=0.0):
+        """Caches `response` for `prompt`; `cost` is the seconds the answer took to produce."""
+        key = normalize_fact(prompt)
+        if not key:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            terms = set(tokenize(prompt)) | set(tokenize(response))
+            self._entries[key] = _CacheEntry(key, response, self.clock(), terms, shingles(key), cost)
+            for term in terms:
+                self._by_term.setdefault(term, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _near_match(self, key, now):
+        candidates = set()
+        for term in tokenize(key):
+            candidates |= self._by_term.get(term, set())
+        if not candidates:
+            return None
+        query = shingles(key)
+        best, best_score = None, self.similarity
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            if now - entry.created_at > self.ttl:
+                continue
+            score = jaccard(query, entry.shingles)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for term in entry.terms:
+            keys = self._by_term.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_term[term]
+
+    def invalidate_topic(self, topic):
+        """Drops every entry whose question or answer shares a word with `topic`."""
+        with self._lock:
+            stale = set()
+            for term in tokenize(topic):
+                stale |= self._by_term.get(term, set())
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def on_memory_change(self, op, topic, fact=None):
+        """MemoryHandler listener."""
+        self.invalidate_topic(topic)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_term.clear()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "time_saved_s": self.time_saved,
+            }
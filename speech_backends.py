@@ -0,0 +1,130 @@
+# speech_backends.py
+"""
+Speech recognizer backends for VoiceHandler.
+
+Every backend turns a finished utterance (speech_recognition.AudioData) into text
+with transcribe(). Streaming backends also hand out a stream that takes raw PCM
+chunks as they are captured and returns partial text along the way, so a mention
+can be spotted before the speaker stops talking.
+
+    google       recognize_google (network; the original behaviour)
+    vosk         offline Kaldi models, streaming        (pip install vosk)
+    whisper_cpp  offline whisper.cpp via pywhispercpp   (pip install pywhispercpp)
+
+The offline engines are optional dependencies and are only imported when chosen.
+"""
+import json
+
+import speech_recognition as sr
+
+SAMPLE_WIDTH = 2   # bytes per sample: 16-bit mono PCM everywhere
+
+
+class GoogleBackend:
+    name = "google"
+    streaming = False
+
+    def __init__(self, recognizer=None):
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def transcribe(self, audio):
+        """Returns the recognized text, or None if nothing was understood."""
+        try:
+            return self.recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            return None
+
+
+class VoskStream:
+    """Incremental recognition of one audio stream. Feed PCM chunks as they arrive."""
+
+    def __init__(self, recognizer):
+        self._recognizer = recognizer
+        self._last_partial = ""
+
+    def feed(self, pcm):
+        """
+        Returns (final_text, partial_text). final_text is set when Vosk detects the end
+        of an utterance; partial_text is set when the in-progress hypothesis changed.
+        """
+        if self._recognizer.AcceptWaveform(bytes(pcm)):
+            self._last_partial = ""
+            text = json.loads(self._recognizer.Result()).get("text", "")
+            return text or None, None
+        partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        if partial and partial != self._last_partial:
+            self._last_partial = partial
+            return None, partial
+        return None, None
+
+    def finish(self):
+        """Flushes the stream and returns the text of the last utterance, if any."""
+        self._last_partial = ""
+        return json.loads(self._recognizer.FinalResult()).get("text", "") or None
+
+
+class VoskBackend:
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path, sample_rate=16000):
+        try:
+            import vosk
+        except ImportError as e:
+            raise ImportError("The vosk backend needs the vosk package: pip install vosk") from e
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+        self.sample_rate = sample_rate
+
+    def open_stream(self, sample_rate=None):
+        recognizer = self._vosk.KaldiRecognizer(self.model, sample_rate or self.sample_rate)
+        return VoskStream(recognizer)
+
+    def transcribe(self, audio):
+        pcm = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=SAMPLE_WIDTH)
+        stream = self.open_stream()
+        texts = []
+        # Feed in small chunks: one huge AcceptWaveform call only reports its last utterance.
+        chunk = self.sample_rate // 4 * SAMPLE_WIDTH
+        for start in range(0, len(pcm), chunk):
+            final, _ = stream.feed(pcm[start:start + chunk])
+            if final:
+                texts.append(final)
+        rest = stream.finish()
+        if rest:
+            texts.append(rest)
+        return " ".join(texts) or None
+
+
+class WhisperCppBackend:
+    name = "whisper_cpp"
+    streaming = False
+    sample_rate = 16000   # whisper models are trained on 16 kHz audio
+
+    def __init__(self, model_path, threads=4):
+        try:
+            import numpy
+            from pywhispercpp.model import Model
+        except ImportError as e:
+            raise ImportError("The whisper_cpp backend needs pywhispercpp and numpy: "
+                              "pip install pywhispercpp numpy") from e
+        self._numpy = numpy
+        self.model = Model(model_path, n_threads=threads, print_progress=False, print_realtime=False)
+
+    def transcribe(self, audio):
+        pcm = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=SAMPLE_WIDTH)
+        samples = self._numpy.frombuffer(pcm, dtype=self._numpy.int16).astype(self._numpy.float32) / 32768.0
+        text = " ".join(segment.text.strip() for segment in self.model.transcribe(samples)).strip()
+        return text or None
+
+
+def create_backend(name, recognizer=None, vosk_model_path=None, whisper_model_path=None, threads=4):
+    """Builds the backend called `name` ("google", "vosk" or "whisper_cpp")."""
+    if name == "google":
+        return GoogleBackend(recognizer)
+    if name == "vosk":
+        return VoskBackend(vosk_model_path)
+    if name == "whisper_cpp":
+        return WhisperCppBackend(whisper_model_path, threads)
+    raise ValueError(f"Unknown speech recognition backend: {name!r}")
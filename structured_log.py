@@ -0,0 +1,79 @@
+# structured_log.py
+"""
+Level-gated, structured logging for the bot's hot paths.
+
+Most of the bot still reports with print(). Code that runs once per IRC line or
+chat message logs through a "lorelei.*" logger from get_logger() instead. When its
+level is disabled, a call is just a cached level check. Extra fields go in
+`extra={...}` and are written as key=value pairs, or as JSON with fmt="json":
+
+    log.debug("raw line", extra={"line": line})
+    12:00:01 DEBUG lorelei.irc: raw line line=':tmi.twitch.tv PING'
+
+Call configure() once at startup. Until then, INFO and DEBUG records are dropped.
+The level can be changed at runtime with set_level(), for example from the metrics
+server's /debug/loglevel endpoint.
+"""
+import json
+import logging
+import sys
+
+ROOT = "lorelei"
+
+# Attributes every LogRecord has; anything else on a record came from `extra`.
+_STANDARD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_FIELDS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        text = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            text += " " + " ".join(f"{key}={value!r}" if isinstance(value, str) and " " in value else f"{key}={value}"
+                                   for key, value in fields.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {"time": record.created, "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def configure(level="INFO", fmt="text", stream=None):
+    """Sends "lorelei.*" records at `level` and above to stdout (or `stream`)."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    root = logging.getLogger(ROOT)
+    root.handlers[:] = [handler]
+    root.propagate = False
+    set_level(level)
+    return root
+
+
+def set_level(level):
+    """Changes the level of every "lorelei.*" logger. Raises ValueError for an unknown level name."""
+    if isinstance(level, str):
+        name = level.upper()
+        level = logging.getLevelName(name)
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {name}")
+    logging.getLogger(ROOT).setLevel(level)
+    return logging.getLevelName(level)
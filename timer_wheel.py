@@ -0,0 +1,182 @@
+# timer_wheel.py
+"""
+Hierarchical timer wheel for large numbers of long-lived, frequently reset timers.
+
+Every channel has an inactivity timer that is pushed back on every chat message, plus
+reply-timeout and cooldown timers that are often cancelled before they fire. A heap
+pays O(log n) for each of those and keeps cancelled entries around. The wheel pays O(1):
+  - schedule, reset and cancel move the timer between two slot dicts;
+  - each tick only looks at the timers due in that tick.
+
+Time is counted in ticks of `tick` seconds on a monotonic clock. Level 0 has `slots`
+buckets of one tick each. Each level above has buckets `slots` times wider, and
+its timers cascade down a level as their bucket comes up. With the defaults (0.1 s
+ticks, 64 slots, 4 levels) the wheel spans about 19 days. A timer fires on the first
+tick at or after its due time, so at most one tick late.
+
+The wheel is not thread-safe; callers that share it between threads must lock it.
+"""
+import math
+import time
+
+
+class WheelTimer:
+    __slots__ = ("wheel", "due", "expires", "callback", "args", "_slot")
+
+    def __init__(self, wheel, callback, args):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.due = None
+        self.expires = None   # tick number
+        self._slot = None
+
+    @property
+    def pending(self):
+        """True while the timer is scheduled and has neither fired nor been cancelled."""
+        return self._slot is not None
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+    def reset(self, delay):
+        """Reschedules the timer `delay` seconds from now, whether or not it already fired."""
+        self.wheel.reset(self, delay)
+
+
+class TimerWheel:
+    def __init__(self, tick=0.1, slots=64, levels=4, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self._origin = clock()
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._current = 0   # next tick to process
+        self._count = 0
+        self._next_tick = None   # cached next_due() tick; may be early, never late
+        self.fired = 0
+        self.cascaded = 0
+
+    def __len__(self):
+        return self._count
+
+    def _tick_at(self, when):
+        """The first tick at or after `when`."""
+        ticks = (when - self._origin) / self.tick
+        whole = int(ticks)
+        return whole if whole >= ticks else whole + 1
+
+    def schedule(self, delay, callback, *args):
+        """Runs callback(*args) `delay` seconds from now. Returns a WheelTimer."""
+        timer = WheelTimer(self, callback, args)
+        self.reset(timer, delay)
+        return timer
+
+    def reset(self, timer, delay):
+        timer.due = self.clock() + delay
+        if timer._slot is not None:
+            del timer._slot[timer]
+            self._count -= 1
+        self._insert(timer, max(self._tick_at(timer.due), self._current))
+
+    def cancel(self, timer):
+        if timer._slot is not None:
+            del timer._slot[timer]
+            timer._slot = None
+            self._count -= 1
+
+    def _insert(self, timer, expires):
+        timer.expires = expires
+        delta = expires - self._current
+        level = 0
+        span = self.slots
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+        if delta >= span:
+            # Beyond the top level: park it in the farthest bucket; it re-cascades from there.
+            expires = self._current + span - 1
+        width = span // self.slots
+        slot = self._wheels[level][(expires // width) % self.slots]
+        if self._next_tick is not None:
+            # An upper-level timer wakes next_due() at its bucket start, where it cascades.
+            self._next_tick = min(self._next_tick, max(expires // width * width, self._current))
+        slot[timer] = None
+        timer._slot = slot
+        self._count += 1
+
+    def _cascade(self, level):
+        """Re-files the timers of the level's current bucket into the levels below."""
+        width = self.slots ** level
+        slot = self._wheels[level][(self._current // width) % self.slots]
+        if not slot:
+            return
+        timers = list(slot)
+        slot.clear()
+        self._count -= len(timers)
+        self.cascaded += len(timers)
+        for timer in timers:
+            self._insert(timer, max(timer.expires, self._current))
+
+    def advance(self, now=None):
+        """Fires every timer due by `now` (default: the clock). Returns how many fired."""
+        if now is None:
+            now = self.clock()
+        self._next_tick = None
+        target = math.floor((now - self._origin) / self.tick)
+        # Rounding can land one tick short of a wake-up at exactly next_due(); use its formula.
+        if self._origin + (target + 1) * self.tick <= now:
+            target += 1
+        fired = 0
+        while self._current <= target:
+            if self._count == 0:
+                self._current = target + 1
+                break
+            for level in range(1, self.levels):
+                if self._current % (self.slots ** level):
+                    break
+                self._cascade(level)
+            slot = self._wheels[0][self._current % self.slots]
+            self._current += 1
+            while slot:
+                timer = next(iter(slot))
+                del slot[timer]
+                timer._slot = None
+                self._count -= 1
+                fired += 1
+                timer.callback(*timer.args)
+        self.fired += fired
+        return fired
+
+    def next_due(self):
+        """
+        A time at or before which the next timer fires, or None if nothing is scheduled.
+        For upper levels this is the start of the nearest non-empty bucket, where
+        advance() only cascades; waking then and advancing again is always safe.
+        The answer is cached until the next advance(); cancelling a timer can leave it
+        early, which only costs a spurious wake-up.
+        """
+        if self._count == 0:
+            return None
+        if self._next_tick is not None:
+            return self._origin + self._next_tick * self.tick
+        earliest = None
+        for level in range(self.levels):
+            width = self.slots ** level
+            base = self._current // width
+            # An upper-level bucket for the current block was already cascaded, unless the
+            # block starts right now; whatever is in it now belongs to a block `slots` away.
+            first = 0 if level == 0 or self._current % width == 0 else 1
+            for offset in range(first, first + self.slots):
+                index = base + offset
+                if self._wheels[level][index % self.slots]:
+                    tick = max(index * width, self._current)
+                    if earliest is None or tick < earliest:
+                        earliest = tick
+                    break
+        self._next_tick = earliest
+        return self._origin + earliest * self.tick
+
+    def metrics(self):
+        return {"pending": self._count, "fired": self.fired, "cascaded": self.cascaded}
@@ -0,0 +1,192 @@
+# voice_activity.py
+"""
+Voice activity detection for captured microphone audio.
+
+listen_in_background cuts a phrase whenever the energy crosses the threshold set by
+the one-time ambient calibration, so game audio and keyboard clicks reach the
+recognizer too, and most of them come back as UnknownValueError. The detector looks
+at each phrase in 30 ms frames before it is queued. It drops phrases with no speech
+in them and trims the silence around the speech that remains.
+
+A frame counts as speech when:
+  - its RMS energy is `energy_ratio` times above the noise floor, and
+  - its zero-crossing rate is below `max_zcr`. Hiss and broadband noise cross zero
+    far more often than voiced speech.
+A phrase needs at least `min_speech_ms` of consecutive speech frames, which rules
+out clicks and pops. The noise floor is re-estimated from the quiet frames of every
+phrase; each phrase carries its leading and trailing pause. So the floor follows
+the room after startup instead of staying at the calibration value.
+
+With mode="webrtc", frames are classified by webrtcvad (pip install webrtcvad)
+instead. NumPy is used for the frame features when it is installed.
+"""
+import array
+import math
+import sys
+from collections import deque
+
+import speech_recognition as sr
+
+SAMPLE_WIDTH = 2   # bytes per sample: 16-bit PCM
+WEBRTC_RATES = (8000, 16000, 32000, 48000)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def frame_features(pcm, frame_samples):
+    """Per-frame (rms, zero-crossing rate) lists for 16-bit mono PCM; a trailing partial frame is ignored."""
+    count = len(pcm) // SAMPLE_WIDTH // frame_samples
+    if count == 0:
+        return [], []
+    if numpy is not None:
+        samples = numpy.frombuffer(pcm, dtype="<i2", count=count * frame_samples)
+        frames = samples.reshape(count, frame_samples).astype(numpy.float64)
+        rms = numpy.sqrt((frames * frames).mean(axis=1))
+        signs = numpy.signbit(frames)
+        zcr = (signs[:, 1:] != signs[:, :-1]).mean(axis=1)
+        return rms.tolist(), zcr.tolist()
+
+    samples = array.array("h", pcm[:count * frame_samples * SAMPLE_WIDTH])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    rms, zcr = [], []
+    for start in range(0, len(samples), frame_samples):
+        frame = samples[start:start + frame_samples]
+        rms.append(math.sqrt(sum(s * s for s in frame) / frame_samples))
+        crossings = sum(1 for a, b in zip(frame, frame[1:]) if (a < 0) != (b < 0))
+        zcr.append(crossings / (frame_samples - 1))
+    return rms, zcr
+
+
+class VoiceActivityDetector:
+    """
+    Decides whether captured audio contains speech.
+
+    filter(audio) takes a whole phrase and returns it trimmed to the speech, or None
+    when the phrase should not be sent to the recognizer. is_speech(pcm) classifies one
+    chunk of a live stream, with a hangover so short pauses between words still count.
+    """
+
+    def __init__(self, mode="energy", noise_floor=100.0, energy_ratio=3.0, max_zcr=0.3, frame_ms=30,
+                 min_speech_ms=120, padding_ms=300, noise_adapt=0.2, aggressiveness=2):
+        self.mode = mode
+        self.noise_floor = noise_floor
+        self.energy_ratio = energy_ratio
+        self.max_zcr = max_zcr
+        self.frame_ms = frame_ms
+        self.min_speech_ms = min_speech_ms
+        self.padding_ms = padding_ms
+        self.noise_adapt = noise_adapt
+        self._webrtc = None
+        if mode == "webrtc":
+            try:
+                import webrtcvad
+            except ImportError as e:
+                raise ImportError("The webrtc VAD mode needs the webrtcvad package: pip install webrtcvad") from e
+            self._webrtc = webrtcvad.Vad(aggressiveness)
+        elif mode != "energy":
+            raise ValueError(f"Unknown voice activity detection mode: {mode!r}")
+
+        self._hangover = 0
+        self._recent = deque(maxlen=3000 // frame_ms)   # ~3 s of stream frame levels
+        self.segments_seen = 0
+        self.recognitions_avoided = 0
+        self.audio_seconds = 0.0
+        self.trimmed_seconds = 0.0
+
+    def _classify(self, pcm, sample_rate, history=None):
+        """
+        Per-frame speech flags, updating the noise floor from the quietest fifth of the
+        frames: those of `pcm` itself, or of the recent `history` for short stream chunks.
+        """
+        frame_samples = sample_rate * self.frame_ms // 1000
+        rms, zcr = frame_features(pcm, frame_samples)
+        if not rms:
+            return []
+
+        levels = rms
+        if history is not None:
+            history.extend(rms)
+            levels = history
+        # Follow the background level, falling faster than rising. A background that is
+        # louder right now than the tracked floor (a fan was switched on) is used as is.
+        quiet = sorted(levels)[:max(1, len(levels) // 5)]
+        estimate = max(sum(quiet) / len(quiet), 1.0)
+        rate = self.noise_adapt if estimate > self.noise_floor else max(self.noise_adapt, 0.5)
+        self.noise_floor += (estimate - self.noise_floor) * rate
+
+        threshold = max(self.noise_floor, estimate) * self.energy_ratio
+        if self._webrtc is not None and sample_rate in WEBRTC_RATES:
+            frame_bytes = frame_samples * SAMPLE_WIDTH
+            return [level > threshold / 2 and
+                    self._webrtc.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], sample_rate)
+                    for i, level in enumerate(rms)]
+        return [level > threshold and crossings < self.max_zcr for level, crossings in zip(rms, zcr)]
+
+    def speech_span(self, pcm, sample_rate):
+        """(start, end) byte offsets of the padded speech in `pcm`, or None if it holds no speech."""
+        flags = self._classify(pcm, sample_rate)
+        min_run = max(1, -(-self.min_speech_ms // self.frame_ms))
+        run = longest = 0
+        first = last = None
+        for i, speech in enumerate(flags):
+            if speech:
+                run += 1
+                longest = max(longest, run)
+                if first is None:
+                    first = i
+                last = i
+            else:
+                run = 0
+        if longest < min_run:
+            return None
+
+        frame_bytes = sample_rate * self.frame_ms // 1000 * SAMPLE_WIDTH
+        pad = sample_rate * self.padding_ms // 1000 * SAMPLE_WIDTH
+        return max(0, first * frame_bytes - pad), min(len(pcm), (last + 1) * frame_bytes + pad)
+
+    def filter(self, audio):
+        """Returns `audio` trimmed to its speech, or None when it holds none."""
+        pcm = audio.frame_data if audio.sample_width == SAMPLE_WIDTH else audio.get_raw_data(
+            convert_width=SAMPLE_WIDTH)
+        bytes_per_second = audio.sample_rate * SAMPLE_WIDTH
+        self.segments_seen += 1
+        self.audio_seconds += len(pcm) / bytes_per_second
+
+        span = self.speech_span(pcm, audio.sample_rate)
+        if span is None:
+            self.recognitions_avoided += 1
+            self.trimmed_seconds += len(pcm) / bytes_per_second
+            return None
+        start, end = span
+        self.trimmed_seconds += (len(pcm) - (end - start)) / bytes_per_second
+        if start == 0 and end == len(pcm):
+            return audio
+        return sr.AudioData(pcm[start:end], audio.sample_rate, SAMPLE_WIDTH)
+
+    def is_speech(self, pcm, sample_rate):
+        """True while a live stream is in speech, holding on for `padding_ms` after the last speech frame."""
+        flags = self._classify(pcm, sample_rate, self._recent)
+        seconds = len(pcm) / (sample_rate * SAMPLE_WIDTH)
+        self.audio_seconds += seconds
+        if any(flags):
+            self._hangover = self.padding_ms
+            return True
+        self._hangover -= seconds * 1000
+        if self._hangover > 0:
+            return True
+        self.trimmed_seconds += seconds
+        return False
+
+    def metrics(self):
+        return {
+            "mode": self.mode,
+            "noise_floor": round(self.noise_floor, 1),
+            "segments_seen": self.segments_seen,
+            "recognitions_avoided": self.recognitions_avoided,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "trimmed_seconds": round(self.trimmed_seconds, 2),
+        }
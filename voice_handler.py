@@ -1,56 +1,222 @@
-import speech_recognition as sr
-import threading
-import time
-
-class VoiceHandler:
-    def __init__(self, on_speech_recognized_callback):
-        self.recognizer = sr.Recognizer()
-        
-        # --- NEW: Increase the pause threshold ---
-        # The default is 0.8 seconds. We're increasing it to 2.0 seconds,
-        # allowing for longer pauses within a single sentence.
-        self.recognizer.pause_threshold = 2.0
-
-        self.microphone = sr.Microphone()
-        self.main_callback = on_speech_recognized_callback
-        self.stop_listening = None
-
-        with self.microphone as source:
-            print("🎤 Calibrating microphone for ambient noise... Please be quiet for a moment.")
-            self.recognizer.adjust_for_ambient_noise(source, duration=2)
-            print("✅ Microphone calibrated.")
-
-    def _background_listener_callback(self, recognizer, audio):
-        """
-        This callback is called by listen_in_background when a phrase is detected.
-        It runs in the background thread.
-        """
-        print("🧠 Recognizing speech...")
-        try:
-            text = recognizer.recognize_google(audio)
-            print(f"💬 You said: \"{text}\"")
-            
-            self.main_callback(text)
-
-        except sr.UnknownValueError:
-            pass
-        except sr.RequestError as e:
-            print(f"Could not request results from Google Speech Recognition service; {e}")
-        except Exception as e:
-            print(f"An unknown error occurred during speech recognition: {e}")
-
-    def start(self):
-        """
-        Starts the background listening thread using the library's built-in method.
-        """
-        print("Starting background voice listener...")
-        
-        self.stop_listening = self.recognizer.listen_in_background(
-            self.microphone, 
-            self._background_listener_callback,
-            # --- NEW: Set a maximum recording time ---
-            # This sets a hard limit on the length of a single utterance.
-            # We'll set it to 15 seconds to allow for longer thoughts.
-            phrase_time_limit=15 
-        )
-        print("🎤 Listening for voice commands in the background (with longer pause detection)...")
\ No newline at end of file
+import speech_recognition as sr
+import json
+import threading
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from speech_backends import GoogleBackend
+
+RECOGNITION_TIME = metrics.histogram("voice_recognition_seconds", "Time to transcribe an utterance, by backend. "
+                                     "For streaming backends, the call that produced the final text.", ["backend"])
+UTTERANCES = metrics.counter("voice_utterances_total", "Utterances recognized, by backend.", ["backend"])
+SKIPPED_AUDIO = metrics.counter("voice_skipped_phrases_total", "Captured phrases dropped by voice activity detection.")
+
+class VoiceHandler:
+    """
+    Captures the microphone and hands recognized speech to `on_speech_recognized_callback`.
+
+    Recognition never runs on the capture thread. Whole-utterance backends (Google,
+    whisper.cpp) get each phrase from listen_in_background and transcribe it on a
+    small worker pool; results are still delivered in the order the phrases were
+    spoken, even when a later one finishes first. Streaming backends (Vosk) get raw audio chunks through a queue
+    and report partial text to `on_partial_callback` as the speaker talks, so a
+    mention can be acted on before the utterance ends.
+
+    With a `vad` (voice_activity.VoiceActivityDetector), captured audio without speech
+    never reaches the recognizer: phrases are dropped or trimmed before they are
+    queued, and silent stream chunks are not fed to the streaming backend.
+
+    With a `calibration_file`, the ambient noise level measured at startup is saved
+    and reused for `calibration_max_age` seconds, so a restart skips the 2-second
+    calibration. The recognizer keeps adjusting the level while it listens, so a
+    slightly stale value corrects itself.
+    """
+
+    def __init__(self, on_speech_recognized_callback, backend=None, on_partial_callback=None,
+                 recognition_workers=2, vad=None, calibration_file=None, calibration_max_age=24 * 3600,
+                 pause_threshold=2.0, phrase_time_limit=15):
+        self.recognizer = sr.Recognizer()
+
+        # Seconds of silence that end a phrase. Every utterance waits this long before
+        # recognition starts, so it trades latency against splitting a sentence in two
+        # (the library default is 0.8).
+        self.recognizer.pause_threshold = pause_threshold
+        # Hard limit, in seconds, on the length of a single phrase.
+        self.phrase_time_limit = phrase_time_limit
+
+        self.backend = backend or GoogleBackend(self.recognizer)
+        self.main_callback = on_speech_recognized_callback
+        self.partial_callback = on_partial_callback
+        self.vad = vad
+        self.stop_listening = None
+
+        # Streaming engines want their own sample rate; others take the device default.
+        sample_rate = getattr(self.backend, "sample_rate", None) if self.backend.streaming else None
+        self.microphone = sr.Microphone(sample_rate=sample_rate)
+        self._pool = ThreadPoolExecutor(max_workers=recognition_workers, thread_name_prefix="speech")
+        self._captured = 0           # phrases handed to the pool, numbered in capture order
+        self._delivered = 0          # phrases whose result has been delivered (or dropped)
+        self._finished = {}          # phrase number -> text, recognized but waiting for earlier phrases
+        self._deliver_lock = threading.Lock()
+        self._chunks = queue.Queue()
+        self._running = False
+
+        self.calibration_file = calibration_file
+        self.calibration_max_age = calibration_max_age
+        if not self._load_calibration():
+            self.calibrate()
+
+    def calibrate(self, duration=2):
+        """Measures the ambient noise level and saves it to the calibration file, if any."""
+        with self.microphone as source:
+            print("🎤 Calibrating microphone for ambient noise... Please be quiet for a moment.")
+            self.recognizer.adjust_for_ambient_noise(source, duration=duration)
+            print("✅ Microphone calibrated.")
+        self._apply_noise_floor()
+        if self.calibration_file:
+            try:
+                with open(self.calibration_file, "w", encoding="utf-8") as f:
+                    json.dump({"energy_threshold": self.recognizer.energy_threshold, "saved_at": time.time()}, f)
+            except OSError as e:
+                print(f"[WARN] Could not save microphone calibration: {e}")
+
+    def _load_calibration(self):
+        if not self.calibration_file:
+            return False
+        try:
+            with open(self.calibration_file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if time.time() - saved["saved_at"] > self.calibration_max_age:
+                return False
+            self.recognizer.energy_threshold = float(saved["energy_threshold"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        print(f"🎤 Using saved microphone calibration (energy threshold {self.recognizer.energy_threshold:.0f}).")
+        self._apply_noise_floor()
+        return True
+
+    def _apply_noise_floor(self):
+        if self.vad is not None:
+            # Start from the calibrated ambient level; the detector keeps tracking it from here.
+            self.vad.noise_floor = self.recognizer.energy_threshold / self.recognizer.dynamic_energy_ratio
+
+    def _background_listener_callback(self, recognizer, audio):
+        """
+        This callback is called by listen_in_background when a phrase is detected.
+        It runs in the background capture thread, so it only filters and queues the work.
+        """
+        if self.vad is not None:
+            audio = self.vad.filter(audio)
+            if audio is None:
+                SKIPPED_AUDIO.inc()
+                print(f"🔇 Skipped audio without speech ({self.vad.recognitions_avoided} recognitions avoided).")
+                return
+        self._pool.submit(self._recognize, self._captured, audio)
+        self._captured += 1
+
+    def _recognize(self, number, audio):
+        print("🧠 Recognizing speech...")
+        text = None
+        try:
+            start = time.monotonic()
+            text = self.backend.transcribe(audio)
+            elapsed = time.monotonic() - start
+            RECOGNITION_TIME.labels(self.backend.name).observe(elapsed)
+            if text:
+                UTTERANCES.labels(self.backend.name).inc()
+                print(f"💬 You said: \"{text}\" ({self.backend.name}, {elapsed:.2f}s)")
+        except sr.RequestError as e:
+            print(f"Could not request results from Google Speech Recognition service; {e}")
+        except Exception as e:
+            print(f"An unknown error occurred during speech recognition: {e}")
+        self._deliver(number, text)
+
+    def _deliver(self, number, text):
+        """Hands on phrase `number` and any later ones already recognized, in capture order."""
+        with self._deliver_lock:
+            self._finished[number] = text
+            while self._delivered in self._finished:
+                text = self._finished.pop(self._delivered)
+                self._delivered += 1
+                if text:
+                    self._hand_off(self.main_callback, text)
+
+    @staticmethod
+    def _hand_off(callback, text):
+        """Calls `callback(text)`; an error in it must not stop recognition."""
+        try:
+            callback(text)
+        except Exception as e:
+            print(f"An error occurred while handling recognized speech: {e}")
+
+    def _capture_stream(self):
+        """Reads raw audio chunks from the microphone into the recognition queue."""
+        with self.microphone as source:
+            while self._running:
+                try:
+                    self._chunks.put(source.stream.read(source.CHUNK))
+                except Exception as e:
+                    print(f"An error occurred while reading the microphone: {e}")
+                    time.sleep(0.5)
+        self._chunks.put(None)
+
+    def _recognize_stream(self):
+        """Feeds captured audio to the streaming backend, reporting partial and final text."""
+        sample_rate = self.microphone.SAMPLE_RATE
+        stream = self.backend.open_stream(sample_rate)
+        in_speech = False
+        while True:
+            chunk = self._chunks.get()
+            start = time.monotonic()
+            if chunk is None:
+                final, partial = stream.finish(), None
+            elif self.vad is not None and not self.vad.is_speech(chunk, sample_rate):
+                if not in_speech:
+                    continue
+                # Speech just ended: flush the utterance instead of feeding silence.
+                in_speech = False
+                final, partial = stream.finish(), None
+            else:
+                in_speech = True
+                try:
+                    final, partial = stream.feed(chunk)
+                except Exception as e:
+                    print(f"An unknown error occurred during speech recognition: {e}")
+                    continue
+            if partial and self.partial_callback is not None:
+                self._hand_off(self.partial_callback, partial)
+            if final:
+                RECOGNITION_TIME.labels(self.backend.name).observe(time.monotonic() - start)
+                UTTERANCES.labels(self.backend.name).inc()
+                print(f"💬 You said: \"{final}\" ({self.backend.name})")
+                self._hand_off(self.main_callback, final)
+            if chunk is None:
+                return
+
+    def start(self):
+        """
+        Starts the background listening thread(s).
+        """
+        print(f"Starting background voice listener ({self.backend.name})...")
+        if self.backend.streaming:
+            self._running = True
+            threading.Thread(target=self._capture_stream, name="voice-capture", daemon=True).start()
+            threading.Thread(target=self._recognize_stream, name="voice-recognize", daemon=True).start()
+            print("🎤 Listening for voice commands in the background (streaming recognition)...")
+            return
+
+        self.stop_listening = self.recognizer.listen_in_background(
+            self.microphone,
+            self._background_listener_callback,
+            phrase_time_limit=self.phrase_time_limit
+        )
+        print("🎤 Listening for voice commands in the background (with longer pause detection)...")
+
+    def stop(self):
+        self._running = False
+        if self.stop_listening is not None:
+            self.stop_listening(wait_for_stop=False)
+            self.stop_listening = None
+        self._pool.shutdown(wait=False)